@@ -1,12 +1,16 @@
 import os
-from typing import List, Dict, Any, Optional, Literal
+from typing import List, Dict, Any, Optional, Literal, Union
 from flask import json
 from gradio_client import Client
 import requests
-import re
 import contextlib
 import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv, find_dotenv
+from .llm_cache import LLMResponseCache
+from .json_extractor import extract_json, parse_model, parse_model_list
+from .prompt_registry import estimate_tokens, register  # noqa: F401 (estimate_tokens re-exported)
 
 # Load .env from project root regardless of where the script is invoked from
 load_dotenv(find_dotenv(usecwd=False), override=False)
@@ -19,6 +23,10 @@ HF_API_TOKEN = os.environ.get("HF_API_TOKEN")
 # Note: You should set GRADIO_API_URL in your environment for production use, 
 # or hardcode the temporary URL for quick testing.
 
+# Shared by every DataProcessingLLM instance in the process (ai.py, post_processing, UserConditionManager)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+llm_response_cache = LLMResponseCache() if LLM_CACHE_ENABLED else None
+
 # pydantic format for Data Processing LLM
 from pydantic import BaseModel, Field
 
@@ -30,6 +38,10 @@ class ExtractionInsights(BaseModel):
     primary_condition_or_symptom: str = Field(description="The core medical condition, symptom (e.g., 'persistent cough'), or medication being addressed in this turn.")
     icd_codes_extracted: List[str] = Field(description="A list of 1-3 relevant ICD-10 codes mentioned or inferred from the discussion (e.g., R05 for cough, I10 for hypertension).")
 
+class BatchedExtractionInsights(ExtractionInsights):
+    """ExtractionInsights for one turn of a multi-turn batch, tagged with the turn label it belongs to."""
+    entry_id: str = Field(description="The TURN label (e.g. 'T1') of the conversation turn these insights were extracted from.")
+
 class ConditionAction(BaseModel):
     """
     Schema for a single condition requiring an ADD or UPDATE action in the database.
@@ -48,7 +60,7 @@ class ConditionAction(BaseModel):
     )
 
     # Fields required for UPDATING an existing condition
-    condition_id: Optional[int] = Field(
+    condition_id: Optional[Union[int, str]] = Field(
         None, description="The internal database ID of the existing condition to update (required for 'update' mode)."
     )
 
@@ -61,6 +73,26 @@ class ConditionAction(BaseModel):
     )
 
 
+class FusedSessionAnalysis(BaseModel):
+    """
+    Schema for the fused end-of-session analysis: per-turn insights, the updated
+    consultation heading/summary and the condition actions, all from one LLM call.
+    """
+    insights: List[BatchedExtractionInsights] = Field(
+        description="Exactly one insights object per conversation turn, with `entry_id` set to the turn label (e.g. 'T1')."
+    )
+    heading: str = Field(
+        description="A 2-3 word clinical heading capturing the primary concern (e.g. 'Chest Pain', 'Hypertension Follow-Up')."
+    )
+    summary: str = Field(
+        description="The updated cumulative clinical summary (3-5 sentences, max 80 words) that replaces the existing summary."
+    )
+    conditions: List[ConditionAction] = Field(
+        default_factory=list,
+        description="Database actions for new or changed conditions, symptoms and ADRs. Empty list if none."
+    )
+
+
 # ---- MODEL PROMPTS BASED ON CONTEXT ----
 AGENTIC_SYSTEM_PROMPT = """You are DocAI, a compassionate and highly specialized medical AI assistant.
 Your manner is warm, reassuring, and precise — like a trusted family doctor.
@@ -247,6 +279,23 @@ MODEL RESPONSE: {model_response}
 OUTPUT:
 """
 
+BATCH_INSIGHTS_EXTRACTION_PROMPT_TEMPLATE = """You are a highly efficient medical data compression expert. Your task is to analyze EACH of the user interaction turns below (query and response) independently and extract highly compressed, structured insights for every turn.
+
+### INSTRUCTIONS:
+1.  **One Item Per Turn:** Return exactly one object per turn, with `entry_id` set to that turn's label (e.g. "T1"). Never merge turns.
+2.  **Conditional Extraction:** If a turn is trivial (e.g., "Yes," "No," "Okay," "Thank you," or simple greetings), set its `insight_found` field to **FALSE** and leave `compressed_summary` and `primary_condition_or_symptom` empty.
+3.  **Compression Mandate:** If an insight is found, set `insight_found` to **TRUE**. The `compressed_summary` field MUST be concise, covering the core clinical finding (symptom change, medication context, or medical advice) in a maximum of **three lines**. This is the text used for future semantic search.
+4.  **Output Format:** The output MUST be a single JSON list of objects strictly matching the provided schema. Do not include any explanatory text, markdown formatting (like ```json), or chatter outside of the JSON list.
+
+--- CONVERSATION TURNS ---
+{turns_block}
+
+--- JSON SCHEMA (Output MUST be a list of these objects) ---
+{schema_json}
+
+OUTPUT:
+"""
+
 CONDITION_DETECTION_PROMPT_TEMPLATE = """
 You are a highly specialized Medical Entity Extraction System. Your task is to analyze the consultation data and determine the necessary database actions (ADD or UPDATE) for conditions and significant symptoms.
 
@@ -274,6 +323,29 @@ You are a highly specialized Medical Entity Extraction System. Your task is to a
 OUTPUT:
 """
 
+FUSED_SESSION_ANALYSIS_PROMPT_TEMPLATE = """You are a highly specialized **Clinical Post-Processing Engine**. In a single pass over the consultation data below, you must produce three things: per-turn insights, an updated consultation summary, and the condition database actions.
+
+### INSTRUCTIONS:
+1.  **Per-Turn Insights (`insights`):** Return exactly one object per turn, with `entry_id` set to that turn's label (e.g. "T1"). If a turn is trivial (e.g., "Yes," "Okay," "Thank you," greetings), set `insight_found` to FALSE and leave the text fields empty. Otherwise set it to TRUE and compress the core clinical finding into at most three lines.
+2.  **Summary (`heading`, `summary`):** Update the EXISTING SUMMARY by integrating the new turns into a single cohesive narrative of 3 to 5 sentences (max 80 words), focused on chief complaints, symptom changes, medication discussions, key findings and recommendations. The heading is a 2-3 word clinical heading for the primary concern.
+3.  **Conditions (`conditions`):** Use 'add' for any new condition, symptom or adverse drug reaction (ADR) strongly suggested by the new turns that is *not* in the HISTORICAL RECORDS. Use 'update' with the record's `id` as `condition_id` for a change in status of an existing record. Omit trivial or already-documented findings (or mark them 'ignore').
+4.  **Format:** The output MUST be a single JSON object strictly matching the provided schema. Do not include any text, markdown, or chatter outside of the JSON object.
+
+--- EXISTING SUMMARY (To be updated) ---
+{existing_summary}
+
+--- CONVERSATION TURNS (New Entries) ---
+{turns_block}
+
+--- HISTORICAL HEALTH RECORDS (For determining novelty) ---
+{user_health_records_context}
+
+--- JSON SCHEMA ---
+{schema_json}
+
+OUTPUT:
+"""
+
 SUMMARIZATION_PROMPT_TEMPLATE = """
 You are a highly efficient **Clinical Summarization Engine**. Your task is to update the 'EXISTING SUMMARY' by logically integrating all new clinical information and context from the 'CONVERSATION TIMELINE'.
 
@@ -294,6 +366,41 @@ You are a highly efficient **Clinical Summarization Engine**. Your task is to up
 """
 
 
+SUMMARY_MERGE_PROMPT_TEMPLATE = """
+You are a highly efficient **Clinical Summarization Engine**. A long consultation was summarised in consecutive parts. Your task is to merge the 'PART SUMMARIES' (in chronological order) into the 'EXISTING SUMMARY'.
+
+### INSTRUCTIONS:
+1.  **Cumulative Focus:** The output must be a single, cohesive narrative that replaces the existing summary. Later parts take precedence when they update earlier information.
+2.  **Clinical Relevance:** Keep **chief complaints, symptom changes, medication discussions, key findings, and final recommendations.** Drop repetition between parts.
+3.  **Conciseness:** The final summary should be limited to **3 to 5 sentences** (maximum 80 words) to maintain scannability.
+4.  **Heading:** Generate a 2-3 word clinical heading that captures the primary concern (e.g. "Sleep Disturbance", "Chest Pain", "Hypertension Follow-Up").
+5.  **Format:** Output ONLY a JSON object with two keys: `heading` and `summary`. No markdown, no extra text.
+
+--- EXISTING SUMMARY (To be updated) ---
+{existing_summary}
+
+--- PART SUMMARIES (Chronological) ---
+{part_summaries}
+
+--- OUTPUT (JSON ONLY) ---
+"""
+
+# Compiled once (schema rendered as compact JSON) on first use; per call only the slots are filled
+AGENTIC_PROMPT = register("agentic_system", AGENTIC_SYSTEM_PROMPT)
+RESOLUTION_PROMPT = register("resolution_system", RESOLUTION_SYSTEM_PROMPT)
+INSIGHTS_EXTRACTION_PROMPT = register("insights_extraction", INSIGHTS_EXTRACTION_PROMPT_TEMPLATE, ExtractionInsights)
+BATCH_INSIGHTS_EXTRACTION_PROMPT = register(
+    "batch_insights_extraction", BATCH_INSIGHTS_EXTRACTION_PROMPT_TEMPLATE, BatchedExtractionInsights
+)
+CONDITION_DETECTION_PROMPT = register("condition_detection", CONDITION_DETECTION_PROMPT_TEMPLATE, ConditionAction)
+FUSED_SESSION_ANALYSIS_PROMPT = register(
+    "fused_session_analysis", FUSED_SESSION_ANALYSIS_PROMPT_TEMPLATE, FusedSessionAnalysis
+)
+SUMMARIZATION_PROMPT = register("summarization", SUMMARIZATION_PROMPT_TEMPLATE)
+SUMMARY_MERGE_PROMPT = register("summary_merge", SUMMARY_MERGE_PROMPT_TEMPLATE)
+# Reduce rounds of summarise_hierarchical before the remaining parts are truncated to fit
+SUMMARY_MAX_MERGE_ROUNDS = int(os.environ.get("SUMMARY_MAX_MERGE_ROUNDS", 3))
+
 
 class ConsultationLLM:
     """Handles RAG-based consultation responses using MedGemma via Gradio API."""
@@ -356,9 +463,17 @@ class ConsultationLLM:
         
 
 class DataProcessingLLM:
-    def __init__(self, model_name: str = os.environ.get("DATA_PROCESSING_MODEL", "Qwen/Qwen2.5-7B-Instruct")):
+    def __init__(
+        self,
+        model_name: str = os.environ.get("DATA_PROCESSING_MODEL", "Qwen/Qwen2.5-7B-Instruct"),
+        cache: Optional[LLMResponseCache] = llm_response_cache
+    ):
         self.model_name = model_name
         self.api_url = os.environ.get("HF_API_BASE_URL", "https://router.huggingface.co/v1/chat/completions")
+        self.cache = cache
+        # Running totals of real API calls (cache hits excluded) — used by benchmarks/monitoring
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
         
         # HF_API_TOKEN is only strictly needed if not using huggingface-cli login
         # We suppress the explicit print to avoid terminal noise.
@@ -366,33 +481,36 @@ class DataProcessingLLM:
         #    print("[WARNING] HF_API_TOKEN not set explicitly in globals.")
 
     def _clean_and_parse_json(self, raw_text: str):
-        """Extracts JSON from text that might contain markdown or chatter."""
-        if not raw_text:
-            return None
-        
-        # Sanitize common LLM formatting mistakes (Python -> JSON)
-        sanitized = raw_text
-        sanitized = re.sub(r'\bNone\b', 'null', sanitized)
-        sanitized = re.sub(r'\bTrue\b', 'true', sanitized)
-        sanitized = re.sub(r'\bFalse\b', 'false', sanitized)
-        # Strip markdown code fences
-        sanitized = re.sub(r'```(?:json)?', '', sanitized).strip()
-        
-        try:
-            # Try direct parse first
-            return json.loads(sanitized)
-        except json.JSONDecodeError:
-            pass
-        
-        try:
-            # Extract the outermost JSON object or array
-            match = re.search(r'(\{.*\}|\[.*\])', sanitized, re.DOTALL)
-            if match:
-                return json.loads(match.group(1))
-        except (json.JSONDecodeError, AttributeError) as e:
-            print(f"[ERROR] JSON Parsing failed: {e}")
-        
-        return None
+        """Extracts the first JSON value from text that might contain markdown or chatter."""
+        return extract_json(raw_text)
+
+    def _generation_params(self) -> Dict[str, Any]:
+        return {
+            "max_tokens": int(os.environ.get("LLM_MAX_TOKENS", 1024)),
+            "temperature": float(os.environ.get("LLM_TEMPERATURE", 0.1))
+        }
+
+    def _generate(self, prompt: str, schema_json: Optional[Dict[str, Any]] = None, use_cache: bool = True):
+        """
+        Cache-aware wrapper around _call_hf_api.
+
+        Returns:
+            Tuple of (raw_text, pending_cache_key). pending_cache_key is set only on a
+            cache miss; callers pass it to _remember() once the output parsed cleanly,
+            so malformed generations are never cached and retries still hit the API.
+        """
+        if not use_cache or self.cache is None:
+            return self._call_hf_api(prompt, schema_json=schema_json), None
+
+        cache_key = LLMResponseCache.make_key(self.model_name, prompt, self._generation_params())
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached, None
+        return self._call_hf_api(prompt, schema_json=schema_json), cache_key
+
+    def _remember(self, cache_key: Optional[str], raw_text: str) -> None:
+        if cache_key and self.cache is not None:
+            self.cache.set(cache_key, self.model_name, raw_text)
 
     def _call_hf_api(self, prompt: str, schema_json: Optional[Dict[str, Any]] = None) -> str:
         headers = {
@@ -403,8 +521,7 @@ class DataProcessingLLM:
         payload = {
             "model": self.model_name,
             "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": int(os.environ.get("LLM_MAX_TOKENS", 1024)),
-            "temperature": float(os.environ.get("LLM_TEMPERATURE", 0.1))
+            **self._generation_params()
         }
         
         try:
@@ -414,53 +531,213 @@ class DataProcessingLLM:
             
             # Parse OpenAI-compatible chat completion response
             raw_output = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+            usage = result.get("usage") or {}
+            self._record_usage(
+                usage.get("prompt_tokens", estimate_tokens(prompt)),
+                usage.get("completion_tokens", estimate_tokens(raw_output))
+            )
             return raw_output.strip()
             
         except Exception as e:
             print(f"API Call Failed: {e}")
             raise RuntimeError(f"HuggingFace API Error: {str(e)}")
 
-    def extract_insights(self, user_query: str, model_response: str) -> ExtractionInsights:
-        prompt = INSIGHTS_EXTRACTION_PROMPT_TEMPLATE.format(
-            user_query=user_query,
-            model_response=model_response,
-            schema_json=ExtractionInsights.model_json_schema()
+    def _record_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["prompt_tokens"] += int(prompt_tokens)
+            self.usage["completion_tokens"] += int(completion_tokens)
+
+    def reset_usage(self) -> Dict[str, int]:
+        """Returns the usage counters accumulated so far and zeroes them."""
+        with self._usage_lock:
+            snapshot = dict(self.usage)
+            self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        return snapshot
+
+    def extract_insights(self, user_query: str, model_response: str, use_cache: bool = True) -> ExtractionInsights:
+        prompt = INSIGHTS_EXTRACTION_PROMPT.render(user_query=user_query, model_response=model_response)
+
+        raw_text, cache_key = self._generate(prompt, schema_json=INSIGHTS_EXTRACTION_PROMPT.schema, use_cache=use_cache)
+        # Raises ValueError if the API succeeded but returned garbage
+        insights = parse_model(raw_text, ExtractionInsights)
+        self._remember(cache_key, raw_text)
+        return insights
+
+    def extract_insights_batch(
+        self,
+        turns: List[Dict[str, str]],
+        token_budget: int = int(os.environ.get("LLM_BATCH_TOKEN_BUDGET", 3000)),
+        max_turns: int = int(os.environ.get("LLM_BATCH_MAX_TURNS", 8)),
+        use_cache: bool = True
+    ) -> Dict[str, ExtractionInsights]:
+        """
+        Extracts insights for many turns with as few LLM calls as possible.
+
+        Turns are packed into one prompt until either the estimated prompt size reaches
+        `token_budget` or `max_turns` is hit (the latter keeps the JSON list within
+        LLM_MAX_TOKENS of output). Any turn whose item is missing or fails validation
+        falls back to a single-turn extract_insights call.
+
+        Args:
+            turns: List of {"id", "user_query", "model_response"} dicts.
+
+        Returns:
+            Dict mapping entry id -> ExtractionInsights. Turns that failed even the
+            per-turn fallback are omitted.
+        """
+        results: Dict[str, ExtractionInsights] = {}
+        for batch in self._pack_turns(turns, token_budget, max_turns):
+            if len(batch) == 1:
+                parsed = {}
+            else:
+                parsed = self._extract_insights_packed(batch, use_cache)
+
+            for label, turn in batch:
+                insights = parsed.get(label)
+                if insights is None:
+                    try:
+                        insights = self.extract_insights(turn["user_query"], turn["model_response"], use_cache=use_cache)
+                    except Exception as e:
+                        print(f"[WARNING] Per-turn insight fallback failed for entry {turn['id']}: {e}")
+                        continue
+                results[turn["id"]] = insights
+
+        return results
+
+    def _pack_turns(self, turns: List[Dict[str, str]], token_budget: int, max_turns: int):
+        """Greedily groups turns into (label, turn) batches that respect the token budget."""
+        overhead = BATCH_INSIGHTS_EXTRACTION_PROMPT.static_tokens
+        batch, used = [], overhead
+        for turn in turns:
+            cost = estimate_tokens(self._render_turn("T00", turn))
+            if batch and (used + cost > token_budget or len(batch) >= max_turns):
+                yield batch
+                batch, used = [], overhead
+            batch.append((f"T{len(batch) + 1}", turn))
+            used += cost
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _render_turn(label: str, turn: Dict[str, str]) -> str:
+        return f"[{label}]\nUSER QUERY: {turn['user_query']}\nMODEL RESPONSE: {turn['model_response']}\n"
+
+    def _extract_insights_packed(self, batch, use_cache: bool) -> Dict[str, ExtractionInsights]:
+        """Runs one multi-turn extraction call. Returns label -> insights for the items that validated."""
+        prompt = BATCH_INSIGHTS_EXTRACTION_PROMPT.render(
+            turns_block="\n".join(self._render_turn(label, turn) for label, turn in batch)
         )
-        
-        raw_text = self._call_hf_api(prompt, schema_json=ExtractionInsights.model_json_schema())
+        try:
+            raw_text, cache_key = self._generate(prompt, schema_json=BATCH_INSIGHTS_EXTRACTION_PROMPT.schema, use_cache=use_cache)
+        except Exception as e:
+            print(f"[WARNING] Batched insight extraction failed, falling back to per-turn calls: {e}")
+            return {}
+
         data = self._clean_and_parse_json(raw_text)
-        
-        # Guard against JSON parsing failures if the API succeeded but returned garbage
-        if not data:
-            raise ValueError("Failed to parse LLM response into JSON.")
-            
-        return ExtractionInsights(**data)
+        items = data if isinstance(data, list) else [data] if isinstance(data, dict) else []
+        expected = {label for label, _ in batch}
+
+        parsed: Dict[str, ExtractionInsights] = {}
+        for item in items:
+            try:
+                batched = BatchedExtractionInsights.model_validate(item)
+            except Exception as e:
+                print(f"[WARNING] Skipping malformed batched insight item: {e}")
+                continue
+            if batched.entry_id in expected and batched.entry_id not in parsed:
+                parsed[batched.entry_id] = ExtractionInsights(**batched.model_dump(exclude={"entry_id"}))
+
+        if len(parsed) == len(expected):
+            self._remember(cache_key, raw_text)
+        else:
+            print(f"[INFO] Batched extraction returned {len(parsed)}/{len(expected)} valid items; the rest fall back to per-turn calls.")
+        return parsed
+
+    def analyse_session(
+        self,
+        existing_summary: str,
+        turns: List[Dict[str, str]],
+        user_health_records_context,
+        use_cache: bool = True
+    ) -> FusedSessionAnalysis:
+        """
+        Fused end-of-session analysis: one structured LLM call returning per-turn
+        insights, the updated heading/summary and condition actions.
+
+        Args:
+            turns: List of {"id", "user_query", "model_response"} dicts.
+
+        Returns:
+            FusedSessionAnalysis whose insights carry the real entry ids. Insights for
+            turns the model skipped or mangled are simply absent; callers decide
+            how to fill them in.
+
+        Raises:
+            ValueError if the output cannot be parsed into the fused schema.
+        """
+        labelled = [(f"T{i + 1}", turn) for i, turn in enumerate(turns)]
+        prompt = FUSED_SESSION_ANALYSIS_PROMPT.render(
+            **self._session_analysis_slots(existing_summary, labelled, user_health_records_context)
+        )
+
+        raw_text, cache_key = self._generate(prompt, schema_json=FUSED_SESSION_ANALYSIS_PROMPT.schema, use_cache=use_cache)
+        analysis = parse_model(raw_text, FusedSessionAnalysis)
+
+        label_to_id = {label: turn["id"] for label, turn in labelled}
+        mapped, seen = [], set()
+        for item in analysis.insights:
+            entry_id = label_to_id.get(item.entry_id)
+            if entry_id and entry_id not in seen:
+                seen.add(entry_id)
+                mapped.append(item.model_copy(update={"entry_id": entry_id}))
+        analysis.insights = mapped
+
+        self._remember(cache_key, raw_text)
+        return analysis
+
+    def estimate_session_analysis_tokens(self, existing_summary: str, turns: List[Dict[str, str]],
+                                         user_health_records_context) -> int:
+        """Estimated size of the analyse_session prompt, so callers can skip a call that would overflow."""
+        slots = self._session_analysis_slots(
+            existing_summary, [(f"T{i + 1}", turn) for i, turn in enumerate(turns)], user_health_records_context
+        )
+        return FUSED_SESSION_ANALYSIS_PROMPT.static_tokens + sum(estimate_tokens(value) for value in slots.values())
+
+    def _session_analysis_slots(self, existing_summary: str, labelled, user_health_records_context) -> Dict[str, str]:
+        return {
+            "existing_summary": existing_summary or "None.",
+            "turns_block": "\n".join(self._render_turn(label, turn) for label, turn in labelled),
+            "user_health_records_context": (
+                user_health_records_context if isinstance(user_health_records_context, str)
+                else json.dumps(user_health_records_context, indent=2)
+            ),
+        }
 
-    def detect_condition(self, summary_context: str, new_entries_context: List[str], user_health_records_context: List[Dict[str, Any]]) -> List[ConditionAction]:
+    def detect_condition(self, summary_context: str, new_entries_context: List[str], user_health_records_context, use_cache: bool = True) -> List[ConditionAction]:
         # Handle list vs string formatting
         new_entries_str = "\n".join(new_entries_context) if isinstance(new_entries_context, list) else str(new_entries_context)
-        user_health_str = json.dumps(user_health_records_context, indent=2)
+        # Pre-rendered (retrieved, compact) context is passed through; raw record lists are dumped as JSON
+        if isinstance(user_health_records_context, str):
+            user_health_str = user_health_records_context
+        else:
+            user_health_str = json.dumps(user_health_records_context, indent=2)
 
-        prompt = CONDITION_DETECTION_PROMPT_TEMPLATE.format(
+        prompt = CONDITION_DETECTION_PROMPT.render(
             summary_context=summary_context,
             new_entries_context=new_entries_str,
-            user_health_records_context=user_health_str,
-            schema_json=ConditionAction.model_json_schema()
+            user_health_records_context=user_health_str
         )
 
-        raw_text = self._call_hf_api(prompt, schema_json=ConditionAction.model_json_schema())
+        raw_text, cache_key = self._generate(prompt, schema_json=CONDITION_DETECTION_PROMPT.schema, use_cache=use_cache)
         print(f"[DEBUG condition raw] {raw_text[:300]}")
-        data = self._clean_and_parse_json(raw_text)
-        print(f"[DEBUG condition parsed] {data}")
-
-        # Guard against JSON parsing failures
-        if not data:
-            raise ValueError("Failed to parse LLM response into JSON.")
-        # Ensure result is a list even if LLM returned a single object
-        items = data if isinstance(data, list) else [data]
-        return [ConditionAction(**item) for item in items]
+        # A single object is accepted as a one-item list
+        actions = parse_model_list(raw_text, ConditionAction)
+        print(f"[DEBUG condition parsed] {actions}")
+        self._remember(cache_key, raw_text)
+        return actions
 
-    def summarise(self, existing_summary: str, formatted_timeline: str):
+    def summarise(self, existing_summary: str, formatted_timeline: str, use_cache: bool = True):
         """
         Generates an updated cumulative clinical summary and a short heading.
 
@@ -470,23 +747,115 @@ class DataProcessingLLM:
         if not formatted_timeline:
             return None, existing_summary
 
-        prompt = SUMMARIZATION_PROMPT_TEMPLATE.format(
+        prompt = SUMMARIZATION_PROMPT.render(
             existing_summary=existing_summary or "None.",
             conversation_timeline=formatted_timeline,
         )
 
-        raw_text = self._call_hf_api(prompt)
+        raw_text, cache_key = self._generate(prompt, use_cache=use_cache)
         data = self._clean_and_parse_json(raw_text)
 
         if data and isinstance(data, dict):
             heading = data.get("heading", "").strip() or None
             summary = data.get("summary", "").strip() or existing_summary
+            # Only structured outputs are cached; the free-text fallback below is a salvage path
+            self._remember(cache_key, raw_text)
             return heading, summary
 
         # Fallback: treat the whole response as the summary text
         clean = raw_text.strip().split("---")[-1].strip()
         return None, clean if clean else existing_summary
 
+    def summarise_hierarchical(
+        self,
+        existing_summary: str,
+        turns: List[Dict[str, str]],
+        chunk_token_budget: int = int(os.environ.get("SUMMARY_CHUNK_TOKEN_BUDGET", 2500)),
+        max_workers: int = int(os.environ.get("SUMMARY_MAX_WORKERS", 4)),
+        use_cache: bool = True
+    ):
+        """
+        Summarises an arbitrarily long timeline without overflowing the prompt.
+
+        The turns are split into chunks whose estimated size fits `chunk_token_budget`
+        (minus the template overhead). Chunks are summarised concurrently, then the
+        part summaries are merged — repeatedly, in groups, if even they exceed the
+        budget — into the existing cumulative summary. Short timelines take the
+        plain single-call summarise() path. When merging stops shrinking the parts
+        (each already fills half the budget, e.g. a long free-text fallback) or
+        after SUMMARY_MAX_MERGE_ROUNDS, the remaining parts are truncated to fit.
+
+        Returns:
+            Tuple of (heading: str, summary: str)
+        """
+        timeline_budget = max(256, chunk_token_budget - SUMMARIZATION_PROMPT.static_tokens - estimate_tokens(existing_summary or ""))
+        chunks = self._chunk_texts(
+            [f"USER: {turn['user_query']}\nMODEL: {turn['model_response']}\n\n" for turn in turns],
+            timeline_budget
+        )
+        if len(chunks) <= 1:
+            return self.summarise(existing_summary, "".join(chunks), use_cache=use_cache)
+
+        print(f"[INFO] Hierarchical summarisation: {len(turns)} turns in {len(chunks)} chunks")
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            parts = list(executor.map(lambda chunk: self.summarise("", chunk, use_cache=use_cache)[1], chunks))
+
+            merge_budget = max(256, chunk_token_budget - SUMMARY_MERGE_PROMPT.static_tokens)
+            parts = [part for part in parts if part]
+            groups = self._chunk_texts([f"- {part}\n" for part in parts], merge_budget)
+            rounds = 0
+            # Reduce step: merge neighbouring part summaries until they fit in one prompt. A round
+            # where every group is a single part would only re-summarise each part on its own.
+            while len(groups) > 1 and len(groups) < len(parts) and rounds < SUMMARY_MAX_MERGE_ROUNDS:
+                parts = [
+                    result[1] for result in
+                    executor.map(lambda group: self._merge_summaries("", group, use_cache), groups)
+                    if result[1]
+                ]
+                groups = self._chunk_texts([f"- {part}\n" for part in parts], merge_budget)
+                rounds += 1
+
+        if len(groups) > 1:
+            # No further progress: give each remaining part an equal share of the budget
+            print(f"[WARNING] Summary merge did not converge ({len(groups)} groups after {rounds} round(s)); truncating parts")
+            share = max(64, merge_budget // len(parts)) * 4
+            groups = ["".join(f"- {part[:share]}\n" for part in parts)]
+
+        return self._merge_summaries(existing_summary, "".join(groups), use_cache)
+
+    @staticmethod
+    def _chunk_texts(texts: List[str], token_budget: int) -> List[str]:
+        """Greedily concatenates texts into chunks of at most `token_budget` estimated tokens (one text min)."""
+        chunks, current, used = [], [], 0
+        for text in texts:
+            cost = estimate_tokens(text)
+            if current and used + cost > token_budget:
+                chunks.append("".join(current))
+                current, used = [], 0
+            current.append(text)
+            used += cost
+        if current:
+            chunks.append("".join(current))
+        return chunks
+
+    def _merge_summaries(self, existing_summary: str, part_summaries: str, use_cache: bool = True):
+        """Merges chronological part summaries into a cumulative summary. Returns (heading, summary)."""
+        prompt = SUMMARY_MERGE_PROMPT.render(
+            existing_summary=existing_summary or "None.",
+            part_summaries=part_summaries,
+        )
+        raw_text, cache_key = self._generate(prompt, use_cache=use_cache)
+        data = self._clean_and_parse_json(raw_text)
+
+        if data and isinstance(data, dict):
+            heading = data.get("heading", "").strip() or None
+            summary = data.get("summary", "").strip() or existing_summary
+            self._remember(cache_key, raw_text)
+            return heading, summary
+
+        clean = raw_text.strip().split("---")[-1].strip()
+        return None, clean if clean else existing_summary
+
 if __name__ == "__main__":
     # Note: Since this block is meant for testing, we will mock the
     # self._call_hf_api method to return fixed JSON strings to simulate 
@@ -1,23 +1,216 @@
+import os
+import re
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from db import crud
 from flask import jsonify
 from . import embedding
 from typing import List
-from .LLM_module import ConditionAction, DataProcessingLLM
+from .LLM_module import ConditionAction, DataProcessingLLM, estimate_tokens
 
 data_processing_llm = DataProcessingLLM()
 embedder = embedding.MedicalEmbedder()
 
 # (Threshold removed to support End-of-Session processing)
 
+# Retrieval settings for the HISTORICAL RECORDS block of the condition detection prompt
+CONDITION_CONTEXT_TOP_K = int(os.environ.get("CONDITION_CONTEXT_TOP_K", 10))
+CONDITION_CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONDITION_CONTEXT_TOKEN_BUDGET", 800))
+CONDITION_NOTES_MAX_CHARS = 80
+
+
+def build_condition_context(db: Session, user_id: str, new_entries_context: List[str], query_embeddings=None) -> str:
+    """
+    Builds the compact historical-records context for detect_condition.
+
+    Instead of dumping the user's full condition history, retrieves only the top-k
+    conditions most similar to the new entries (pgvector) plus all active chronic
+    conditions, and renders them as a pipe-delimited table trimmed to the token budget.
+
+    Args:
+        new_entries_context: The new entry texts (insights or raw turns).
+        query_embeddings: Pre-computed vectors for the new entries, if available. When
+            missing, the joined entry text is embedded once.
+    """
+    if not query_embeddings:
+        joined = "\n".join(new_entries_context)
+        query_embeddings = [embedder.generate_embedding(joined).tolist()] if joined.strip() else []
+
+    similar = crud.get_similar_conditions(db, user_id, query_embeddings, k=CONDITION_CONTEXT_TOP_K)
+    chronic = crud.get_active_chronic_conditions(db, user_id)
+
+    # Most similar first, then any chronic condition retrieval did not surface
+    ordered, seen = [], set()
+    for condition in [c for c, _ in similar] + chronic:
+        if condition.id not in seen:
+            seen.add(condition.id)
+            ordered.append(condition)
+
+    return render_condition_table(ordered, CONDITION_CONTEXT_TOKEN_BUDGET)
+
+
+def render_condition_table(conditions, token_budget: int = CONDITION_CONTEXT_TOKEN_BUDGET) -> str:
+    """Renders conditions as `id | name | type | active | notes` rows, stopping at the token budget."""
+    if not conditions:
+        return "No historical conditions on record."
+
+    lines = ["id | name | type | active | notes"]
+    used = estimate_tokens(lines[0])
+    for c in conditions:
+        notes = " ".join((c.notes or "").split())
+        if len(notes) > CONDITION_NOTES_MAX_CHARS:
+            notes = notes[:CONDITION_NOTES_MAX_CHARS - 3] + "..."
+        line = f"{c.id} | {c.condition_name} | {c.condition_type} | {'yes' if c.is_active else 'no'} | {notes}"
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            lines.append(f"({len(conditions) - len(lines) + 1} less relevant record(s) omitted)")
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+
+# Synonym pre-check: cosine similarity (high-focus vectors) at/above which two names are the same condition
+CONDITION_SYNONYM_ENABLED = os.environ.get("CONDITION_SYNONYM_ENABLED", "true").lower() == "true"
+CONDITION_SYNONYM_THRESHOLD = float(os.environ.get("CONDITION_SYNONYM_THRESHOLD", 0.92))
+
+# Wording that can change a known condition's status. The pre-check's re-confirming updates keep
+# the stored status, so turns that mention any of this still go to the LLM.
+STATUS_CUE_PATTERN = re.compile(
+    r"\b(?:resolved|recovered|cured|cleared(?: up)?|gone|went away|healed|in remission|remission"
+    r"|no longer|not anymore|any ?more|stopped|stopping|discontinued|finished|came off|off (?:the|my)"
+    r"|worse|worsening|worsened|getting bad|flare[ds]?(?:-| )?(?:up)?|relapsed?|recurr(?:ed|ing|ence)"
+    r"|came back|back again|returned|better|improv(?:ed|ing)|diagnosed|ruled out|misdiagnos\w*)\b",
+    re.IGNORECASE,
+)
+
+
+def has_status_cue(texts: List[str]) -> bool:
+    """True when any text mentions a possible status change (see STATUS_CUE_PATTERN)."""
+    return any(STATUS_CUE_PATTERN.search(t or "") for t in texts)
+
+
+class ConditionSynonymIndex:
+    """
+    Per-user synonym index: one row of high-focus vectors ("The patient has {name}.")
+    per existing condition. Candidates are matched with a single vectorized cosine
+    similarity matrix (embedding.batch_cosine_similarity).
+    """
+
+    def __init__(self, conditions, vectors: np.ndarray):
+        self.conditions = conditions
+        self.vectors = vectors
+
+    @classmethod
+    def load(cls, db: Session, user_id: str) -> "ConditionSynonymIndex":
+        """Builds the index from the DB, backfilling focus vectors for older rows that lack one."""
+        conditions = crud.get_user_conditions(db, user_id, with_focus_vectors=True)
+        missing = {
+            c.id: embedder.generate_high_focus_embedding({"name": c.condition_name})
+            for c in conditions if c.focus_embedding_vector is None
+        }
+        # A failed HF call returns an all-zero vector: keep it out of the DB so the next load retries
+        # (in the index it simply never matches)
+        backfill = {cid: vector for cid, vector in missing.items() if np.any(vector)}
+        if backfill:
+            crud.set_condition_focus_embeddings(db, backfill)
+            print(f"[SYNONYM] Backfilled focus vectors for {len(backfill)} condition(s).")
+        if len(backfill) < len(missing):
+            print(f"[SYNONYM] Focus embedding failed for {len(missing) - len(backfill)} condition(s); retried on next load.")
+
+        vectors = [missing[c.id] if c.id in missing else list(c.focus_embedding_vector) for c in conditions]
+        matrix = np.asarray(vectors, dtype=np.float32) if vectors else np.zeros((0, embedder.dimension), dtype=np.float32)
+        return cls(conditions, matrix)
+
+    def __len__(self):
+        return len(self.conditions)
+
+    def match(self, candidate_names: List[str], threshold: float = CONDITION_SYNONYM_THRESHOLD):
+        """
+        Returns one entry per candidate: (existing_condition, score) when the best match
+        clears `threshold`, else (None, best_score). Every decision is logged.
+        """
+        if not candidate_names:
+            return []
+        if len(self) == 0:
+            return [(None, 0.0) for _ in candidate_names]
+
+        queries = np.asarray(
+            [embedder.generate_high_focus_embedding({"name": name}) for name in candidate_names], dtype=np.float32
+        )
+        similarity = embedding.batch_cosine_similarity(queries, self.vectors)
+        best = similarity.argmax(axis=1)
+
+        matches = []
+        for row, name in enumerate(candidate_names):
+            score = float(similarity[row, best[row]])
+            existing = self.conditions[best[row]]
+            if score >= threshold:
+                print(f"[SYNONYM] '{name}' ~ '{existing.condition_name}' (s={score:.3f}) -> existing {existing.id}")
+                matches.append((existing, score))
+            else:
+                print(f"[SYNONYM] '{name}' best '{existing.condition_name}' (s={score:.3f}) below {threshold} -> no match")
+                matches.append((None, score))
+        return matches
+
+
+def _update_action_for(existing, is_active=None) -> ConditionAction:
+    """An 'update' that re-confirms an existing condition; empty notes keep the stored notes."""
+    condition_type = existing.condition_type if existing.condition_type in ("condition", "symptom", "adr") else "condition"
+    return ConditionAction(
+        mode="update",
+        condition_name=existing.condition_name,
+        condition_type=condition_type,
+        condition_id=existing.id,
+        is_active=existing.is_active if is_active is None else is_active,
+        notes=""
+    )
+
+
+def precheck_candidates(index: ConditionSynonymIndex, candidate_names: List[str]):
+    """
+    Synonym pre-check ahead of the LLM. Candidates (e.g. insights'
+    primary_condition_or_symptom) that match an existing condition become
+    status-preserving 'update' actions without an LLM call.
+
+    Returns:
+        (matched_actions, unmatched_names). When unmatched_names is empty and the
+        new turns carry no status cue (has_status_cue) the caller can skip
+        detect_condition entirely.
+    """
+    matched_actions, unmatched = [], []
+    for name, (existing, _) in zip(candidate_names, index.match(candidate_names)):
+        if existing is None:
+            unmatched.append(name)
+        else:
+            matched_actions.append(_update_action_for(existing))
+    return matched_actions, unmatched
+
+
+def dedupe_condition_actions(index: ConditionSynonymIndex, actions: List[ConditionAction]) -> List[ConditionAction]:
+    """Turns LLM 'add' actions that are near-duplicates of existing conditions into 'update' actions."""
+    adds = [a for a in actions if a.mode == "add"]
+    if not adds or len(index) == 0:
+        return actions
+
+    matches = dict(zip(map(id, adds), index.match([a.condition_name for a in adds])))
+    deduped = []
+    for action in actions:
+        existing = matches.get(id(action), (None, 0.0))[0] if action.mode == "add" else None
+        deduped.append(_update_action_for(existing, is_active=action.is_active) if existing else action)
+    return deduped
+
+
 def check_and_log_user_conditions(
     db: Session,
     consultation_id: int,
-    user_health_records_context: str
+    user_health_records_context: str = None
 ):
     """
     Checks for new user conditions based on the last condition check time.
+    When no user_health_records_context is given, it is retrieved with
+    build_condition_context (top-k similar + active chronic conditions).
     Returns a consistent dict format.
     """
     
@@ -78,6 +271,14 @@ def check_and_log_user_conditions(
                 new_entries_context.append(entry.insights)
             else:
                 new_entries_context.append(f"USER: {entry.user_query}\nMODEL: {entry.model_response}")
+
+        if user_health_records_context is None:
+            user_health_records_context = build_condition_context(
+                db,
+                current_consultation.user_id,
+                new_entries_context,
+                crud.get_timeline_embeddings(db, [entry.id for entry in new_entries])
+            )
     except Exception as e:
         return {
             "success": False,
@@ -96,6 +297,11 @@ def check_and_log_user_conditions(
             user_health_records_context
         )
         
+        if CONDITION_SYNONYM_ENABLED:
+            detected_conditions = dedupe_condition_actions(
+                ConditionSynonymIndex.load(db, current_consultation.user_id), detected_conditions
+            )
+
         # Filter out 'ignore' modes before processing
         actionable_conditions = [c for c in detected_conditions if c.mode != 'ignore']
     
@@ -128,7 +334,10 @@ def check_and_log_user_conditions(
                     diagnosis_date=func.now(),
                     is_active=condition.is_active,  # Access directly from Pydantic object
                     notes=condition.notes,
-                    embedding_vector=embedding_vector
+                    embedding_vector=embedding_vector,
+                    idempotency_key=crud.condition_idempotency_key(
+                        consultation_id, condition.condition_name, condition.condition_type
+                    )
                 )
                 log_messages.append(f"Added: {condition.condition_name}")
             except Exception as e:
@@ -137,14 +346,17 @@ def check_and_log_user_conditions(
         elif condition.mode == 'update':
             try:
                 # Use condition.condition_id, which is Optional[int]
-                existing_condition = crud.get_condition_by_id(db, condition.condition_id)
+                existing_condition = (
+                    crud.get_condition_by_id(db, str(condition.condition_id))
+                    if condition.condition_id is not None else None
+                )
                 
                 if existing_condition:
                     crud.update_user_condition(
                         db,
-                        condition_id=condition.condition_id,
+                        condition_id=existing_condition.id,
                         new_status=condition.is_active,
-                        notes=condition.notes
+                        notes=condition.notes or None
                     )
                     log_messages.append(f"Updated: {condition.condition_name} (ID: {condition.condition_id})")
                 else:
@@ -162,7 +374,10 @@ def check_and_log_user_conditions(
                         diagnosis_date=func.now(),
                         is_active=condition.is_active,
                         notes=condition.notes,
-                        embedding_vector=embedding_vector
+                        embedding_vector=embedding_vector,
+                        idempotency_key=crud.condition_idempotency_key(
+                            consultation_id, condition.condition_name, condition.condition_type
+                        )
                     )
                     log_messages.append(f"Added (from update fallback): {condition.condition_name}")
             except Exception as e:
@@ -3,6 +3,7 @@ import numpy as np
 
 from db import crud
 from .embedding import MedicalEmbedder
+from .emergency import check_emergency
 from .LLM_module import ConsultationLLM, DataProcessingLLM, ExtractionInsights
 
 # initialising LLM models and embedder (module-level singletons)
@@ -54,13 +55,28 @@ def generate_consultation_response(
     """
     Orchestrates the ReAct dual-pass agentic loop for a consultation response.
     """
-    # Get metadata about the *current* consultation session
-    current_consultation = crud.get_consultation_by_id(db, consultation_id)
+    # Unambiguous emergencies get templated 911/EMS guidance without waiting on Pass 1
+    emergency_answer = check_emergency(user_query)
+    if emergency_answer:
+        return {
+            "model_response": emergency_answer,
+            "timeline_context": "Emergency fast path (no LLM call)",
+            "user_health_records_context": ""
+        }
+
+    # Consultation header, user profile, active conditions and recent timeline in one round-trip
+    context = crud.load_consultation_context(
+        db,
+        user_id=user_id,
+        consultation_id=consultation_id,
+        timeline_limit=int(os.environ.get("TIMELINE_NATIVE_HISTORY_LIMIT", 20))
+    )
+    current_consultation = context.consultation
     
     current_consultation_context = ""
     
-    # Fetch user metadata and active conditions
-    user = crud.get_user_by_id(db, user_id)
+    # User metadata and active conditions
+    user = context.user
     user_metadata = ""
     if user:
         age_str = f"{user.age} years old" if user.age else "Unknown age"
@@ -69,16 +85,9 @@ def generate_consultation_response(
         height_str = f", Height: {user.height_cm}cm" if user.height_cm else ""
         weight_str = f", Weight: {user.weight_kg}kg" if user.weight_kg else ""
         
-        # Get active conditions
-        from db.models import UserCondition
-        conditions = db.query(UserCondition).filter(
-            UserCondition.user_id == user_id, 
-            UserCondition.is_active == True
-        ).all()
-        
         cond_str = "None reported"
-        if conditions:
-            cond_str = ", ".join([c.condition_name for c in conditions])
+        if context.active_conditions:
+            cond_str = ", ".join(context.active_conditions)
             
         user_metadata = f"Patient Profile: {age_str}, {gender_str}{blood_str}{height_str}{weight_str}\nKnown Active Conditions: {cond_str}\n"
 
@@ -89,26 +98,22 @@ def generate_consultation_response(
             f"Current Session Start Date: {current_consultation.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
         )
 
-    # 1. Get consultation timeline history for session context (longer native history)
-    consultation_timeline_entries = crud.get_recent_timeline_entries(
-        db,
-        consultation_id=consultation_id,
-        limit=int(os.environ.get("TIMELINE_NATIVE_HISTORY_LIMIT", 20))
-    )
+    # 1. Consultation timeline history for session context (longer native history)
+    consultation_timeline_entries = context.timeline
     
     from .MemoryManager import format_timeline_as_messages
-    from .LLM_module import AGENTIC_SYSTEM_PROMPT, RESOLUTION_SYSTEM_PROMPT
+    from .LLM_module import AGENTIC_PROMPT, RESOLUTION_PROMPT
     
     messages = format_timeline_as_messages(consultation_timeline_entries)
     
     if current_consultation and current_consultation.heading and current_consultation.heading.startswith("Resolution Assessment:"):
         condition_name = current_consultation.heading.split(":", 1)[1].strip()
-        system_prompt = RESOLUTION_SYSTEM_PROMPT.format(
+        system_prompt = RESOLUTION_PROMPT.render(
             target_condition=condition_name,
             current_consultation_context=current_consultation_context
         )
     else:
-        system_prompt = AGENTIC_SYSTEM_PROMPT.format(current_consultation_context=current_consultation_context)
+        system_prompt = AGENTIC_PROMPT.render(current_consultation_context=current_consultation_context)
     
     if len(messages) == 0:
         messages.append({"role": "user", "content": system_prompt + "\n\nUser Query:\n" + user_query})
@@ -159,9 +164,11 @@ def generate_consultation_response(
             print("[STEP] Agent requested RESOLVE_CONDITION in Pass 2")
             if current_consultation and current_consultation.heading and current_consultation.heading.startswith("Resolution Assessment:"):
                 condition_name = current_consultation.heading.split(":", 1)[1].strip()
-                success = crud.resolve_user_condition(db, user_id, condition_name)
+                # Resolve + close the consultation in one transaction
+                success = crud.resolve_user_condition(db, user_id, condition_name, commit=False)
                 if success:
-                    crud.end_consultation(db, consultation_id)
+                    crud.end_consultation(db, consultation_id, commit=False)
+                    db.commit()
                     final_answer = f"I have successfully verified your recovery. I have officially marked {condition_name} as resolved in your medical profile."
                 else:
                     final_answer = "I encountered an error resolving your condition in the database."
@@ -176,9 +183,10 @@ def generate_consultation_response(
         print("[STEP] Agent requested RESOLVE_CONDITION")
         if current_consultation and current_consultation.heading and current_consultation.heading.startswith("Resolution Assessment:"):
             condition_name = current_consultation.heading.split(":", 1)[1].strip()
-            success = crud.resolve_user_condition(db, user_id, condition_name)
+            success = crud.resolve_user_condition(db, user_id, condition_name, commit=False)
             if success:
-                crud.end_consultation(db, consultation_id)
+                crud.end_consultation(db, consultation_id, commit=False)
+                db.commit()
                 combined_response = f"[SYSTEM] RESOLVE_CONDITION\n\nI have successfully verified your recovery. I have officially marked {condition_name} as resolved in your medical profile."
             else:
                 combined_response = "[ANSWER] I encountered an error resolving your condition in the database."
@@ -211,7 +219,7 @@ def generate_consultation_response(
 
 
 # ------------- Extract insights from response ----------------
-def extract_insights(user_query: str, model_response: str) -> ExtractionInsights:
+def extract_insights(user_query: str, model_response: str, use_cache: bool = True) -> ExtractionInsights:
     """
     Uses an LLM to generate a concise, high-density insight from a single 
     user-model turn for vector indexing.
@@ -219,6 +227,7 @@ def extract_insights(user_query: str, model_response: str) -> ExtractionInsights
     Args:
         user_query: The text the user submitted.
         model_response: The text the model responded with.
+        use_cache: Set to False to bypass the LLM response cache and force a fresh call.
 
     Returns:
         ExtractionInsights object with insight details, or default if LLM fails.
@@ -228,7 +237,8 @@ def extract_insights(user_query: str, model_response: str) -> ExtractionInsights
         # Call the insights extraction LLM
         insights: ExtractionInsights = data_processing_llm.extract_insights(
             user_query=user_query,
-            model_response=model_response
+            model_response=model_response,
+            use_cache=use_cache
         )
         return insights
     
@@ -242,3 +252,34 @@ def extract_insights(user_query: str, model_response: str) -> ExtractionInsights
             icd_codes_extracted=[]
         )
 
+
+
+# ------------- Extract insights for many turns at once ----------------
+def extract_insights_batch(turns: list, use_cache: bool = True) -> dict:
+    """
+    Batched counterpart of extract_insights: packs several timeline turns into
+    each LLM prompt (see DataProcessingLLM.extract_insights_batch).
+
+    Args:
+        turns: List of {"id", "user_query", "model_response"} dicts.
+        use_cache: Set to False to bypass the LLM response cache.
+
+    Returns:
+        Dict mapping entry id -> ExtractionInsights. Every requested id is present;
+        turns that could not be processed get a default (insight_found=False) object.
+    """
+    try:
+        results = data_processing_llm.extract_insights_batch(turns, use_cache=use_cache)
+    except Exception as e:
+        print(f"[WARNING] Failed to extract batched insights: {str(e)}")
+        results = {}
+
+    for turn in turns:
+        if turn["id"] not in results:
+            results[turn["id"]] = ExtractionInsights(
+                insight_found=False,
+                compressed_summary="",
+                primary_condition_or_symptom="",
+                icd_codes_extracted=[]
+            )
+    return results
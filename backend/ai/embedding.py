@@ -20,15 +20,22 @@ class MedicalEmbedder:
         if not hasattr(self, 'dimension'):
             self.model_name = model_name
             self.dimension = int(os.environ.get("VECTOR_DIMENSION", 768))
+            # Match the DB column type (db/models.py VECTOR_STORAGE): halfvec stores float16,
+            # so embeddings are float16 from here on instead of being narrowed by Postgres
+            halfvec = os.environ.get("VECTOR_STORAGE", "vector").lower() == "halfvec"
+            self.dtype = np.float16 if halfvec else np.float32
             self.api_url = f"https://api-inference.huggingface.co/pipeline/feature-extraction/{self.model_name}"
             
             hf_token = os.environ.get("HF_API_TOKEN")
             if not hf_token:
                 print("[WARN] HF_API_TOKEN not found. Embeddings will fail.")
             self.headers = {"Authorization": f"Bearer {hf_token}"}
-            print(f"[OK] MedicalEmbedder initialized to use HF API: {self.model_name} ({self.dimension}D)")
+            print(f"[OK] MedicalEmbedder initialized to use HF API: {self.model_name} ({self.dimension}D, {np.dtype(self.dtype).name})")
 
     def _call_hf_api(self, text: str) -> np.ndarray:
+        return self._fetch_embedding(text).astype(self.dtype)
+
+    def _fetch_embedding(self, text: str) -> np.ndarray:
         try:
             response = requests.post(
                 self.api_url, 
@@ -107,6 +114,9 @@ class MedicalEmbedder:
 
 def calculate_similarity(vector1: np.ndarray, vector2: np.ndarray) -> float:
     """Calculates Cosine Similarity between two vectors manually to avoid sklearn."""
+    # float16 embeddings: accumulate in float32 (a 768-term float16 dot product loses precision)
+    vector1 = np.asarray(vector1, dtype=np.float32)
+    vector2 = np.asarray(vector2, dtype=np.float32)
     dot_product = np.dot(vector1, vector2)
     norm1 = np.linalg.norm(vector1)
     norm2 = np.linalg.norm(vector2)
@@ -116,6 +126,30 @@ def calculate_similarity(vector1: np.ndarray, vector2: np.ndarray) -> float:
         
     return float(dot_product / (norm1 * norm2))
 
+def batch_cosine_similarity(queries: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """
+    Vectorized calculate_similarity: cosine similarity of every query row against
+    every index row in one matrix product.
+
+    Args:
+        queries: (m, d) array (a single (d,) vector is treated as m=1).
+        index: (n, d) array.
+
+    Returns:
+        (m, n) similarity matrix. Rows/columns for zero vectors are 0.0.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    index = np.atleast_2d(np.asarray(index, dtype=np.float32))
+    if queries.size == 0 or index.size == 0:
+        return np.zeros((queries.shape[0], index.shape[0] if index.size else 0), dtype=np.float32)
+
+    q_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    i_norms = np.linalg.norm(index, axis=1, keepdims=True)
+    # Zero-norm vectors (failed embeddings) get similarity 0 instead of NaN
+    q_unit = np.divide(queries, q_norms, out=np.zeros_like(queries), where=q_norms != 0)
+    i_unit = np.divide(index, i_norms, out=np.zeros_like(index), where=i_norms != 0)
+    return q_unit @ i_unit.T
+
 # --- Main Execution Block ---
 
 if __name__ == "__main__":
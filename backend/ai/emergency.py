@@ -0,0 +1,267 @@
+import os
+import re
+import json
+import threading
+from typing import Dict, Iterable, NamedTuple, Optional
+
+# Deterministic fast path for the clearest emergency presentations.
+#
+# AGENTIC_SYSTEM_PROMPT already tells MedGemma to answer emergencies with 911/EMS
+# guidance, but that still costs a full remote generation. The phrases below are
+# unambiguous enough to answer locally, before Pass 1. Anything subtler (high-risk
+# patients, resolved red flags) is left to the model.
+
+EMERGENCY_FAST_PATH_ENABLED = os.environ.get("EMERGENCY_FAST_PATH_ENABLED", "true").lower() == "true"
+
+
+class EmergencyMatch(NamedTuple):
+    category: str
+    phrase: str
+
+
+# Who the symptom is happening to: anchors phrases that are everyday speech on their own
+# ("can't breathe through my nose") to someone describing it right now
+_SUBJECT = (r"(?:i|he|she|they|we|(?:my|our) (?:son|daughter|husband|wife|mom|mum|dad|father|mother|baby|"
+            r"child|kid|friend|partner|brother|sister))")
+
+# Suffix for the suicidal phrases: not when the same sentence asks about a side effect
+_NOT_SIDE_EFFECT = r"(?![^.!?]{0,40}\bside[- ]effects?\b)"
+
+# category -> phrases (regex fragments, matched case-insensitively on word boundaries)
+EMERGENCY_PATTERNS = {
+    "sudden_severe": [
+        r"worst (?:headache|head ache|pain) (?:of|in) my (?:entire )?life",
+        r"worst (?:headache|pain) i(?:'ve| have)? ever (?:had|felt|experienced)",
+        r"thunderclap (?:headache|pain)",
+        r"(?:headache|pain) (?:came on |hit )?like a thunderclap",
+        r"most (?:intense|severe) (?:headache|pain) i(?:'ve| have)? ever (?:had|felt)",
+    ],
+    "loss_of_function": [
+        r"slurr(?:ed|ing) (?:(?:my|his|her|their) )?(?:speech|words)",
+        r"(?:speech|words) (?:is |are )?slurr(?:ed|ing)",
+        r"(?:face|mouth|smile) (?:is )?droop(?:ing|y|s|ed)",
+        r"(?:can't|cannot|can not|unable to) (?:move|feel) (?:my )?(?:left|right|one) (?:arm|leg|side)",
+        r"(?:numb|weak|paralys?ed)(?:ness)? (?:on|in) (?:my )?(?:left|right|one) side",
+        r"one[- ]sided (?:weakness|numbness)",
+        r"lost control of my (?:bladder|bowels?)",
+        r"numb(?:ness)? in (?:my )?(?:groin|saddle area)",
+        r"(?:passed out|fainted|lost consciousness) and (?:can't|cannot|won't) (?:wake|get up)",
+    ],
+    "airway": [
+        r"lips (?:are |is )?(?:turning |going |getting |looking |look |went )?(?:blue|purple)",
+        r"blue lips",
+        # Not "can't breathe through my nose" (a blocked nose is not an airway emergency)
+        _SUBJECT + r"(?:'s| is| am| are)? (?:(?:suddenly|really|literally|just|still) )?(?:can't|cannot|can not|"
+        r"unable to|can barely) breathe\b(?! (?:well |properly )?(?:through|out of|with) (?:my|his|her|their|the|one) "
+        r"(?:nose|nostrils?))",
+        r"(?:throat|tongue) (?:is |feels )?(?:closing|swelling) up",
+        r"(?:can't|cannot) (?:speak|talk) in (?:full )?sentences",
+        r"chok(?:ing|ed) and (?:can't|cannot) (?:breathe|cough|speak)",
+    ],
+    "cardiac": [
+        r"chest (?:pain|pressure|tightness) (?:spreading|radiating|going) (?:to|into|down) my (?:left )?(?:arm|jaw|neck|back)",
+        r"crushing (?:chest )?(?:pain|pressure) in my chest",
+        r"crushing chest (?:pain|pressure)",
+    ],
+    "bleeding": [
+        r"bleeding (?:that )?(?:won't|will not|doesn't|does not|can't|cannot) stop",
+        r"(?:can't|cannot) stop (?:the )?bleeding",
+        r"(?:vomiting|coughing|throwing up) (?:up )?(?:a lot of )?blood",
+    ],
+    "self_harm": [
+        r"(?:want|going|plan(?:ning)?) to (?:kill myself|end my life|end it all)",
+        r"\bkill myself\b",
+        # First person only: "is suicidal ideation a side effect of ...?" is a question for the model
+        r"(?:i(?:'m| am)(?: \w+){0,2}|i (?:feel|felt)(?: \w+)?) suicidal\b" + _NOT_SIDE_EFFECT,
+        r"(?:i(?:'ve| have)(?: been)?(?: \w+){0,2}|my) suicidal (?:thoughts|feelings|urges|ideation)" + _NOT_SIDE_EFFECT,
+        r"i(?:'m| am)? (?:\w+ )?(?:thinking (?:about|of)|considering|planning) (?:committing )?suicide",
+        r"(?:don't|do not) (?:want|care) to (?:live|be alive|wake up)",
+        r"better off dead",
+    ],
+}
+
+# Words in the few tokens before a match that flip its meaning ("no slurred speech"), but not
+# idioms that negate nothing ("I have no idea why", "I don't know what to do")
+_NEGATION_PATTERN = re.compile(r"\b(?:no|not|never|without|denies|deny|don't|doesn't|didn't|isn't|aren't)\b"
+                               r"(?! (?:idea|clue|sure|know|understand)\b)", re.IGNORECASE)
+# A negation only reaches the symptom in its own clause ("I have no idea why but I can't breathe")
+_CLAUSE_BOUNDARY_PATTERN = re.compile(r"[.,;:!?]|\b(?:but|and|so|yet|because|though|although|however)\b",
+                                      re.IGNORECASE)
+
+# Past-tense resolved red flags go to the model (Pattern 1b wants same-day ER, not 911).
+# A time reference only dates its own clause ("my headache from last week came back and now it
+# is the worst headache of my life" is current); a resolution also covers the symptoms before it.
+_PAST_TIME_PATTERN = re.compile(
+    r"\b(?:last (?:week|month|year)|years? ago|months? ago|weeks? ago|used to|back when)\b",
+    re.IGNORECASE,
+)
+_RESOLUTION_PATTERN = re.compile(
+    r"\b(?:went away|gone now|has resolved|resolved now|is better now|stopped (?:yesterday|last))\b",
+    re.IGNORECASE,
+)
+
+# Recurring or situational episodes ("I can't breathe when running") are questions for the model
+_EPISODIC_PATTERN = re.compile(r"^\W*(?:when|whenever|every time|each time)\b", re.IGNORECASE)
+
+# Questions about whether something is normal, even in the first person ("is it normal that I ...")
+_NORMALCY_QUESTION_PATTERN = re.compile(
+    r"^\s*(?:is it (?:normal|common|ok|okay|usual|typical|bad|serious|dangerous)|is this (?:normal|common|serious)|"
+    r"should i (?:worry|be worried|be concerned)|why do(?:es)? (?:i|my|people))\b",
+    re.IGNORECASE,
+)
+
+# Educational questions ("what does slurred speech indicate?") with nobody affected
+_GENERAL_QUESTION_PATTERN = re.compile(r"^\s*(?:what|why|how|when|which|does|do|is|are|can|could|should)\b", re.IGNORECASE)
+_PERSON_PATTERN = re.compile(r"\b(?:i|i'm|i've|me|my|we|our|he|she|his|her|him|they|their|them|son|daughter|"
+                             r"husband|wife|mom|mum|dad|father|mother|baby|child|friend|partner)\b", re.IGNORECASE)
+
+_COMPILED_PATTERNS = [
+    (category, re.compile(r"\b(?:" + "|".join(phrases) + r")", re.IGNORECASE))
+    for category, phrases in EMERGENCY_PATTERNS.items()
+]
+
+EMERGENCY_RESPONSES = {
+    "sudden_severe": (
+        "A sudden, severe headache or pain like this can be a sign of a medical emergency such as bleeding in the brain. "
+        "Please call 911 (or your local emergency number) right now, or have someone take you to the nearest emergency "
+        "department immediately. Do not drive yourself, and do not wait to see if it gets better."
+    ),
+    "loss_of_function": (
+        "What you describe (new slurred speech, facial drooping, one-sided weakness or numbness, or loss of bladder/bowel "
+        "control) can be a sign of a stroke or spinal cord emergency, where every minute matters. Call 911 (or your local "
+        "emergency number) now. Note the time the symptoms started and tell the emergency team. Do not eat, drink or "
+        "drive yourself."
+    ),
+    "airway": (
+        "Difficulty breathing, blue or purple lips, or a throat that feels like it is closing are signs of a breathing "
+        "emergency. Call 911 (or your local emergency number) immediately. If you have a prescribed epinephrine "
+        "auto-injector or rescue inhaler, use it now while help is on the way, and stay upright."
+    ),
+    "cardiac": (
+        "Chest pain or pressure that spreads to the arm, jaw, neck or back can be a heart attack. Call 911 (or your local "
+        "emergency number) now and do not drive yourself. If you are not allergic to aspirin and have not been told to "
+        "avoid it, chewing one regular aspirin while you wait may help."
+    ),
+    "bleeding": (
+        "Bleeding that will not stop, or vomiting or coughing up blood, needs emergency care. Call 911 (or your local "
+        "emergency number) now. For external bleeding, press firmly on the wound with a clean cloth and keep the pressure "
+        "on until help arrives."
+    ),
+    "self_harm": (
+        "I'm really sorry you're feeling this way, and I'm glad you told me. Your safety matters right now. If you are in "
+        "immediate danger, please call 911 (or your local emergency number). You can also call or text 988 to reach the "
+        "Suicide & Crisis Lifeline, available 24/7. If you can, stay with someone you trust and move away from anything "
+        "you could use to hurt yourself."
+    ),
+}
+
+stats: Dict[str, int] = {"checked": 0, "matched": 0, **{category: 0 for category in EMERGENCY_PATTERNS}}
+_stats_lock = threading.Lock()
+
+
+def _clause_bounds(text: str, start: int, end: int):
+    """(clause_start, clause_end) of the clause that contains text[start:end]."""
+    before = list(_CLAUSE_BOUNDARY_PATTERN.finditer(text, 0, start))
+    after = _CLAUSE_BOUNDARY_PATTERN.search(text, end)
+    return (before[-1].end() if before else 0), (after.start() if after else len(text))
+
+
+def _is_resolved(text: str, start: int, end: int) -> bool:
+    """True when the match's clause is dated in the past, or a later clause says it resolved."""
+    clause_start, clause_end = _clause_bounds(text, start, end)
+    return bool(_PAST_TIME_PATTERN.search(text, clause_start, clause_end)
+                or _RESOLUTION_PATTERN.search(text, clause_start))
+
+
+def _is_episodic(text: str, end: int) -> bool:
+    """True when the match is qualified as a recurring situation ("... when running")."""
+    return bool(_EPISODIC_PATTERN.search(text[end:end + 20]))
+
+
+def _is_negated(text: str, start: int) -> bool:
+    """True when a negation precedes `start` within the same clause (and the last 30 characters)."""
+    window = text[max(0, start - 30):start]
+    boundaries = list(_CLAUSE_BOUNDARY_PATTERN.finditer(window))
+    clause = window[boundaries[-1].end():] if boundaries else window
+    return bool(_NEGATION_PATTERN.search(clause))
+
+
+def match_emergency(text: str) -> Optional[EmergencyMatch]:
+    """Returns the first unambiguous, current emergency phrase in `text`, or None."""
+    if not text:
+        return None
+    if _NORMALCY_QUESTION_PATTERN.search(text):
+        return None
+    if _GENERAL_QUESTION_PATTERN.search(text) and not _PERSON_PATTERN.search(text):
+        return None
+
+    for category, pattern in _COMPILED_PATTERNS:
+        for match in pattern.finditer(text):
+            if (_is_negated(text, match.start()) or _is_resolved(text, match.start(), match.end())
+                    or _is_episodic(text, match.end())):
+                continue
+            return EmergencyMatch(category, match.group(0))
+    return None
+
+
+def check_emergency(user_query: str) -> Optional[str]:
+    """
+    Runs the fast path for one user message and updates the match counters.
+    Returns the templated "[ANSWER] ..." response on a match, otherwise None.
+    """
+    if not EMERGENCY_FAST_PATH_ENABLED:
+        return None
+
+    match = match_emergency(user_query)
+    with _stats_lock:
+        stats["checked"] += 1
+        if match:
+            stats["matched"] += 1
+            stats[match.category] += 1
+    if not match:
+        return None
+
+    print(f"[EMERGENCY] Fast path matched '{match.phrase}' ({match.category}); "
+          f"{stats['matched']}/{stats['checked']} messages matched so far.")
+    return f"[ANSWER] {EMERGENCY_RESPONSES[match.category]}"
+
+
+def evaluate(records: Iterable[dict]) -> Dict:
+    """
+    Scores the matcher on a labelled corpus: each record is {"text", "category"}
+    where category is an EMERGENCY_PATTERNS key or null for non-emergencies.
+    """
+    total = correct = false_positives = false_negatives = 0
+    failures = []
+    for record in records:
+        total += 1
+        match = match_emergency(record["text"])
+        predicted = match.category if match else None
+        expected = record.get("category")
+        if predicted == expected:
+            correct += 1
+            continue
+        if predicted and not expected:
+            false_positives += 1
+        elif expected and not predicted:
+            false_negatives += 1
+        failures.append({"text": record["text"], "expected": expected, "predicted": predicted})
+
+    return {
+        "total": total,
+        "accuracy": correct / total if total else 0.0,
+        "false_positives": false_positives,
+        "false_negatives": false_negatives,
+        "failures": failures,
+    }
+
+
+if __name__ == "__main__":
+    # python -m ai.emergency [corpus.jsonl]   (defaults to the bundled corpus; exits 1 on any failure)
+    import sys
+
+    corpus_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "emergency_corpus.jsonl")
+    with open(corpus_path, encoding="utf-8") as f:
+        report = evaluate(json.loads(line) for line in f if line.strip())
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failures"] else 0)
@@ -0,0 +1,168 @@
+import re
+import json
+from functools import lru_cache
+from typing import Any, List, Optional, Set, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, TypeAdapter
+
+# Single-pass extraction of the first complete JSON value from chatty LLM output.
+#
+# The scanner tokenises the text once (strings, brackets, identifiers, other
+# runs), tracks a bracket stack and copies the candidate value as it goes.
+# Outside of strings it repairs the usual Python-isms (None/True/False,
+# 'single quoted' strings, trailing commas); text inside strings is never
+# touched. A candidate that turns out unbalanced or invalid is dropped and
+# scanning resumes at the next opening bracket that can still close, so
+# surrounding prose, markdown fences and stray braces cost a forward scan
+# instead of greedy-regex backtracking.
+
+M = TypeVar("M", bound=BaseModel)
+
+_PYTHON_LITERALS = {"None": "null", "True": "true", "False": "false"}
+_CLOSERS = {"{": "}", "[": "]"}
+# Far deeper than any schema we prompt for; deeper candidates are runaway generations
+_MAX_DEPTH = 64
+# Raw control characters inside strings are invalid JSON; LLMs emit them anyway
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_CONTROL_PATTERN = re.compile(r"[\n\r\t]")
+
+_UNESCAPED_DOUBLE_QUOTE = re.compile(r'(?<!\\)"')
+
+_OPENER_PATTERN = re.compile(r"[{\[]")
+# Cheap rejection of bracketed prose ("{placeholder}", "[note]") before scanning
+_PLAUSIBLE_START = re.compile(r"""\{\s*["'}]|\[\s*(?:[\[\]{"'\-\d]|(?:true|false|null|True|False|None)\b)""")
+# One token per match: double/single-quoted string, bracket, identifier, a run of
+# anything else, or a lone quote (an unterminated string).
+_TOKEN_PATTERN = re.compile(
+    r'"[^"\\]*(?:\\.[^"\\]*)*"'
+    r"|'[^'\\]*(?:\\.[^'\\]*)*'"
+    r"|[{}\[\]]"
+    r"|[A-Za-z_]\w*"
+    r"|[^\"'{}\[\]A-Za-z_]+"
+    r"|[\"']"
+)
+
+
+def _escape_controls(value: str) -> str:
+    return _CONTROL_PATTERN.sub(lambda m: _CONTROL_ESCAPES[m.group(0)], value)
+
+
+def _scan_value(text: str, start: int, dead: Set[int]) -> Optional[str]:
+    """
+    Scans the bracketed value opening at text[start] and returns it as normalised
+    JSON text, or None if it is unbalanced.
+
+    On failure every opener still open is added to `dead`: a scan starting at any
+    of them would hit the same mismatch, end of input or depth limit, so callers
+    skip them.
+    """
+    out: List[str] = []
+    stack: List[Tuple[str, int]] = []
+
+    for match in _TOKEN_PATTERN.finditer(text, start):
+        token = match.group(0)
+        first = token[0]
+
+        if first == '"':
+            if len(token) == 1:
+                break
+            out.append(_escape_controls(token))
+        elif first == "'":
+            if len(token) == 1:
+                break
+            # Re-quote a Python-style string as JSON
+            body = _UNESCAPED_DOUBLE_QUOTE.sub('\\"', token[1:-1].replace("\\'", "'"))
+            out.append('"' + _escape_controls(body) + '"')
+        elif first in _CLOSERS:
+            stack.append((_CLOSERS[first], match.start()))
+            if len(stack) > _MAX_DEPTH:
+                break
+            out.append(token)
+        elif first == "}" or first == "]":
+            if not stack or stack[-1][0] != first:
+                break
+            stack.pop()
+            # Drop a trailing comma before the closer: [1, 2,] / {"a": 1,}
+            last = out[-1].rstrip() if out else ""
+            if last.endswith(","):
+                out[-1] = last[:-1]
+            out.append(token)
+            if not stack:
+                return "".join(out)
+        elif first.isalpha() or first == "_":
+            out.append(_PYTHON_LITERALS.get(token, token))
+        else:
+            out.append(token)
+
+    dead.update(position for _, position in stack)
+    return None
+
+
+def _first_json(text: str) -> Tuple[Optional[str], Any]:
+    """Returns (normalised JSON text, parsed value) of the first complete, valid JSON value."""
+    if not text:
+        return None, None
+
+    # Fast path: the whole output is already valid JSON
+    stripped = text.strip()
+    if stripped[:1] in _CLOSERS:
+        try:
+            return stripped, json.loads(stripped)
+        except (ValueError, RecursionError):
+            # RecursionError: pathologically deep nesting in a runaway generation
+            pass
+
+    dead: Set[int] = set()
+    for opener in _OPENER_PATTERN.finditer(text):
+        start = opener.start()
+        if start in dead or not _PLAUSIBLE_START.match(text, start):
+            continue
+        value = _scan_value(text, start, dead)
+        if value is not None:
+            try:
+                return value, json.loads(value)
+            except ValueError:
+                pass
+    return None, None
+
+
+def find_json(text: str) -> Optional[str]:
+    """Returns the first complete, valid JSON object/array in `text` as normalised JSON text."""
+    return _first_json(text)[0]
+
+
+def extract_json(text: str) -> Any:
+    """Parses the first complete JSON value in `text`; None if there is none."""
+    return _first_json(text)[1]
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def parse_model(text: str, model: Type[M]) -> M:
+    """
+    Validates the first JSON object in `text` straight into `model`.
+
+    Raises:
+        ValueError (pydantic's ValidationError included) if no JSON value is
+        found or it does not fit the model.
+    """
+    value, data = _first_json(text)
+    if value is None:
+        raise ValueError("Failed to parse LLM response into JSON.")
+    return model.model_validate(data)
+
+
+def parse_model_list(text: str, model: Type[M]) -> List[M]:
+    """
+    Like parse_model, for outputs that should be a list of `model`; a single
+    object is accepted as a one-item list.
+    """
+    value, data = _first_json(text)
+    if value is None:
+        raise ValueError("Failed to parse LLM response into JSON.")
+    if isinstance(data, dict):
+        return [model.model_validate(data)]
+    return _list_adapter(model).validate_python(data)
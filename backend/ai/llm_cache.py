@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class LLMResponseCache:
+    """
+    Two-tier response cache for the deterministic DataProcessingLLM calls.
+
+    Tier 1 is a bounded in-process LRU (fast, lost on restart).
+    Tier 2 is the `llm_response_cache` Postgres table (survives restarts and is
+    shared across gunicorn workers). Both tiers honour the same TTL; expired rows
+    are deleted at startup (init_db) and, at most once per purge interval, by the
+    writing process.
+
+    Keys are sha256(model_name, prompt, generation params), so any change to the
+    prompt template, model or sampling parameters naturally misses the cache.
+    Cache failures are never fatal — a broken tier just behaves like a miss.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 512)),
+        ttl_seconds: int = int(os.environ.get("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+        persistent: bool = os.environ.get("LLM_CACHE_PERSISTENT", "true").lower() == "true",
+        purge_interval_seconds: int = int(os.environ.get("LLM_CACHE_PURGE_INTERVAL_SECONDS", 3600)),
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self.purge_interval_seconds = purge_interval_seconds
+        self._next_purge = time.time() + purge_interval_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str, params: Dict[str, Any]) -> str:
+        """Builds the deterministic cache key for a single LLM request."""
+        material = json.dumps([model_name, prompt, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Looks the key up in memory first, then in Postgres (promoting DB hits to memory)."""
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                response, expires_at = item
+                if expires_at > time.time():
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return response
+                del self._memory[key]
+
+        if self.persistent:
+            response = self._db_get(key)
+            if response is not None:
+                self._memory_set(key, response)
+                with self._lock:
+                    self.stats["db_hits"] += 1
+                return response
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, model_name: str, response: str) -> None:
+        """Writes a response to both tiers."""
+        if not response:
+            return
+        self._memory_set(key, response)
+        if self.persistent:
+            self._db_set(key, model_name, response)
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    # ---- internals ----
+
+    def _memory_set(self, key: str, response: str) -> None:
+        with self._lock:
+            self._memory[key] = (response, time.time() + self.ttl_seconds)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _db_get(self, key: str) -> Optional[str]:
+        # Imported lazily so the LLM module stays importable without a database
+        from db import crud
+        from db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return crud.get_llm_cache_entry(db, key)
+        except Exception as e:
+            print(f"[WARNING] LLM cache lookup failed, treating as miss: {e}")
+            return None
+        finally:
+            db.close()
+
+    def _db_set(self, key: str, model_name: str, response: str) -> None:
+        from db import crud
+        from db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            crud.upsert_llm_cache_entry(db, key, model_name, response, self.ttl_seconds)
+            if self._purge_due():
+                deleted = crud.purge_expired_llm_cache_entries(db)
+                if deleted:
+                    print(f"[LLM CACHE] Purged {deleted} expired entries")
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] Could not persist LLM cache entry: {e}")
+        finally:
+            db.close()
+
+    def _purge_due(self) -> bool:
+        """True at most once per purge interval (0 disables the periodic purge)."""
+        if self.purge_interval_seconds <= 0:
+            return False
+        with self._lock:
+            now = time.time()
+            if now < self._next_purge:
+                return False
+            self._next_purge = now + self.purge_interval_seconds
+            return True
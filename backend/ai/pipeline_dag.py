@@ -0,0 +1,164 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class Stage:
+    """
+    A single node of the post-processing DAG.
+
+    `fn` receives a dict of {dependency_name: dependency_value} and returns this
+    stage's value. If it still raises after `retries` extra attempts, `fallback`
+    (same signature) supplies a degraded value; without a fallback the stage
+    fails and every stage depending on it is skipped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Dict[str, Any]], Any],
+        depends_on: Iterable[str] = (),
+        retries: int = 0,
+        retry_backoff_seconds: float = 1.0,
+        fallback: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.depends_on = tuple(depends_on)
+        self.retries = retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.fallback = fallback
+
+
+class StageResult:
+    """Outcome of one stage: status is 'done', 'fallback', 'checkpointed', 'failed' or 'skipped'."""
+
+    __slots__ = ("name", "status", "value", "duration", "attempts", "error")
+
+    def __init__(self, name, status, value=None, duration=0.0, attempts=0, error=None):
+        self.name = name
+        self.status = status
+        self.value = value
+        self.duration = duration
+        self.attempts = attempts
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.status in ("done", "fallback", "checkpointed")
+
+
+class StageDAG:
+    """
+    Runs Stages in dependency order on a bounded thread pool; stages whose
+    dependencies are satisfied run concurrently.
+
+    Checkpointing: `checkpoints` pre-seeds {stage_name: value} for stages that
+    already completed (they are not re-run), and `on_stage_complete(name, value)`
+    is called after every successful stage so callers can persist progress.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        max_workers: int = 4,
+        checkpoints: Optional[Dict[str, Any]] = None,
+        on_stage_complete: Optional[Callable[[str, Any], None]] = None,
+        log_prefix: str = "[DAG]",
+    ):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max(1, max_workers)
+        self.checkpoints = dict(checkpoints or {})
+        self.on_stage_complete = on_stage_complete
+        self.log_prefix = log_prefix
+        self._validate()
+
+    def _validate(self):
+        for stage in self.stages.values():
+            for dep in stage.depends_on:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+        # Kahn's algorithm — reject cycles up front rather than deadlocking at run time
+        indegree = {name: len(stage.depends_on) for name, stage in self.stages.items()}
+        ready = [name for name, degree in indegree.items() if degree == 0]
+        visited = 0
+        while ready:
+            current = ready.pop()
+            visited += 1
+            for stage in self.stages.values():
+                if current in stage.depends_on:
+                    indegree[stage.name] -= 1
+                    if indegree[stage.name] == 0:
+                        ready.append(stage.name)
+        if visited != len(self.stages):
+            raise ValueError("Stage graph contains a cycle")
+
+    def run(self) -> Dict[str, StageResult]:
+        results: Dict[str, StageResult] = {}
+        for name, value in self.checkpoints.items():
+            if name in self.stages:
+                results[name] = StageResult(name, "checkpointed", value=value)
+                print(f"{self.log_prefix} Stage '{name}' restored from checkpoint.")
+
+        pending = {name for name in self.stages if name not in results}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name in sorted(pending):
+                    stage = self.stages[name]
+                    deps = [results.get(dep) for dep in stage.depends_on]
+                    if any(dep is not None and not dep.ok for dep in deps):
+                        results[name] = StageResult(name, "skipped", error="dependency failed")
+                        print(f"{self.log_prefix} Stage '{name}' skipped (dependency failed).")
+                        pending.discard(name)
+                    elif all(dep is not None for dep in deps):
+                        inputs = {dep: results[dep].value for dep in stage.depends_on}
+                        running[executor.submit(self._run_stage, stage, inputs)] = name
+                        pending.discard(name)
+
+                if not running:
+                    # Everything left is blocked behind skipped stages
+                    continue
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    result = future.result()
+                    results[name] = result
+                    if result.ok and self.on_stage_complete:
+                        try:
+                            self.on_stage_complete(name, result.value)
+                        except Exception as e:
+                            print(f"{self.log_prefix} Checkpoint hook failed for stage '{name}': {e}")
+
+        return results
+
+    def _run_stage(self, stage: Stage, inputs: Dict[str, Any]) -> StageResult:
+        start = time.perf_counter()
+        last_error = None
+        for attempt in range(1, stage.retries + 2):
+            try:
+                value = stage.fn(inputs)
+                duration = time.perf_counter() - start
+                print(f"{self.log_prefix} Stage '{stage.name}' done in {duration:.2f}s (attempt {attempt}).")
+                return StageResult(stage.name, "done", value=value, duration=duration, attempts=attempt)
+            except Exception as e:
+                last_error = e
+                print(f"{self.log_prefix} Stage '{stage.name}' attempt {attempt} failed: {e}")
+                if attempt <= stage.retries:
+                    time.sleep(stage.retry_backoff_seconds * attempt)
+
+        duration = time.perf_counter() - start
+        if stage.fallback is not None:
+            try:
+                value = stage.fallback(inputs)
+                print(f"{self.log_prefix} Stage '{stage.name}' used fallback after {duration:.2f}s.")
+                return StageResult(stage.name, "fallback", value=value, duration=duration,
+                                   attempts=stage.retries + 1, error=str(last_error))
+            except Exception as e:
+                last_error = e
+
+        traceback.print_exception(type(last_error), last_error, last_error.__traceback__)
+        return StageResult(stage.name, "failed", duration=duration, attempts=stage.retries + 1, error=str(last_error))
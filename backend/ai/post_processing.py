@@ -4,14 +4,57 @@ import os
 import numpy as np
 from sqlalchemy import func
 from db import crud, models
+from db import events
 from db.database import SessionLocal
 from ai import ai as ai_module
-from ai.LLM_module import DataProcessingLLM
+from ai import UserConditionManager as ucm
+from ai import triviality
+from ai.LLM_module import ConditionAction, DataProcessingLLM, ExtractionInsights
 from ai.embedding import MedicalEmbedder
+from ai.pipeline_dag import Stage, StageDAG
 
 data_processing_llm = DataProcessingLLM()
 embedder = MedicalEmbedder()
 
+# Pack several turns into each insight-extraction prompt instead of one call per turn
+BATCH_INSIGHTS = os.environ.get("POST_PROCESSING_BATCH_INSIGHTS", "true").lower() == "true"
+
+# "multi": separate insight / summary / condition calls.
+# "fused": one structured call for all three, falling back to "multi" on failure.
+PIPELINE_MODE = os.environ.get("POST_PROCESSING_MODE", "multi").lower()
+
+# Fused prompts estimated above this many tokens go straight to the multi-call path, which chunks
+# long timelines (same budget as the hierarchical summary chunks by default)
+FUSED_PROMPT_TOKEN_BUDGET = int(os.environ.get(
+    "POST_PROCESSING_FUSED_TOKEN_BUDGET", os.environ.get("SUMMARY_CHUNK_TOKEN_BUDGET", 2500)
+))
+
+# Independent stages (insights ∥ summary) run concurrently on this many threads
+MAX_WORKERS = int(os.environ.get("POST_PROCESSING_MAX_WORKERS", 4))
+# Extra attempts for a failing LLM stage before its fallback kicks in
+STAGE_RETRIES = int(os.environ.get("POST_PROCESSING_STAGE_RETRIES", 1))
+# An interrupted run is resumed at most this many times, and not once it is this old: past
+# either it is abandoned (checkpoints cleared) so one failing batch cannot block the rest
+RESUME_MAX_ATTEMPTS = int(os.environ.get("POST_PROCESSING_RESUME_MAX_ATTEMPTS", 3))
+RESUME_MAX_AGE_HOURS = float(os.environ.get("POST_PROCESSING_RESUME_MAX_AGE_HOURS", 24))
+
+# Send only retrieved (top-k similar + active chronic) conditions to condition detection
+CONDITION_CONTEXT_RETRIEVAL = os.environ.get("CONDITION_CONTEXT_RETRIEVAL", "true").lower() == "true"
+
+# Client-facing progress events (SSE /events) published when these DAG stages complete
+STAGE_EVENTS = {
+    "insights": events.INSIGHTS_DONE,
+    "embed_summary": events.SUMMARY_UPDATED,
+    "apply_conditions": events.CONDITIONS_CHANGED,
+}
+
+PLACEHOLDER_INSIGHTS = ("Pending End-of-Session Extraction", "No clinical insight extracted.")
+
+# Result recorded for turns the triviality filter skips (same as an LLM "nothing found")
+TRIVIAL_INSIGHTS = ExtractionInsights(
+    insight_found=False, compressed_summary="", primary_condition_or_symptom="", icd_codes_extracted=[]
+)
+
 def _condition_to_embed_dict(condition):
     """Convert a ConditionAction Pydantic object to the dict format MedicalEmbedder expects."""
     return {
@@ -20,164 +63,593 @@ def _condition_to_embed_dict(condition):
         "notes": condition.notes or ""
     }
 
-def run_end_of_session_pipeline(consultation_id: int):
+def _to_list(vector):
+    return vector.tolist() if isinstance(vector, np.ndarray) else vector
+
+def _build_health_records_context(db, user_id, new_entries_context, entry_ids=()):
     """
-    Background pipeline to process a consultation once it ends.
-    - Extracts insights for unsummarized entries.
-    - Summarises the consultation.
-    - Detects and logs conditions.
+    Existing conditions for the user, used by the LLM for de-duplication.
+    With CONDITION_CONTEXT_RETRIEVAL on, only the conditions relevant to the new
+    entries (plus active chronic ones) are sent, as a compact table.
     """
-    print(f"\n[POST_PROCESSING] Starting pipeline for Consultation {consultation_id}...")
-    db = SessionLocal()
-    try:
-        consultation = crud.get_consultation_by_id(db, consultation_id)
-        if not consultation:
-            print(f"[POST_PROCESSING] Consultation {consultation_id} not found.")
-            return
+    if CONDITION_CONTEXT_RETRIEVAL:
+        return ucm.build_condition_context(
+            db, user_id, new_entries_context,
+            crud.get_timeline_embeddings(db, list(entry_ids)) if entry_ids else None
+        )
 
-        # 1. Fetch unsummarized timeline entries
-        unsummarized = crud.get_unsummarized_timeline_entries(db, consultation_id, limit=int(os.environ.get("POST_PROCESSING_MAX_ENTRIES", 50)))
-        print(f"[POST_PROCESSING] Found {len(unsummarized)} unsummarized entries.")
+    user_conditions = db.query(models.UserCondition).filter(
+        models.UserCondition.user_id == user_id
+    ).all()
+    return [
+        {"id": c.id, "name": c.condition_name, "type": c.condition_type,
+         "active": c.is_active, "notes": c.notes}
+        for c in user_conditions
+    ]
 
-        if len(unsummarized) == 0:
-            print("[POST_PROCESSING] Nothing to process. Exiting.")
-            return
+def _build_new_entries_context(turns, insights_by_id):
+    """Prefer compressed insights, fall back to the raw turn when no insight was extracted."""
+    new_entries_context = []
+    for turn in turns:
+        insights = insights_by_id.get(turn["id"])
+        if isinstance(insights, dict):
+            insights = insights.get("insights")
+        if insights and insights not in PLACEHOLDER_INSIGHTS:
+            new_entries_context.append(insights)
+        else:
+            new_entries_context.append(f"USER: {turn['user_query']}\nMODEL: {turn['model_response']}")
+    return new_entries_context
 
-        # 2. Extract Insights for each entry
-        for entry in unsummarized:
-            print(f"[POST_PROCESSING] Extracting insight for entry {entry.id}")
-            try:
-                insights_obj = ai_module.extract_insights(entry.user_query, entry.model_response)
-                if insights_obj.insight_found:
-                    entry.insights = insights_obj.compressed_summary
-                    embedding_vector = embedder.generate_embedding(insights_obj.compressed_summary)
-                    if isinstance(embedding_vector, np.ndarray):
-                        embedding_vector = embedding_vector.tolist()
-                    entry.embedding_vector = embedding_vector
-                else:
-                    entry.insights = "No clinical insight extracted."
-            except Exception as e:
-                print(f"[POST_PROCESSING] Insight extraction failed for entry {entry.id}: {e}")
-                entry.insights = "No clinical insight extracted."
-            db.commit()
+# Embeddings are remote calls (up to 15s each), so they are computed before the writing
+# transaction opens: an open transaction holds back the delta-sync watermark
+# (crud.get_changes_since) for as long as it runs.
 
-        # 3. Summarization
-        print("[POST_PROCESSING] Generating updated cumulative summary...")
-        formatted_timeline = ""
-        for entry in unsummarized:
-            formatted_timeline += f"USER: {entry.user_query}\nMODEL: {entry.model_response}\n\n"
+def _embed_insights(insights_by_id, strict=False):
+    """
+    {entry_id: embedding} for every ExtractionInsights result with an insight. An entry
+    whose embedding fails is logged and left out (saved as "No clinical insight
+    extracted."), or with strict=True the error propagates.
+    """
+    embeddings = {}
+    for entry_id, insights_obj in insights_by_id.items():
+        if not insights_obj.insight_found:
+            continue
+        try:
+            embeddings[entry_id] = _to_list(embedder.generate_embedding(insights_obj.compressed_summary))
+        except Exception as e:
+            if strict:
+                raise
+            print(f"[POST_PROCESSING] Insight embedding failed for entry {entry_id}: {e}")
+    return embeddings
+
+def _apply_insights(entry, insights_obj, embedding=None):
+    """Copies an ExtractionInsights result and its embedding (from _embed_insights) onto a timeline entry."""
+    if insights_obj.insight_found and embedding is not None:
+        entry.insights = insights_obj.compressed_summary
+        entry.embedding_vector = embedding
+    else:
+        entry.insights = "No clinical insight extracted."
 
-        existing_summary = consultation.summary or ""
+def _embed_condition(condition):
+    """(embedding, high-focus embedding) of a ConditionAction about to be added."""
+    condition_dict = _condition_to_embed_dict(condition)
+    return (embedder.generate_embedding_for_condition(condition_dict),
+            embedder.generate_high_focus_embedding(condition_dict))
+
+def _embed_condition_actions(consultation_id, detected_conditions, strict=False):
+    """
+    Embeddings for the actions that will add a row, keyed by condition idempotency key.
+    Failures are logged and left out (retried when the row is added) unless strict=True.
+    """
+    embeddings = {}
+    for c in detected_conditions:
+        if not (c.mode == 'add' or (c.mode == 'update' and c.condition_id is None)):
+            continue
         try:
-            heading, new_summary = data_processing_llm.summarise(existing_summary, formatted_timeline)
+            key = crud.condition_idempotency_key(consultation_id, c.condition_name, c.condition_type)
+            embeddings[key] = _embed_condition(c)
         except Exception as e:
-            print(f"[POST_PROCESSING] Summarization failed: {e}. Keeping existing summary.")
-            heading, new_summary = None, existing_summary
+            if strict:
+                raise
+            print(f"[POST_PROCESSING] Embedding condition '{c.condition_name}' failed: {e}")
+    return embeddings
 
-        new_embedding = embedder.generate_embedding(new_summary)
-        if isinstance(new_embedding, np.ndarray):
-            new_embedding = new_embedding.tolist()
+def _add_condition(db, consultation, condition, commit=True, embeddings=None):
+    emb, focus_emb = embeddings or _embed_condition(condition)
+    if not np.any(focus_emb):
+        focus_emb = None  # failed embedding: ConditionSynonymIndex.load backfills it later
+    # Keyed on consultation + name + type so a resumed or repeated run cannot add the row twice
+    crud.add_user_condition(
+        db,
+        condition_name=condition.condition_name,
+        condition_type=condition.condition_type,
+        source_type="consultation",
+        consultation_id=consultation.id,
+        user_id=consultation.user_id,
+        diagnosis_date=func.now(),
+        is_active=condition.is_active,
+        notes=condition.notes,
+        embedding_vector=emb,
+        commit=commit,
+        idempotency_key=crud.condition_idempotency_key(consultation.id, condition.condition_name, condition.condition_type),
+        focus_embedding_vector=focus_emb
+    )
 
-        crud.update_consultation_summary_and_embedding(db, consultation_id, new_summary, new_embedding)
+def _apply_condition_actions(db, consultation, detected_conditions, commit=True, embeddings=None):
+    """
+    Persists 'add'/'update' ConditionActions. With commit=True each action is committed
+    on its own and failures are logged per condition; with commit=False everything is
+    staged in the caller's transaction and the first failure propagates.
+    `embeddings` comes from _embed_condition_actions; missing ones are computed inline.
+    """
+    embeddings = embeddings or {}
+    actionable = [c for c in detected_conditions if c.mode != 'ignore']
+    print(f"[POST_PROCESSING] Detected {len(actionable)} actionable condition(s).")
 
-        # Save the generated heading if we got one and current heading is still the default
-        if heading and (not consultation.heading or consultation.heading == "New Live Consultation"):
-            db_consult = crud.get_consultation_by_id(db, consultation_id)
-            if db_consult:
-                db_consult.heading = heading
-                db.commit()
-                print(f"[POST_PROCESSING] Heading updated: '{heading}'")
-        
-        print("[POST_PROCESSING] Summary updated.")
-
-        # 4. Condition Detection
-        print("[POST_PROCESSING] Running condition detection...")
+    # The LLM occasionally repeats an item; staged duplicates would violate the idempotency key
+    seen_keys = set()
+    for condition in actionable:
+        key = crud.condition_idempotency_key(consultation.id, condition.condition_name, condition.condition_type)
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
         try:
-            # Build context: prefer insights (compressed), fall back to raw turns
-            new_entries_context = []
-            for entry in unsummarized:
-                if entry.insights and entry.insights not in ("Pending End-of-Session Extraction", "No clinical insight extracted."):
-                    new_entries_context.append(entry.insights)
+            if condition.mode == 'add':
+                _add_condition(db, consultation, condition, commit=commit, embeddings=embeddings.get(key))
+                print(f"[POST_PROCESSING] Added condition: {condition.condition_name}")
+
+            elif condition.mode == 'update':
+                existing = None
+                if condition.condition_id is not None:
+                    existing = crud.get_condition_by_id(db, str(condition.condition_id))
+                if existing:
+                    # Empty notes (e.g. synonym re-confirmations) keep the stored notes
+                    crud.update_user_condition(db, existing.id, condition.is_active, condition.notes or None, commit=commit)
+                    print(f"[POST_PROCESSING] Updated condition: {condition.condition_name}")
                 else:
-                    new_entries_context.append(f"USER: {entry.user_query}\nMODEL: {entry.model_response}")
-
-            # Get existing conditions for de-duplication context
-            user_conditions = db.query(models.UserCondition).filter(
-                models.UserCondition.user_id == consultation.user_id
-            ).all()
-            user_health_records_context = [
-                {"id": c.id, "name": c.condition_name, "type": c.condition_type,
-                 "active": c.is_active, "notes": c.notes}
-                for c in user_conditions
-            ]
-
-            # Refresh consultation for updated summary
-            db.refresh(consultation)
-            summary_context = consultation.summary or "No summary available."
-
-            detected_conditions = data_processing_llm.detect_condition(
-                summary_context,
-                new_entries_context,
-                user_health_records_context
-            )
-
-            actionable = [c for c in detected_conditions if c.mode != 'ignore']
-            print(f"[POST_PROCESSING] Detected {len(actionable)} actionable condition(s).")
-
-            for condition in actionable:
-                try:
-                    if condition.mode == 'add':
-                        emb = embedder.generate_embedding_for_condition(_condition_to_embed_dict(condition))
-                        crud.add_user_condition(
-                            db,
-                            condition_name=condition.condition_name,
-                            condition_type=condition.condition_type,
-                            source_type="consultation",
-                            consultation_id=consultation_id,
-                            user_id=consultation.user_id,
-                            diagnosis_date=func.now(),
-                            is_active=condition.is_active,
-                            notes=condition.notes,
-                            embedding_vector=emb
-                        )
-                        print(f"[POST_PROCESSING] Added condition: {condition.condition_name}")
-
-                    elif condition.mode == 'update':
-                        existing = crud.get_condition_by_id(db, condition.condition_id)
-                        if existing:
-                            crud.update_user_condition(db, condition.condition_id, condition.is_active, condition.notes)
-                            print(f"[POST_PROCESSING] Updated condition: {condition.condition_name}")
-                        else:
-                            # Placeholder ID — add as new
-                            emb = embedder.generate_embedding_for_condition(_condition_to_embed_dict(condition))
-                            crud.add_user_condition(
-                                db,
-                                condition_name=condition.condition_name,
-                                condition_type=condition.condition_type,
-                                source_type="consultation",
-                                consultation_id=consultation_id,
-                                user_id=consultation.user_id,
-                                diagnosis_date=func.now(),
-                                is_active=condition.is_active,
-                                notes=condition.notes,
-                                embedding_vector=emb
-                            )
-                            print(f"[POST_PROCESSING] Added (from update fallback): {condition.condition_name}")
-
-                except Exception as e:
-                    print(f"[POST_PROCESSING] Error saving condition '{condition.condition_name}': {e}")
-                    traceback.print_exc()
+                    # Placeholder ID — add as new
+                    _add_condition(db, consultation, condition, commit=commit, embeddings=embeddings.get(key))
+                    print(f"[POST_PROCESSING] Added (from update fallback): {condition.condition_name}")
 
         except Exception as e:
-            print(f"[POST_PROCESSING] Condition detection failed: {e}")
+            if not commit:
+                raise
+            print(f"[POST_PROCESSING] Error saving condition '{condition.condition_name}': {e}")
             traceback.print_exc()
 
+def _run_fused_analysis(db, consultation, unsummarized):
+    """
+    Fused mode: a single structured LLM call produces insights, summary and
+    condition actions, and everything is persisted in one transaction.
+
+    Returns True on success. On any failure the transaction is rolled back and
+    False is returned so the caller can fall back to the multi-call path.
+    """
+    print("[POST_PROCESSING] Running fused session analysis...")
+    turns = [
+        {"id": entry.id, "user_query": entry.user_query, "model_response": entry.model_response}
+        for entry in unsummarized
+    ]
+    turns, trivial = triviality.split_trivial_turns(turns)
+    if not turns:
+        _apply_trivial_batch(db, consultation, unsummarized)
+        return True
+
+    analysis = _analyse_session_fused(db, consultation, turns)
+    if analysis is None:
+        return False
+
+    insights_by_id = {turn["id"]: TRIVIAL_INSIGHTS for turn in trivial}
+    insights_by_id.update({item.entry_id: item for item in analysis.insights})
+    missing = [turn for turn in turns if turn["id"] not in insights_by_id]
+    if missing:
+        print(f"[POST_PROCESSING] Fused output missed {len(missing)} turn(s); extracting them separately.")
+        insights_by_id.update(ai_module.extract_insights_batch(missing))
+
+    if not _persist_fused_analysis(db, consultation, unsummarized, analysis, insights_by_id):
+        return False
+
+    events.publish(consultation.user_id, events.INSIGHTS_DONE, consultation.id)
+    events.publish(consultation.user_id, events.SUMMARY_UPDATED, consultation.id)
+    changed = len([c for c in analysis.conditions if c.mode != 'ignore'])
+    if changed:
+        events.publish(consultation.user_id, events.CONDITIONS_CHANGED, consultation.id, count=changed)
+    return True
+
+def _apply_trivial_batch(db, consultation, unsummarized):
+    """Nothing clinical this batch: no summary or condition change to ask the LLM for."""
+    for entry in unsummarized:
+        _apply_insights(entry, TRIVIAL_INSIGHTS)
+    crud.update_last_condition_check_time(db, consultation.id, commit=False)
+    db.commit()
+    events.publish(consultation.user_id, events.INSIGHTS_DONE, consultation.id)
+    print("[POST_PROCESSING] All turns trivial; fused analysis skipped.")
+
+def _analyse_session_fused(db, consultation, turns):
+    """
+    The fused LLM call, with its condition actions de-duplicated against the synonym index.
+    Returns None when the prompt is over budget or the call fails.
+    """
+    synonym_index = None
+    try:
+        health_records = _build_health_records_context(
+            db, consultation.user_id,
+            [f"USER: {turn['user_query']}\nMODEL: {turn['model_response']}" for turn in turns]
+        )
+        if ucm.CONDITION_SYNONYM_ENABLED:
+            try:
+                synonym_index = ucm.ConditionSynonymIndex.load(db, consultation.user_id)
+            except Exception as e:
+                print(f"[POST_PROCESSING] Synonym index unavailable, keeping LLM actions as-is: {e}")
+        # End the read transaction: no query runs again until the writes in _persist_fused_analysis
+        db.commit()
+        prompt_tokens = data_processing_llm.estimate_session_analysis_tokens(
+            consultation.summary or "", turns, health_records
+        )
+        if prompt_tokens > FUSED_PROMPT_TOKEN_BUDGET:
+            print(f"[POST_PROCESSING] Fused prompt ~{prompt_tokens} tokens exceeds {FUSED_PROMPT_TOKEN_BUDGET}; "
+                  "using the multi-call pipeline.")
+            return None
+        analysis = data_processing_llm.analyse_session(consultation.summary or "", turns, health_records)
+    except Exception as e:
+        print(f"[POST_PROCESSING] Fused analysis failed: {e}. Falling back to multi-call pipeline.")
+        return None
+
+    if synonym_index is not None:
+        try:
+            analysis.conditions = ucm.dedupe_condition_actions(synonym_index, analysis.conditions)
+        except Exception as e:
+            print(f"[POST_PROCESSING] Synonym check failed, keeping LLM actions as-is: {e}")
+    return analysis
+
+def _persist_fused_analysis(db, consultation, unsummarized, analysis, insights_by_id):
+    """Embeds, then writes insights, summary and conditions in one transaction. Returns True on success."""
+    new_summary = analysis.summary.strip() or consultation.summary or ""
+    try:
+        insight_embeddings = _embed_insights(insights_by_id, strict=True)
+        summary_embedding = _to_list(embedder.generate_embedding(new_summary))
+        condition_embeddings = _embed_condition_actions(consultation.id, analysis.conditions, strict=True)
+    except Exception as e:
+        print(f"[POST_PROCESSING] Embedding fused analysis failed: {e}. Falling back to multi-call pipeline.")
+        return False
+
+    try:
+        for entry in unsummarized:
+            _apply_insights(entry, insights_by_id[entry.id], insight_embeddings.get(entry.id))
+
+        crud.update_consultation_summary_and_embedding(db, consultation.id, new_summary, summary_embedding, commit=False)
+        heading = analysis.heading.strip()
+        if heading and (not consultation.heading or consultation.heading == "New Live Consultation"):
+            consultation.heading = heading
+
+        _apply_condition_actions(db, consultation, analysis.conditions, commit=False, embeddings=condition_embeddings)
+        crud.update_last_condition_check_time(db, consultation.id, commit=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[POST_PROCESSING] Persisting fused analysis failed: {e}. Falling back to multi-call pipeline.")
+        traceback.print_exc()
+        return False
+
+    print(f"[POST_PROCESSING] Fused analysis persisted (heading: '{heading}').")
+    return True
+
+# ---------------- Multi-call pipeline stages ----------------
+# Each stage runs on a DAG worker thread, so stages that touch the database open
+# their own session instead of sharing the (non thread-safe) pipeline session.
+
+def _stage_insights(turns):
+    """
+    Extracts insights (+ embeddings) and persists them on the timeline rows.
+    Returns {entry_id: {"insights": text, "primary": condition_or_symptom}}.
+    """
+    to_extract, trivial = triviality.split_trivial_turns(turns)
+    extracted = {turn["id"]: TRIVIAL_INSIGHTS for turn in trivial}
+
+    if BATCH_INSIGHTS:
+        if to_extract:
+            print(f"[POST_PROCESSING] Extracting insights for {len(to_extract)} entries in batched mode")
+            extracted.update(ai_module.extract_insights_batch(to_extract))
+    else:
+        for turn in to_extract:
+            print(f"[POST_PROCESSING] Extracting insight for entry {turn['id']}")
+            extracted[turn["id"]] = ai_module.extract_insights(turn["user_query"], turn["model_response"])
+
+    embeddings = _embed_insights(extracted)
+
+    db = SessionLocal()
+    try:
+        entries = db.query(models.ConsultationTimeline).filter(
+            models.ConsultationTimeline.id.in_([turn["id"] for turn in turns])
+        ).all()
+        for entry in entries:
+            if entry.id in extracted:
+                _apply_insights(entry, extracted[entry.id], embeddings.get(entry.id))
+            else:
+                print(f"[POST_PROCESSING] Insight extraction failed for entry {entry.id}: no result")
+                entry.insights = "No clinical insight extracted."
+        db.commit()
+        return {
+            entry.id: {
+                "insights": entry.insights,
+                "primary": extracted[entry.id].primary_condition_or_symptom
+                if entry.id in extracted and extracted[entry.id].insight_found else ""
+            }
+            for entry in entries
+        }
+    finally:
+        db.close()
+
+def _stage_summary(existing_summary, turns):
+    """
+    Summarises the raw turns — independent of the insight results. Long batches are
+    split into token-bounded chunks and summarised hierarchically.
+    """
+    print("[POST_PROCESSING] Generating updated cumulative summary...")
+    return data_processing_llm.summarise_hierarchical(existing_summary, turns)
+
+def _stage_embed_summary(consultation_id, heading_and_summary):
+    """Embeds the new summary and persists it together with the generated heading."""
+    heading, new_summary = heading_and_summary
+    new_embedding = _to_list(embedder.generate_embedding(new_summary))
+
+    db = SessionLocal()
+    try:
+        crud.update_consultation_summary_and_embedding(db, consultation_id, new_summary, new_embedding, commit=False)
+        # Save the generated heading if we got one and current heading is still the default
+        consultation = crud.get_consultation_by_id(db, consultation_id)
+        if heading and consultation and (not consultation.heading or consultation.heading == "New Live Consultation"):
+            consultation.heading = heading
+            print(f"[POST_PROCESSING] Heading updated: '{heading}'")
+        db.commit()
+    finally:
+        db.close()
+    print("[POST_PROCESSING] Summary updated.")
+    return new_summary
+
+def _stage_detect_conditions(consultation_id, turns, insights_by_id, summary):
+    """
+    Runs condition detection and returns the actions as plain dicts so they can be
+    checkpointed. The synonym pre-check runs first: if every condition named in the
+    new insights already exists and the turns say nothing about a status change,
+    those become re-confirming updates and the LLM call is skipped; otherwise LLM
+    'add' results are de-duplicated against the index.
+    """
+    print("[POST_PROCESSING] Running condition detection...")
+    db = SessionLocal()
+    try:
+        consultation = crud.get_consultation_by_id(db, consultation_id)
+
+        synonym_index = None
+        if ucm.CONDITION_SYNONYM_ENABLED:
+            synonym_index = ucm.ConditionSynonymIndex.load(db, consultation.user_id)
+            candidates = list(dict.fromkeys(
+                v["primary"].strip() for v in insights_by_id.values()
+                if isinstance(v, dict) and (v.get("primary") or "").strip()
+            ))
+            if candidates and len(synonym_index):
+                matched, unmatched = ucm.precheck_candidates(synonym_index, candidates)
+                if not unmatched:
+                    # Re-confirmations keep the stored status: "my asthma is gone" must still reach the LLM
+                    texts = [t for turn in turns for t in (turn["user_query"], turn["model_response"])]
+                    texts += [v.get("insights") for v in insights_by_id.values() if isinstance(v, dict)]
+                    if not ucm.has_status_cue(texts):
+                        print(f"[POST_PROCESSING] All {len(candidates)} candidate(s) matched existing conditions; skipping LLM detection.")
+                        return [c.model_dump() for c in matched]
+                    print("[POST_PROCESSING] Candidates all matched, but the turns mention a status change; running LLM detection.")
+
+        new_entries_context = _build_new_entries_context(turns, insights_by_id)
+        detected_conditions = data_processing_llm.detect_condition(
+            summary or "No summary available.",
+            new_entries_context,
+            _build_health_records_context(db, consultation.user_id, new_entries_context, [turn["id"] for turn in turns])
+        )
+        if synonym_index is not None:
+            detected_conditions = ucm.dedupe_condition_actions(synonym_index, detected_conditions)
+        return [c.model_dump() for c in detected_conditions]
+    finally:
+        db.close()
+
+def _stage_apply_conditions(consultation_id, actions):
+    """Persists detected condition actions. Safe to repeat thanks to condition idempotency keys."""
+    detected_conditions = [ConditionAction(**action) for action in actions]
+    embeddings = _embed_condition_actions(consultation_id, detected_conditions)
+    db = SessionLocal()
+    try:
+        consultation = crud.get_consultation_by_id(db, consultation_id)
+        _apply_condition_actions(db, consultation, detected_conditions, embeddings=embeddings)
+        return len([c for c in detected_conditions if c.mode != 'ignore'])
+    finally:
+        db.close()
+
+def _build_stage_dag(consultation, turns, checkpoints=None, on_stage_complete=None):
+    """
+    insights ─────────────────────┐
+                                  ├──> detect_conditions ──> apply_conditions
+    summary ──> embed_summary ────┘
+
+    Stage outputs are JSON-serialisable so they can be persisted as checkpoints.
+    """
+    consultation_id = consultation.id
+    existing_summary = consultation.summary or ""
+
+    def keep_existing_summary(_):
+        print("[POST_PROCESSING] Summarization failed. Keeping existing summary.")
+        return [None, existing_summary]
+
+    def skip_conditions(_):
+        print("[POST_PROCESSING] Condition detection failed; no conditions recorded this run.")
+        return []
+
+    stages = [
+        Stage("insights", lambda deps: _stage_insights(turns)),
+        Stage("summary", lambda deps: list(_stage_summary(existing_summary, turns)),
+              retries=STAGE_RETRIES, fallback=keep_existing_summary),
+        Stage("embed_summary", lambda deps: _stage_embed_summary(consultation_id, deps["summary"]),
+              depends_on=["summary"], retries=STAGE_RETRIES),
+        Stage("detect_conditions",
+              lambda deps: _stage_detect_conditions(consultation_id, turns, deps["insights"], deps["embed_summary"]),
+              depends_on=["insights", "embed_summary"], retries=STAGE_RETRIES, fallback=skip_conditions),
+        Stage("apply_conditions", lambda deps: _stage_apply_conditions(consultation_id, deps["detect_conditions"]),
+              depends_on=["detect_conditions"], retries=STAGE_RETRIES),
+    ]
+    return StageDAG(stages, max_workers=MAX_WORKERS, checkpoints=checkpoints,
+                    on_stage_complete=on_stage_complete, log_prefix="[POST_PROCESSING]")
+
+
+def _run_batch(db, consultation, unsummarized, run_key, checkpoints):
+    """Runs the stage DAG over one batch of entries. Returns True if every stage completed."""
+    consultation_id, user_id = consultation.id, consultation.user_id
+    turns = [
+        {"id": entry.id, "user_query": entry.user_query, "model_response": entry.model_response}
+        for entry in unsummarized
+    ]
+
+    def checkpoint(stage, value):
+        crud.save_pipeline_checkpoint(db, consultation_id, run_key, stage, value)
+        if stage == "apply_conditions":
+            if value:
+                events.publish(user_id, events.CONDITIONS_CHANGED, consultation_id, count=value)
+        elif stage in STAGE_EVENTS:
+            events.publish(user_id, STAGE_EVENTS[stage], consultation_id)
+
+    results = _build_stage_dag(consultation, turns, checkpoints, checkpoint).run()
+    timings = ", ".join(f"{name}={r.duration:.2f}s/{r.status}" for name, r in results.items())
+    print(f"[POST_PROCESSING] Stage timings: {timings}")
+
+    if not all(r.ok for r in results.values()):
+        return False
+
+    crud.clear_pipeline_checkpoints(db, consultation_id, run_key)
+    return True
+
+
+def _resume_interrupted_run(db, consultation):
+    """
+    Resumes the consultation's interrupted run, if any. Returns None when there is none
+    (or it was abandoned), True when it completed and False when it is still incomplete.
+    """
+    consultation_id = consultation.id
+    interrupted = crud.get_incomplete_pipeline_run(db, consultation_id)
+    if not interrupted:
+        return None
+    run_key, entry_ids, age_seconds = interrupted
+    attempts = crud.record_pipeline_resume_attempt(db, consultation_id, run_key)
+    if attempts > RESUME_MAX_ATTEMPTS or age_seconds > RESUME_MAX_AGE_HOURS * 3600:
+        print(f"[POST_PROCESSING] Abandoning interrupted run {run_key[:12]} over {len(entry_ids)} entries "
+              f"({age_seconds / 3600:.1f}h old, {attempts - 1} resume attempt(s)); continuing with fresh batches.")
+        crud.clear_pipeline_checkpoints(db, consultation_id, run_key)
+        return None
+
+    # The interrupted run may already have written insights, so its entries no
+    # longer look "unsummarized" — reload them from the run manifest instead.
+    entries = crud.get_timeline_entries_by_ids(db, entry_ids)
+    checkpoints = crud.get_pipeline_checkpoints(db, consultation_id, run_key)
+    checkpoints.pop("__manifest__", None)
+    checkpoints.pop("__attempts__", None)
+    print(f"[POST_PROCESSING] Resuming interrupted run over {len(entries)} entries "
+          f"(attempt {attempts}/{RESUME_MAX_ATTEMPTS}, {len(checkpoints)} stage(s) already completed).")
+    if not _run_batch(db, consultation, entries, run_key, checkpoints):
+        return False
+    db.refresh(consultation)
+    return True
+
+
+def _process_new_batches(db, consultation, batch_size):
+    """
+    Processes unsummarized entries in batches until none remain. Returns the number of
+    batches, or None when a batch stopped incomplete (its checkpoints are kept).
+    """
+    consultation_id = consultation.id
+    batches = 0
+    previous_ids = None
+    while True:
+        # 1. Fetch the next batch of unsummarized timeline entries
+        unsummarized = crud.get_unsummarized_timeline_entries(db, consultation_id, limit=batch_size)
+        print(f"[POST_PROCESSING] Found {len(unsummarized)} unsummarized entries.")
+
+        if len(unsummarized) == 0:
+            return batches
+
+        entry_ids = [entry.id for entry in unsummarized]
+        if entry_ids == previous_ids:
+            # Nothing was marked processed last round — bail out rather than spin
+            print("[POST_PROCESSING] Batch made no progress; stopping.")
+            return batches
+        previous_ids = entry_ids
+        batches += 1
+
+        if PIPELINE_MODE == "fused" and _run_fused_analysis(db, consultation, unsummarized):
+            db.refresh(consultation)
+            continue
+
+        # 2-4. Insights ∥ summary → embed summary → conditions
+        run_key = crud.pipeline_run_key(entry_ids)
+        crud.save_pipeline_checkpoint(db, consultation_id, run_key, "__manifest__", entry_ids)
+        if not _run_batch(db, consultation, unsummarized, run_key, {}):
+            return None
+        # The next batch builds on the summary this one just wrote
+        db.refresh(consultation)
+
+
+def run_end_of_session_pipeline(consultation_id: int):
+    """
+    Background pipeline to process a consultation once it ends.
+    - Extracts insights for unsummarized entries.
+    - Summarises the consultation (concurrently with insight extraction).
+    - Detects and logs conditions.
+
+    Entries are processed in batches of POST_PROCESSING_MAX_ENTRIES, looping until
+    none remain, so long consultations are fully processed in a single run.
+
+    In POST_PROCESSING_MODE=fused all three come from one LLM call; the
+    stage DAG below is used otherwise and as the fused fallback.
+
+    Every DAG stage is checkpointed per consultation. If a previous run was
+    interrupted, it is resumed first: completed stages (and their LLM calls)
+    are skipped and only the remaining stages run. A run that is still failing
+    after RESUME_MAX_ATTEMPTS resumes (or RESUME_MAX_AGE_HOURS) is abandoned and
+    processing continues with fresh batches.
+    """
+    print(f"\n[POST_PROCESSING] Starting pipeline for Consultation {consultation_id}...")
+    batch_size = int(os.environ.get("POST_PROCESSING_MAX_ENTRIES", 50))
+    db = SessionLocal()
+    user_id, status = None, "failed"
+    try:
+        consultation = crud.get_consultation_by_id(db, consultation_id)
+        if not consultation:
+            print(f"[POST_PROCESSING] Consultation {consultation_id} not found.")
+            return
+        user_id = consultation.user_id
+
+        resumed = _resume_interrupted_run(db, consultation)
+        if resumed is False:
+            print(f"[POST_PROCESSING] Resumed run for Consultation {consultation_id} still incomplete; "
+                  "checkpoints kept for the next attempt.\n")
+            status = "incomplete"
+            return
+
+        batches = _process_new_batches(db, consultation, batch_size)
+        if batches is None:
+            print(f"[POST_PROCESSING] Pipeline for Consultation {consultation_id} incomplete; "
+                  "checkpoints kept so the next run resumes it.\n")
+            status = "incomplete"
+            return
+
+        if batches == 0 and not resumed:
+            print("[POST_PROCESSING] Nothing to process. Exiting.")
+            status = "nothing_to_process"
+            return
+
         # 5. Mark condition check time
         crud.update_last_condition_check_time(db, consultation_id)
-        print(f"[POST_PROCESSING] Pipeline for Consultation {consultation_id} completed successfully.\n")
+        print(f"[POST_PROCESSING] Pipeline for Consultation {consultation_id} completed successfully "
+              f"({batches} batch(es)).\n")
+        status = "completed"
 
     except Exception as e:
         print(f"[POST_PROCESSING] Error in pipeline: {e}")
         traceback.print_exc()
     finally:
         db.close()
+        events.publish(user_id, events.PIPELINE_COMPLETE, consultation_id, status=status)
@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import string
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+# Registry of the LLM prompt templates.
+#
+# Each template is compiled once, on first use: static slots (the JSON schema)
+# are rendered into the text, and the remainder is split into literal segments
+# and slot names. Rendering a prompt per call is then a plain join, instead of
+# regenerating model_json_schema() and re-parsing a multi-kilobyte format string.
+#
+# Static token counts per prompt are checked in CI against prompt_token_budgets.json:
+#   python -m ai.prompt_registry --check
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for prompt packing budgets."""
+    return len(text) // 4 + 1
+
+
+class PromptTemplate:
+    """
+    A registered prompt. `schema_model` (optional) is rendered into the `{schema_json}`
+    slot as compact JSON; every other `{slot}` is filled per call by render().
+    """
+
+    def __init__(self, name: str, template: str, schema_model: Optional[Type[BaseModel]] = None):
+        self.name = name
+        self.template = template
+        self.schema_model = schema_model
+        self._segments: Optional[List[Tuple[str, Optional[str]]]] = None
+        self._schema: Optional[Dict[str, Any]] = None
+        self._static_tokens = 0
+        self._lock = threading.Lock()
+
+    def _compile(self):
+        with self._lock:
+            if self._segments is not None:
+                return
+            static = {}
+            if self.schema_model is not None:
+                self._schema = self.schema_model.model_json_schema()
+                static["schema_json"] = json.dumps(self._schema, separators=(",", ":"))
+
+            segments: List[Tuple[str, Optional[str]]] = []
+            literal = []
+            for text, field, _spec, _conversion in string.Formatter().parse(self.template):
+                literal.append(text)
+                if field is None:
+                    continue
+                if field in static:
+                    literal.append(static[field])
+                else:
+                    segments.append(("".join(literal), field))
+                    literal = []
+            segments.append(("".join(literal), None))
+
+            self._static_tokens = estimate_tokens("".join(text for text, _ in segments))
+            self._segments = segments
+
+    @property
+    def schema(self) -> Optional[Dict[str, Any]]:
+        """The JSON schema dict (generated once), e.g. for the API's response_format."""
+        if self._segments is None:
+            self._compile()
+        return self._schema
+
+    @property
+    def slots(self) -> List[str]:
+        if self._segments is None:
+            self._compile()
+        return [field for _, field in self._segments if field is not None]
+
+    @property
+    def static_tokens(self) -> int:
+        """Estimated tokens of the prompt with every per-call slot empty."""
+        if self._segments is None:
+            self._compile()
+        return self._static_tokens
+
+    def render(self, **slots) -> str:
+        """Fills the per-call slots. Raises KeyError for a missing slot, like str.format."""
+        if self._segments is None:
+            self._compile()
+        parts = []
+        for text, field in self._segments:
+            parts.append(text)
+            if field is not None:
+                parts.append(str(slots[field]))
+        return "".join(parts)
+
+
+PROMPTS: Dict[str, PromptTemplate] = {}
+
+
+def register(name: str, template: str, schema_model: Optional[Type[BaseModel]] = None) -> PromptTemplate:
+    prompt = PromptTemplate(name, template, schema_model)
+    PROMPTS[name] = prompt
+    return prompt
+
+
+def token_report() -> Dict[str, int]:
+    """{prompt name: estimated static tokens} for every registered prompt."""
+    return {name: prompt.static_tokens for name, prompt in sorted(PROMPTS.items())}
+
+
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt_token_budgets.json")
+
+
+def check_budgets(budgets: Dict[str, int], tolerance: float) -> List[str]:
+    """Returns a message per prompt whose static size exceeds its budget by more than `tolerance`."""
+    problems = []
+    report = token_report()
+    for name, tokens in report.items():
+        budget = budgets.get(name)
+        if budget is None:
+            problems.append(f"{name}: no budget recorded ({tokens} tokens)")
+        elif tokens > budget * (1 + tolerance):
+            problems.append(f"{name}: {tokens} tokens exceeds budget {budget} (+{tolerance:.0%} allowed)")
+    return problems
+
+
+if __name__ == "__main__":
+    # python -m ai.prompt_registry              -> print static token counts
+    # python -m ai.prompt_registry --check      -> fail if a prompt outgrew prompt_token_budgets.json
+    # python -m ai.prompt_registry --update     -> record the current counts as the budgets
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report and check static prompt token counts.")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--update", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Allowed growth over budget (fraction)")
+    args = parser.parse_args()
+
+    # Importing LLM_module registers every prompt — in the ai.prompt_registry module,
+    # not in this __main__ copy, so read the report from there.
+    from ai import LLM_module  # noqa: F401
+    from ai import prompt_registry as registry
+
+    report = registry.token_report()
+    for name, tokens in report.items():
+        print(f"{name:<28} {tokens:>6} tokens")
+
+    if args.update:
+        with open(BUDGETS_PATH, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"[PROMPTS] Budgets written to {BUDGETS_PATH}")
+    elif args.check:
+        with open(BUDGETS_PATH, encoding="utf-8") as f:
+            problems = registry.check_budgets(json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"[FAIL] {problem}")
+        if problems:
+            sys.exit(1)
+        print("[OK] All prompts within their token budgets.")
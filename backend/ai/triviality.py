@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# Local pre-classifier that spots timeline turns with no clinical content
+# ("thanks", "ok", greetings) so post-processing can skip the LLM insight call.
+#
+# It is deliberately conservative: a turn is only trivial when the user message
+# is pure small-talk AND the model reply is short, free of clinical cues and
+# gives no instructions (a "thanks" answered with dosing advice is not trivial).
+# A wrongly skipped turn loses an insight, a wrongly kept one only costs a call.
+
+TRIVIALITY_FILTER_ENABLED = os.environ.get("TRIVIALITY_FILTER_ENABLED", "true").lower() == "true"
+# Longest user message (characters) that can still count as small-talk
+TRIVIALITY_MAX_QUERY_CHARS = int(os.environ.get("TRIVIALITY_MAX_QUERY_CHARS", 60))
+# Longest model reply (characters) that can still count as small-talk
+TRIVIALITY_MAX_RESPONSE_CHARS = int(os.environ.get("TRIVIALITY_MAX_RESPONSE_CHARS", 400))
+
+# Words that make up acknowledgements, thanks, greetings and farewells
+SMALL_TALK_WORDS = {
+    "ok", "okay", "k", "kk", "okey", "alright", "right", "sure", "fine", "cool", "great", "good", "nice",
+    "perfect", "awesome", "got", "it", "understood", "understand", "i", "see", "noted", "thanks", "thank",
+    "you", "thx", "ty", "tysm", "so", "much", "very", "a", "lot", "appreciate", "appreciated", "that",
+    "helps", "helpful", "was", "is", "really", "hi", "hello", "hey", "hiya", "morning", "afternoon",
+    "evening", "bye", "goodbye", "later", "cya", "take", "care", "have", "day", "night", "will", "do",
+    "doc", "doctor", "again", "and", "the", "for", "your", "help", "oh", "ah", "hmm", "um", "uh", "wow",
+    "please", "welcome", "all", "now", "done", "makes", "sense", "me", "too", "to", "there",
+}
+# "yes"/"no" are left out on purpose: they often answer a clinical question.
+
+# Any of these in either side of the turn means it may carry clinical content
+CLINICAL_CUE_PATTERN = re.compile(
+    r"\b\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|iu|units?|mmhg|bpm|%|°|degrees?|days?|weeks?|months?|years?|hours?|times?)\b"
+    r"|\b(?:pain|ache|aches|fever|cough|rash|dose|dosage|tablet|pill|medication|medicine|drug|symptom|symptoms|"
+    r"diagnos\w*|prescri\w*|allerg\w*|blood|pressure|sugar|glucose|insulin|infection|swelling|bleeding|"
+    r"nausea|vomit\w*|dizz\w*|headache|migraine|breath\w*|chest|heart|test|scan|x-ray|mri|surgery|"
+    r"pregnan\w*|injur\w*|sleep|anxiety|depress\w*|stress|side effects?|worse|better|improv\w*|"
+    r"stopped|started|taking|emergency|hospital|condition|chronic|treatment|therapy)\b"
+    # Dosing: units without a number, schedules, intake verbs ("take care" / "take it easy" stay small-talk)
+    r"|\b(?:mg|mcg|ml|iu|milligrams?|micrograms?)\b"
+    r"|\b(?:once|twice|thrice|\d+\s*times|(?:two|three|four)\s+times)\s+(?:a|per|each|every|daily)\b"
+    r"|\b(?:daily|nightly|hourly|bedtime|as needed|prn|bid|tid|qid|empty stomach|with (?:food|meals))\b"
+    r"|\bevery\s+(?:\d+|few|other|morning|night|evening|day)\b"
+    r"|\b(?:takes?|took|taken|use|using|apply|applying|swallow|inhale)\b(?!\s+(?:care|it easy)\b)"
+    # Medications: dosage forms, common names and drug-class suffixes
+    r"|\b(?:tablets|pills|capsules?|caps|syrup|drops|inhaler|puffs?|cream|ointment|patch|injection|shot|"
+    r"antibiotics?|antihistamines?|steroids?|antacids?|painkillers?|vitamins?|supplements?|vaccines?|"
+    r"paracetamol|acetaminophen|tylenol|aspirin|advil|motrin|benadryl|zyrtec|metformin|prednison\w*|"
+    r"prednisolon\w*|warfarin|levothyroxine|\w+(?:cillin|mycin|cycline|floxacin|azole|sartan|pril|olol|"
+    r"statin|dipine|triptan|profen|oxetine|tidine|azepam|gliptin|gliflozin))\b",
+    re.IGNORECASE,
+)
+
+# Instructions in the model reply ("remember to...", "make sure...") are clinical advice worth an insight
+RESPONSE_CUE_PATTERN = re.compile(
+    r"\b(?:remember to|make sure|be sure to|don'?t forget|do not forget|you should|you need to|keep (?:taking|using)|"
+    r"continue (?:to|taking|using|with)|avoid|stop (?:taking|using)|follow[- ]up|monitor|check your|come back if|"
+    r"seek|call (?:your|911|a|an|emergency)|see (?:a|your) (?:doctor|gp|physician|pharmacist|specialist))\b",
+    re.IGNORECASE,
+)
+
+_TOKEN_PATTERN = re.compile(r"[a-z']+")
+
+stats = {"checked": 0, "skipped": 0}
+_stats_lock = threading.Lock()
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall((text or "").lower().replace("'", ""))
+
+
+def is_trivial_turn(user_query: str, model_response: str) -> bool:
+    """True when the turn is small-talk with no clinical content worth an insight."""
+    user_query = (user_query or "").strip()
+    model_response = (model_response or "").strip()
+
+    if len(user_query) > TRIVIALITY_MAX_QUERY_CHARS or len(model_response) > TRIVIALITY_MAX_RESPONSE_CHARS:
+        return False
+    if "?" in user_query:
+        return False
+    if CLINICAL_CUE_PATTERN.search(user_query) or CLINICAL_CUE_PATTERN.search(model_response):
+        return False
+    if RESPONSE_CUE_PATTERN.search(model_response):
+        return False
+
+    tokens = _tokens(user_query)
+    return all(token in SMALL_TALK_WORDS for token in tokens)
+
+
+def split_trivial_turns(turns: Iterable[dict]) -> Tuple[List[dict], List[dict]]:
+    """
+    Splits {"id", "user_query", "model_response"} turns into (to_extract, trivial)
+    and updates the module-level skip counters.
+    """
+    turns = list(turns)
+    if not TRIVIALITY_FILTER_ENABLED:
+        return turns, []
+
+    to_extract, trivial = [], []
+    for turn in turns:
+        if is_trivial_turn(turn.get("user_query"), turn.get("model_response")):
+            trivial.append(turn)
+        else:
+            to_extract.append(turn)
+
+    with _stats_lock:
+        stats["checked"] += len(turns)
+        stats["skipped"] += len(trivial)
+    if trivial:
+        print(f"[TRIVIALITY] Skipped LLM extraction for {len(trivial)}/{len(turns)} trivial turn(s) "
+              f"(total skipped: {stats['skipped']}/{stats['checked']}).")
+    return to_extract, trivial
+
+
+def evaluate(records: Iterable[dict]) -> Dict:
+    """
+    Compares the filter against recorded LLM decisions.
+
+    Each record needs "user_query", "model_response" and the LLM's "insight_found".
+    A false skip (filter says trivial, LLM found an insight) loses data; a missed
+    skip (LLM found nothing, filter kept it) only costs an unnecessary call.
+    """
+    total = skipped = false_skips = missed_skips = 0
+    false_skip_examples = []
+    for record in records:
+        total += 1
+        trivial = is_trivial_turn(record.get("user_query"), record.get("model_response"))
+        llm_found = bool(record.get("insight_found"))
+        if trivial:
+            skipped += 1
+            if llm_found:
+                false_skips += 1
+                false_skip_examples.append(record.get("user_query", ""))
+        elif not llm_found:
+            missed_skips += 1
+
+    llm_trivial = skipped - false_skips + missed_skips
+    return {
+        "total": total,
+        "skipped": skipped,
+        "skip_rate": skipped / total if total else 0.0,
+        "agreement": (total - false_skips - missed_skips) / total if total else 0.0,
+        "false_skips": false_skips,
+        "missed_skips": missed_skips,
+        # Share of the LLM-trivial turns the filter caught
+        "recall": (skipped - false_skips) / llm_trivial if llm_trivial else 0.0,
+        "false_skip_examples": false_skip_examples[:20],
+    }
+
+
+def _record_llm_decisions(input_path: str, output_path: str):
+    """Runs the insight LLM over recorded turns and writes its decisions for later evaluation."""
+    from ai import ai as ai_module
+
+    with open(input_path, encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            insights = ai_module.extract_insights(record["user_query"], record["model_response"])
+            record["insight_found"] = insights.insight_found
+            dst.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    # Evaluation mode:
+    #   python -m ai.triviality record turns.jsonl recorded.jsonl   (calls the LLM once per turn)
+    #   python -m ai.triviality evaluate recorded.jsonl
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate the triviality filter against recorded LLM decisions.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="Label turns with the insight LLM's insight_found decision.")
+    rec.add_argument("input")
+    rec.add_argument("output")
+    ev = sub.add_parser("evaluate", help="Compare filter decisions with recorded LLM decisions.")
+    ev.add_argument("recorded")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        _record_llm_decisions(args.input, args.output)
+        print(f"[TRIVIALITY] Recorded LLM decisions to {args.output}")
+    else:
+        with open(args.recorded, encoding="utf-8") as f:
+            report = evaluate(json.loads(line) for line in f if line.strip())
+        print(json.dumps(report, indent=2))
@@ -92,6 +92,10 @@ def create_app():
     from .routes import main
     app.register_blueprint(main)
 
+    # gzip/brotli for JSON responses (see app/http_cache.py)
+    from .http_cache import compress_response
+    app.after_request(compress_response)
+
     # Optional: simple health check route
     @app.route("/health", methods=["GET"])
     def health():
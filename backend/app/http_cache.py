@@ -0,0 +1,104 @@
+# app/http_cache.py
+import os
+import gzip
+import zlib
+import hashlib
+from flask import request, make_response
+
+# Optional: brotli is preferred over gzip when installed and the client accepts it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Conditional GETs and response compression for the polled read endpoints.
+#
+# Routes compute a cheap version tuple (counts / max timestamps, one aggregate
+# query) and call not_modified() before running their real queries; a matching
+# If-None-Match short-circuits to 304 with no body. ETags are weak, so they stay
+# valid across gzip/brotli encodings of the same JSON.
+
+HTTP_COMPRESSION_ENABLED = os.environ.get("HTTP_COMPRESSION_ENABLED", "true").lower() == "true"
+HTTP_COMPRESSION_MIN_BYTES = int(os.environ.get("HTTP_COMPRESSION_MIN_BYTES", 1024))
+HTTP_COMPRESSION_LEVEL = int(os.environ.get("HTTP_COMPRESSION_LEVEL", 6))
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson"}
+
+
+def make_etag(*version) -> str:
+    """ETag value for a version tuple plus the request's path and query (pages differ)."""
+    material = "|".join([request.full_path] + [str(part) for part in version])
+    return hashlib.sha1(material.encode("utf-8")).hexdigest()
+
+
+def not_modified(etag: str):
+    """A 304 response if the client already holds this version, else None."""
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    return None
+
+
+def with_etag(response, etag: str):
+    """Tags a fresh response; no-cache makes clients revalidate (cheaply) on every poll."""
+    response = make_response(response)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _gzip_stream(chunks):
+    # Sync-flush per chunk so streamed NDJSON still arrives incrementally
+    compressor = zlib.compressobj(HTTP_COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """after_request hook: gzip/brotli-encodes JSON responses the client accepts."""
+    if (not HTTP_COMPRESSION_ENABLED
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or "Content-Encoding" in response.headers):
+        return response
+
+    encoding = _negotiate_encoding()
+    response.vary.add("Accept-Encoding")
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # Streaming bodies (history NDJSON / full history) are gzip-streamed chunk by chunk
+        if not request.accept_encodings["gzip"]:
+            return response
+        response.response = _gzip_stream(response.response)
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers.pop("Content-Length", None)
+        return response
+
+    body = response.get_data()
+    if len(body) < HTTP_COMPRESSION_MIN_BYTES:
+        return response
+    if encoding == "br":
+        body = brotli.compress(body, quality=min(HTTP_COMPRESSION_LEVEL, 11))
+    else:
+        body = gzip.compress(body, compresslevel=HTTP_COMPRESSION_LEVEL)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -1,10 +1,14 @@
 # app/routes.py
 import os
-from flask import Blueprint, jsonify, request, session
+import json
+import queue
+from flask import Blueprint, Response, jsonify, request, session, stream_with_context
 from db.database import SessionLocal
 from db import crud, models
+from db import events as events_bus
 from ai import ai, MemoryManager as mm, UserConditionManager as ucm
 from ai.post_processing import run_end_of_session_pipeline
+from . import http_cache
 import threading
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -320,43 +324,124 @@ def get_consultation_history(consultation_id):
         in: path
         type: string
         required: true
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page mode — return at most this many turns (max 500) plus next_cursor.
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Page mode — the next_cursor of the previous page.
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [json, ndjson]
+        description: >
+          ndjson streams one JSON object per line (the consultation first, then
+          each turn). Also selected by "Accept: application/x-ndjson".
     responses:
       200:
         description: Consultation history retrieved
     """
+    paged = "limit" in request.args or "cursor" in request.args
+    try:
+        limit = max(1, min(500, int(request.args.get("limit", 50))))
+    except ValueError:
+        return jsonify({"error": "Invalid limit query parameter"}), 400
+    ndjson = (request.args.get("format") == "ndjson"
+              or request.accept_mimetypes.best == "application/x-ndjson")
+
     db = SessionLocal()
 
     # basic validation
     if consultation_id is None:
         db.close()
         return jsonify({"message": "Consultation ID is required."}), 400
-    
+
+    # Conditional GET: one aggregate query decides whether anything changed
+    version = crud.get_consultation_history_version(db, consultation_id)
+    if version is None:
+        db.close()
+        return jsonify({"message": "Consultation ID does not exist."}), 400
+    etag = http_cache.make_etag(request.accept_mimetypes.best, *version)
+    cached = http_cache.not_modified(etag)
+    if cached is not None:
+        db.close()
+        return cached
+
     consultation = crud.get_consultation_by_id(db, consultation_id=consultation_id)
     if not consultation:
         db.close()
         return jsonify({"message": "Consultation ID does not exist."}), 400
 
-    # Fetch consultation history
-    consultation_timelines = crud.get_all_timeline_entries(db, consultation_id=consultation_id)
-    db.close()
-    return jsonify({
-        "consultation": {
-            "id": consultation.id,
-            "heading": consultation.heading,
-            "summary": consultation.summary,
-            "is_active": consultation.is_active
-        },
-        "timeline": [
-            {
-                "id": t.id,
-                "user_query": t.user_query,
-                "model_response": t.model_response,
-                "insights": t.insights,
-                "created_at": t.created_at.isoformat()
-            }
-            for t in consultation_timelines
-        ]
-    })
+    consultation_data = {
+        "id": consultation.id,
+        "heading": consultation.heading,
+        "summary": consultation.summary,
+        "is_active": consultation.is_active
+    }
+
+    if paged:
+        return _history_page_response(db, consultation_data, limit, request.args.get("cursor"), etag)
+    return _history_stream_response(db, consultation_data, ndjson, etag)
+
+
+def _history_page_response(db, consultation_data, limit, cursor, etag):
+    """One keyset page of the timeline. Closes `db`."""
+    try:
+        rows, next_cursor = crud.get_timeline_page(
+            db, consultation_id=consultation_data["id"], limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        db.close()
+    return http_cache.with_etag(jsonify({
+        "consultation": consultation_data,
+        "timeline": [_timeline_entry_json(t) for t in rows],
+        "has_more": next_cursor is not None,
+        "next_cursor": next_cursor
+    }), etag)
+
+
+def _history_stream_response(db, consultation_data, ndjson, etag):
+    """
+    Full history, streamed from a server-side cursor so a long consultation is never
+    materialised in memory. `db` is closed when the stream ends.
+    """
+    def generate():
+        try:
+            entries = crud.iter_timeline_entries(db, consultation_id=consultation_data["id"])
+            if ndjson:
+                yield json.dumps({"type": "consultation", **consultation_data}) + "\n"
+                for t in entries:
+                    yield json.dumps({"type": "timeline_entry", **_timeline_entry_json(t)}) + "\n"
+            else:
+                # Same document as before, emitted piecewise
+                yield '{"consultation": ' + json.dumps(consultation_data) + ', "timeline": ['
+                separator = ""
+                for t in entries:
+                    yield separator + json.dumps(_timeline_entry_json(t))
+                    separator = ", "
+                yield "]}"
+        finally:
+            db.close()
+
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    return http_cache.with_etag(Response(stream_with_context(generate()), mimetype=mimetype), etag)
+
+
+def _timeline_entry_json(t):
+    return {
+        "id": t.id,
+        "user_query": t.user_query,
+        "model_response": t.model_response,
+        "insights": t.insights,
+        "created_at": t.created_at.isoformat() if t.created_at else None
+    }
 
 
 @main.route("/consult", methods=["POST"])
@@ -601,12 +686,18 @@ def get_user_profile(user_id):
         description: Profile retrieved
     """
     db = SessionLocal()
-    user = crud.get_user_by_id(db, user_id=user_id)
-    if not user:
+    version = crud.get_user_profile_version(db, user_id)
+    if version is None:
         db.close()
         return jsonify({"error": "User not found"}), 404
-        
-    return _build_user_profile_response(db, user_id)
+
+    etag = http_cache.make_etag(*version)
+    cached = http_cache.not_modified(etag)
+    if cached is not None:
+        db.close()
+        return cached
+
+    return http_cache.with_etag(_build_user_profile_response(db, user_id), etag)
 
 def _build_user_profile_response(db, user_id):
     user = crud.get_user_by_id(db, user_id=user_id)
@@ -670,39 +761,202 @@ def get_consultations(user_id):
         type: integer
         required: false
         default: 10
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: >
+          Keyset mode. Pass an empty cursor for the first page, then the
+          returned next_cursor; page is ignored. Stays fast on deep pages.
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+        description: Return "total" (cached per user for a short time). Defaults to true in page mode, false in cursor mode.
     responses:
       200:
         description: Consultations retrieved
     """
-    db = SessionLocal()
-    
+    cursor = request.args.get('cursor')
     try:
         page = max(1, int(request.args.get('page', 1)))
         limit = max(1, min(100, int(request.args.get('limit', 10))))
     except ValueError:
         return jsonify({"error": "Invalid page or limit query parameter"}), 400
-    limit = int(request.args.get('limit', 10))
-    offset = (page - 1) * limit
-    
-    valid_consults = crud.get_consultations(db, user_id=user_id, limit=limit, offset=offset)
-    total_count = crud.get_consultations_count(db, user_id=user_id)
-    has_more = (offset + limit) < total_count
-    
-    response_data = {
+    include_total = request.args.get('include_total', 'true' if cursor is None else 'false').lower() in ('1', 'true', 'yes')
+
+    db = SessionLocal()
+    try:
+        etag = http_cache.make_etag(*crud.get_consultations_version(db, user_id))
+        cached = http_cache.not_modified(etag)
+        if cached is not None:
+            return cached
+
+        if cursor is not None:
+            try:
+                valid_consults, next_cursor = crud.get_consultations_after(db, user_id=user_id, limit=limit, cursor=cursor)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        else:
+            # Legacy page/limit mode; limit+1 rows tell us has_more without a COUNT
+            offset = (page - 1) * limit
+            valid_consults = crud.get_consultations(db, user_id=user_id, limit=limit + 1, offset=offset)
+            next_cursor = crud.encode_consultation_cursor(valid_consults[limit - 1]) if len(valid_consults) > limit else None
+            valid_consults = valid_consults[:limit]
+
+        response_data = {
+            "consultations": [
+                {
+                    "id": c.id,
+                    "date": c.created_at.strftime("%Y-%m-%d %H:%M") if c.created_at else "",
+                    "title": c.heading,
+                    "summary": c.summary,
+                    "is_active": c.is_active
+                }
+                for c in valid_consults
+            ],
+            "has_more": next_cursor is not None,
+            "next_cursor": next_cursor
+        }
+        if cursor is None:
+            response_data["page"] = page
+        if include_total:
+            response_data["total"] = crud.get_consultations_count(db, user_id=user_id)
+    finally:
+        db.close()
+    return http_cache.with_etag(jsonify(response_data), etag)
+
+
+@main.route("/sync/<string:user_id>", methods=["GET"])
+def sync_changes(user_id):
+    """
+    Delta sync: consultations, timeline turns and conditions changed since the last poll
+    ---
+    tags:
+      - Consultation
+    parameters:
+      - name: user_id
+        in: path
+        type: string
+        required: true
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: >
+          The watermark returned by the previous call. Omit for a full sync.
+          Rows near the watermark may be returned again; upsert them by id.
+    responses:
+      200:
+        description: >
+          Changed rows plus the watermark to send next time. has_more means a
+          kind was capped at SYNC_MAX_ROWS; poll again right away.
+      400:
+        description: Invalid sync token
+    """
+    since = request.args.get("since")
+    try:
+        since = crud.decode_sync_watermark(since) if since else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db = SessionLocal()
+    try:
+        changes = crud.get_changes_since(db, user_id=user_id, since=since)
+    finally:
+        db.close()
+
+    def iso(value):
+        return value.isoformat() if value else None
+
+    return jsonify({
         "consultations": [
             {
                 "id": c.id,
                 "date": c.created_at.strftime("%Y-%m-%d %H:%M") if c.created_at else "",
                 "title": c.heading,
                 "summary": c.summary,
-                "is_active": c.is_active
+                "is_active": c.is_active,
+                "updated_at": iso(c.updated_at)
             }
-            for c in valid_consults
+            for c in changes["consultations"]
         ],
-        "total": total_count,
-        "page": page,
-        "has_more": has_more
-    }
-    
-    db.close()
-    return jsonify(response_data)
+        "timeline": [
+            {
+                "id": t.id,
+                "consultation_id": t.consultation_id,
+                "user_query": t.user_query,
+                "model_response": t.model_response,
+                "insights": t.insights,
+                "created_at": iso(t.created_at),
+                "updated_at": iso(t.updated_at)
+            }
+            for t in changes["timeline"]
+        ],
+        "conditions": [
+            {
+                "id": cond.id,
+                "name": cond.condition_name,
+                "active": cond.is_active,
+                "type": cond.condition_type,
+                "consultation_id": cond.consultation_id,
+                "notes": cond.notes,
+                "updated_at": iso(cond.updated_at)
+            }
+            for cond in changes["conditions"]
+        ],
+        "watermark": crud.encode_sync_watermark(changes["watermark"]),
+        "has_more": changes["has_more"]
+    })
+
+
+@main.route("/events/<string:user_id>", methods=["GET"])
+def events(user_id):
+    """
+    Server-Sent Events stream of the user's pipeline progress
+    ---
+    tags:
+      - Consultation
+    parameters:
+      - name: user_id
+        in: path
+        type: string
+        required: true
+    produces:
+      - text/event-stream
+    responses:
+      200:
+        description: >
+          One SSE message per event (event names insights_done, summary_updated,
+          conditions_changed, pipeline_complete; data is JSON with consultation_id).
+          Comment lines are sent as keepalives. After a reconnect, catch up with /sync.
+      503:
+        description: Too many open event streams on this server; retry later (Retry-After) or poll /sync.
+    """
+    heartbeat = float(os.environ.get("EVENTS_HEARTBEAT_SECONDS", 15))
+    subscription = events_bus.subscribe(user_id)
+    if subscription is None:
+        # Each stream holds a worker thread; past the cap they would starve every other endpoint
+        response = jsonify({"message": "Too many open event streams. Retry later or poll /sync."})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = subscription.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Keeps proxies from closing an idle connection and surfaces client disconnects
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events_bus.unsubscribe(user_id, subscription)
+
+    response = Response(stream_with_context(stream()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Disable proxy buffering (nginx) so events arrive immediately
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
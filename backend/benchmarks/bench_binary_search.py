@@ -0,0 +1,166 @@
+"""
+Benchmark: two-stage binary-quantized search vs exact cosine search, per user.
+
+Loads synthetic clustered embeddings (see bench_halfvec.py), each owned by one of
+--users users, into a TEMP table in the configured Postgres database with the
+indexes the app uses: a user_id B-tree, cosine HNSW on the full vectors and
+Hamming HNSW on binary_quantize(embedding)::bit(N). Every query searches one
+user's rows (WHERE user_id = ...), as crud.semantic_search_records does, and
+recall@k is measured against an exact float32 top-k over that user's rows.
+
+Searches compared:
+    exact (per user)        SEMANTIC_SEARCH_MODE=exact: the user's rows, then sort
+    cosine HNSW post-filter the global index scan filtered afterwards (what the
+                            planner does without the fence: recall collapses as
+                            --users grows)
+    cosine HNSW iterative   the same with hnsw.iterative_scan (pgvector >= 0.8)
+    binary xN               SEMANTIC_SEARCH_MODE=binary: Hamming candidates, LIMIT
+                            k * N, re-ranked by exact cosine (iterative scan when
+                            the server has it, otherwise post-filtered)
+
+Temporary tables only: nothing persists.
+
+Usage (from backend/, needs DATABASE_URL pointing at Postgres with pgvector >= 0.7):
+    python benchmarks/bench_binary_search.py
+    python benchmarks/bench_binary_search.py --rows 200000 --users 2000 --k 20 --oversample 1 2 4 8 16
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from db.database import engine  # noqa: E402
+from db.models import VECTOR_DIMENSION, VECTOR_STORAGE  # noqa: E402
+from db.vector_storage import ITERATIVE_SCAN_MIN_VERSION, pgvector_version  # noqa: E402
+from bench_halfvec import BATCH, make_embeddings, literal, recall  # noqa: E402
+
+TABLE = "bench_binary_search"
+
+
+def exact_top_k_per_user(data, owners, queries, query_users, k):
+    """Exact top-k ids among each query's user's rows (unit vectors: highest dot product first)."""
+    truth = []
+    for q, user in zip(queries, query_users):
+        ids = np.flatnonzero(owners == user)
+        truth.append(ids[np.argsort(-(data[ids] @ q))[:k]])
+    return truth
+
+
+def load(connection, data, owners, sql_type, dim):
+    connection.execute(text(
+        f"CREATE TEMP TABLE {TABLE} (id integer PRIMARY KEY, user_id integer NOT NULL, embedding {sql_type})"
+    ))
+    for offset in range(0, len(data), BATCH):
+        connection.execute(
+            text(f"INSERT INTO {TABLE} (id, user_id, embedding) VALUES (:id, :user_id, CAST(:embedding AS {sql_type}))"),
+            [{"id": offset + i, "user_id": int(owners[offset + i]), "embedding": literal(v)}
+             for i, v in enumerate(data[offset:offset + BATCH])],
+        )
+    connection.execute(text(f"CREATE INDEX {TABLE}_user ON {TABLE} (user_id)"))
+    timings = {}
+    for name, definition in (
+        ("cosine", f"(embedding {VECTOR_STORAGE}_cosine_ops)"),
+        ("binary", f"((binary_quantize(embedding)::bit({dim})) bit_hamming_ops)"),
+    ):
+        start = time.perf_counter()
+        connection.execute(text(f"CREATE INDEX {TABLE}_{name} ON {TABLE} USING hnsw {definition}"))
+        timings[name] = time.perf_counter() - start
+    connection.execute(text(f"ANALYZE {TABLE}"))
+    return timings
+
+
+def measure(connection, statement, query_params, truth, params, ef_search=40, iterative_scan=None):
+    connection.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+    if iterative_scan is not None:
+        connection.execute(text(f"SET LOCAL hnsw.iterative_scan = {iterative_scan}"))
+    found, latencies = [], []
+    for query in query_params:
+        start = time.perf_counter()
+        found.append(connection.execute(statement, {**query, **params}).scalars().all())
+        latencies.append((time.perf_counter() - start) * 1000)
+    return recall(found, truth), float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversample", type=float, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    dim, sql_type = VECTOR_DIMENSION, f"{VECTOR_STORAGE}({VECTOR_DIMENSION})"
+    data, queries = make_embeddings(args.rows, args.queries, dim, rng)
+    owners = rng.integers(0, args.users, args.rows)
+    query_users = rng.integers(0, args.users, args.queries)
+    truth = exact_top_k_per_user(data, owners, queries, query_users, args.k)
+    query_params = [{"query": literal(q), "user_id": int(u)} for q, u in zip(queries, query_users)]
+
+    exact = text(f"""
+        SELECT id FROM (SELECT id, embedding FROM {TABLE} WHERE user_id = :user_id OFFSET 0) user_rows
+        ORDER BY embedding <=> CAST(:query AS {sql_type})
+        LIMIT :k
+    """)
+    post_filter = text(f"""
+        SELECT id FROM {TABLE} WHERE user_id = :user_id
+        ORDER BY embedding <=> CAST(:query AS {sql_type})
+        LIMIT :k
+    """)
+    two_stage = text(f"""
+        SELECT id FROM (
+            SELECT id, embedding FROM {TABLE}
+            WHERE user_id = :user_id
+            ORDER BY binary_quantize(embedding)::bit({dim}) <~> binary_quantize(CAST(:query AS {sql_type}))
+            LIMIT :candidates
+        ) candidates
+        ORDER BY embedding <=> CAST(:query AS {sql_type})
+        LIMIT :k
+    """)
+
+    with engine.connect() as connection:
+        iterative = pgvector_version(connection) >= ITERATIVE_SCAN_MIN_VERSION
+        builds = load(connection, data, owners, sql_type, dim)
+        cosine_bytes, binary_bytes = connection.execute(text(
+            f"SELECT pg_relation_size('{TABLE}_cosine'), pg_relation_size('{TABLE}_binary')"
+        )).one()
+
+        print(f"--- {args.rows} x {dim}-D {VECTOR_STORAGE} over {args.users} users (~{args.rows // args.users} rows each), "
+              f"{args.queries} queries, recall@{args.k} ---")
+        print(f"cosine HNSW: {cosine_bytes / 1e6:.1f} MB, built in {builds['cosine']:.1f}s | "
+              f"binary HNSW: {binary_bytes / 1e6:.1f} MB, built in {builds['binary']:.1f}s")
+        if not iterative:
+            print("pgvector < 0.8: no hnsw.iterative_scan, so HNSW searches below are post-filtered "
+                  "(the app falls back to exact per-user search)")
+        print(f"{'search':<26} {'recall':>7} {'p50_ms':>7} {'p95_ms':>7}")
+
+        runs = [
+            ("exact (per user)", exact, {"k": args.k}, {}),
+            ("cosine HNSW post-filter", post_filter, {"k": args.k}, {}),
+        ]
+        if iterative:
+            runs.append(("cosine HNSW iterative", post_filter, {"k": args.k}, {"iterative_scan": "strict_order"}))
+        for label, statement, params, kwargs in runs:
+            r, p50, p95 = measure(connection, statement, query_params, truth, params, **kwargs)
+            print(f"{label:<26} {r:>7.4f} {p50:>7.2f} {p95:>7.2f}")
+
+        for factor in args.oversample:
+            candidates = int(np.ceil(args.k * factor))
+            # As crud.semantic_search_records: ef_search covers the candidate count, iterative scan past other users
+            r, p50, p95 = measure(connection, two_stage, query_params, truth,
+                                  {"k": args.k, "candidates": candidates},
+                                  ef_search=min(max(candidates, 40), 1000),
+                                  iterative_scan="relaxed_order" if iterative else None)
+            print(f"{f'binary x{factor:g} ({candidates})':<26} {r:>7.4f} {p50:>7.2f} {p95:>7.2f}")
+        connection.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: fused single-call end-of-session analysis vs the multi-call pipeline.
+
+Runs both analysis paths of DataProcessingLLM over the same synthetic consultation
+and reports wall-clock latency, number of API calls and token usage.
+
+Usage (from backend/):
+    python benchmarks/bench_fused_analysis.py --offline          # simulated LLM, no network
+    python benchmarks/bench_fused_analysis.py --turns 12         # live HF API (needs HF_API_TOKEN)
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.LLM_module import DataProcessingLLM, estimate_tokens  # noqa: E402
+
+SAMPLE_TURNS = [
+    ("I've had a dry cough for about a week since starting lisinopril.",
+     "A persistent dry cough is a known side effect of ACE inhibitors like lisinopril. Please speak to your doctor about switching to an ARB such as losartan."),
+    ("Thanks, that helps.", "You're welcome. Let me know if anything else comes up."),
+    ("My blood pressure this morning was 145/92.",
+     "That reading is above target. Keep a log of morning and evening readings for your next appointment and reduce salt intake."),
+    ("Should I stop taking it right away?",
+     "Don't stop any prescribed medication without talking to your doctor first; they can switch you safely."),
+    ("Ok.", "Is there anything else I can help you with today?"),
+    ("I also get headaches in the afternoon.",
+     "Afternoon headaches can be related to elevated blood pressure, dehydration or screen strain. Track when they happen and your readings at the time."),
+]
+
+
+class SimulatedLLM(DataProcessingLLM):
+    """Offline stand-in: fixed per-call latency plus per-output-token latency, canned JSON outputs."""
+
+    def __init__(self, base_latency: float, per_token_latency: float):
+        super().__init__(cache=None)
+        self.base_latency = base_latency
+        self.per_token_latency = per_token_latency
+
+    def _call_hf_api(self, prompt, schema_json=None):
+        labels = re.findall(r"^\[(T\d+)\]", prompt, re.M)
+        insight = {"insight_found": True, "compressed_summary": "Dry cough attributed to lisinopril; switch to ARB advised.",
+                   "primary_condition_or_symptom": "ACE-inhibitor cough", "icd_codes_extracted": ["R05"]}
+        condition = {"mode": "add", "condition_name": "ACE-inhibitor induced cough", "condition_type": "adr",
+                     "condition_id": None, "is_active": True, "notes": "Onset after starting lisinopril."}
+
+        if "Clinical Post-Processing Engine" in prompt:
+            output = json.dumps({"insights": [dict(insight, entry_id=label) for label in labels],
+                                 "heading": "ACE Inhibitor Cough",
+                                 "summary": "Patient reports dry cough after starting lisinopril with elevated BP readings.",
+                                 "conditions": [condition]})
+        elif "--- CONVERSATION TURNS ---" in prompt:
+            output = json.dumps([dict(insight, entry_id=label) for label in labels])
+        elif "--- CONVERSATION TURN ---" in prompt:
+            output = json.dumps(insight)
+        elif "--- CONTEXT DATA FOR ANALYSIS ---" in prompt:
+            output = json.dumps([condition])
+        else:
+            output = json.dumps({"heading": "ACE Inhibitor Cough",
+                                 "summary": "Patient reports dry cough after starting lisinopril with elevated BP readings."})
+
+        completion_tokens = estimate_tokens(output)
+        time.sleep(self.base_latency + completion_tokens * self.per_token_latency)
+        self._record_usage(estimate_tokens(prompt), completion_tokens)
+        return output
+
+
+def build_turns(n):
+    return [
+        {"id": f"entry-{i}", "user_query": SAMPLE_TURNS[i % len(SAMPLE_TURNS)][0],
+         "model_response": SAMPLE_TURNS[i % len(SAMPLE_TURNS)][1]}
+        for i in range(n)
+    ]
+
+
+HEALTH_RECORDS = [
+    {"id": "c-1", "name": "Hypertension", "type": "condition", "active": True, "notes": "Grade 1, on lisinopril 5mg"},
+    {"id": "c-2", "name": "Seasonal allergies", "type": "condition", "active": True, "notes": ""},
+]
+
+
+def run_multi(llm, turns, batched):
+    if batched:
+        insights = llm.extract_insights_batch(turns, use_cache=False)
+    else:
+        insights = {t["id"]: llm.extract_insights(t["user_query"], t["model_response"], use_cache=False) for t in turns}
+    timeline = "".join(f"USER: {t['user_query']}\nMODEL: {t['model_response']}\n\n" for t in turns)
+    _, summary = llm.summarise("", timeline, use_cache=False)
+    entries = [i.compressed_summary for i in insights.values() if i.insight_found]
+    llm.detect_condition(summary, entries, HEALTH_RECORDS, use_cache=False)
+
+
+def run_fused(llm, turns):
+    llm.analyse_session("", turns, HEALTH_RECORDS, use_cache=False)
+
+
+def measure(label, llm, fn, repeats):
+    llm.reset_usage()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeats
+    usage = {k: v / repeats for k, v in llm.reset_usage().items()}
+    print(f"{label:<28} {elapsed * 1000:>10.1f} {usage['calls']:>7.1f} "
+          f"{usage['prompt_tokens']:>10.0f} {usage['completion_tokens']:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10, help="Timeline turns in the synthetic consultation")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--offline", action="store_true", help="Use the simulated LLM instead of the HF API")
+    parser.add_argument("--base-latency", type=float, default=0.35, help="Simulated seconds per call (offline)")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Simulated seconds per output token (offline)")
+    args = parser.parse_args()
+
+    llm = SimulatedLLM(args.base_latency, args.token_latency) if args.offline else DataProcessingLLM(cache=None)
+    turns = build_turns(args.turns)
+
+    print(f"--- Fused vs multi-call analysis ({args.turns} turns, {'offline' if args.offline else 'live'}) ---")
+    print(f"{'path':<28} {'latency_ms':>10} {'calls':>7} {'prompt_tok':>10} {'compl_tok':>10}")
+    measure("multi (per-turn insights)", llm, lambda: run_multi(llm, turns, batched=False), args.repeats)
+    measure("multi (batched insights)", llm, lambda: run_multi(llm, turns, batched=True), args.repeats)
+    measure("fused (single call)", llm, lambda: run_fused(llm, turns), args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark: float32 `vector` vs float16 `halfvec` embedding storage.
+
+Loads the same synthetic embeddings (clustered unit vectors, VECTOR_DIMENSION wide,
+shaped like BioBERT sentence embeddings) into a TEMP table per storage mode in the
+configured Postgres database, builds the cosine HNSW index the app uses, and
+reports for each mode:
+
+    heap_MB / index_MB   table (incl. TOAST) and HNSW index size
+    build_s              HNSW index build time
+    exact_recall         recall@k of an exact (sequential) scan — the float16 loss alone
+    hnsw_recall          recall@k through the HNSW index at the given ef_search
+    p50_ms / p95_ms      HNSW query latency
+
+Ground truth is an exact float32 top-k computed in numpy. Temporary tables only:
+nothing persists. Needs pgvector >= 0.7 for halfvec.
+
+Usage (from backend/, needs DATABASE_URL pointing at Postgres):
+    python benchmarks/bench_halfvec.py
+    python benchmarks/bench_halfvec.py --rows 200000 --queries 500 --k 10 --ef-search 80
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from db.database import engine  # noqa: E402
+from db.models import VECTOR_DIMENSION  # noqa: E402
+
+MODES = ("vector", "halfvec")
+BATCH = 2000
+CLUSTERS = 200
+
+
+def make_embeddings(rows, queries, dim, rng):
+    centers = rng.standard_normal((CLUSTERS, dim)).astype(np.float32)
+
+    def sample(n):
+        points = centers[rng.integers(0, CLUSTERS, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(rows), sample(queries)
+
+
+def exact_top_k(data, queries, k):
+    # Unit vectors: highest dot product == smallest cosine distance
+    scores = queries @ data.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def literal(vector):
+    return "[" + ",".join(f"{x:.7g}" for x in vector) + "]"
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def run_mode(connection, mode, data, queries, truth, k, ef_search):
+    table, sql_type = f"bench_{mode}", f"{mode}({data.shape[1]})"
+    connection.execute(text(f"CREATE TEMP TABLE {table} (id integer PRIMARY KEY, embedding {sql_type})"))
+    for offset in range(0, len(data), BATCH):
+        connection.execute(
+            text(f"INSERT INTO {table} (id, embedding) VALUES (:id, CAST(:embedding AS {sql_type}))"),
+            [{"id": offset + i, "embedding": literal(v)} for i, v in enumerate(data[offset:offset + BATCH])],
+        )
+
+    search = text(f"""
+        SELECT id FROM {table}
+        ORDER BY embedding <=> CAST(:query AS {sql_type})
+        LIMIT :k
+    """)
+    query_literals = [literal(q) for q in queries]
+
+    # Exact scan first (no index yet): isolates what float16 storage alone costs in recall
+    exact = [connection.execute(search, {"query": q, "k": k}).scalars().all() for q in query_literals]
+
+    start = time.perf_counter()
+    connection.execute(text(f"CREATE INDEX bench_{mode}_hnsw ON {table} USING hnsw (embedding {mode}_cosine_ops)"))
+    build_s = time.perf_counter() - start
+    connection.execute(text(f"ANALYZE {table}"))
+    connection.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+
+    found, latencies = [], []
+    for q in query_literals:
+        start = time.perf_counter()
+        found.append(connection.execute(search, {"query": q, "k": k}).scalars().all())
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    heap, index = connection.execute(text(
+        f"SELECT pg_table_size('{table}'), pg_relation_size('bench_{mode}_hnsw')"
+    )).one()
+    return {
+        "heap_mb": heap / 1e6,
+        "index_mb": index / 1e6,
+        "build_s": build_s,
+        "exact_recall": recall(exact, truth),
+        "hnsw_recall": recall(found, truth),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data, queries = make_embeddings(args.rows, args.queries, VECTOR_DIMENSION, np.random.default_rng(args.seed))
+    truth = exact_top_k(data, queries, args.k)
+
+    print(f"--- Embedding storage: {args.rows} x {VECTOR_DIMENSION}-D, {args.queries} queries, "
+          f"recall@{args.k}, ef_search={args.ef_search} ---")
+    print(f"{'mode':<8} {'heap_MB':>8} {'index_MB':>9} {'build_s':>8} {'exact_recall':>13} "
+          f"{'hnsw_recall':>12} {'p50_ms':>7} {'p95_ms':>7}")
+    for mode in MODES:
+        with engine.connect() as connection:
+            r = run_mode(connection, mode, data, queries, truth, args.k, args.ef_search)
+            connection.rollback()
+        print(f"{mode:<8} {r['heap_mb']:>8.1f} {r['index_mb']:>9.1f} {r['build_s']:>8.1f} {r['exact_recall']:>13.4f} "
+              f"{r['hnsw_recall']:>12.4f} {r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Fuzz + benchmark: single-pass JSON extractor vs the old regex-based cleaner.
+
+Replays recorded raw LLM outputs (benchmarks/data/llm_raw_outputs.jsonl, or the
+llm_response_cache table with --from-cache), then:
+  * fuzz   — applies meaning-preserving mutations (chatter, fences, Python
+             literals, trailing commas) that must still parse to the expected
+             value, and destructive ones (truncation, noise, deep nesting) that must never raise;
+  * bench  — times both parsers on the recorded outputs and on long chatty outputs.
+
+Usage (from backend/):
+    python benchmarks/bench_json_extractor.py
+    python benchmarks/bench_json_extractor.py --cases 2000 --seed 7
+    python benchmarks/bench_json_extractor.py --from-cache      # needs DATABASE_URL
+Exits non-zero if any fuzz invariant fails.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.json_extractor import extract_json  # noqa: E402
+
+RECORDED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_raw_outputs.jsonl")
+
+CHATTER = [
+    "Sure! Here is the JSON you asked for:",
+    "Based on the conversation, I extracted the following (see {schema} above):",
+    "Note: values in [brackets] are estimates.",
+    "I hope this helps. Let me know if you need anything else!",
+    "Output:",
+]
+
+
+def legacy_clean_and_parse_json(raw_text):
+    """The previous DataProcessingLLM._clean_and_parse_json, kept for comparison."""
+    if not raw_text:
+        return None
+    sanitized = raw_text
+    sanitized = re.sub(r'\bNone\b', 'null', sanitized)
+    sanitized = re.sub(r'\bTrue\b', 'true', sanitized)
+    sanitized = re.sub(r'\bFalse\b', 'false', sanitized)
+    sanitized = re.sub(r'```(?:json)?', '', sanitized).strip()
+    try:
+        return json.loads(sanitized)
+    except json.JSONDecodeError:
+        pass
+    try:
+        match = re.search(r'(\{.*\}|\[.*\])', sanitized, re.DOTALL)
+        if match:
+            return json.loads(match.group(1))
+    except (json.JSONDecodeError, AttributeError):
+        pass
+    return None
+
+
+def load_recorded(from_cache):
+    if from_cache:
+        from db.database import SessionLocal
+        from db import models
+
+        db = SessionLocal()
+        try:
+            rows = db.query(models.LLMCacheEntry.response).all()
+        finally:
+            db.close()
+        # Cached responses parsed cleanly when stored; that parse is the expected value
+        return [{"raw": raw, "expected": extract_json(raw)} for (raw,) in rows]
+
+    with open(RECORDED_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def to_python_literals(value):
+    """Renders a JSON value the way an LLM imitating Python would (single quotes, True/None)."""
+    return repr(value)
+
+
+def with_trailing_commas(value):
+    """Serialises a JSON value with a trailing comma after the last item of every container."""
+    if isinstance(value, dict):
+        return "{" + "".join(f"{json.dumps(k)}: {with_trailing_commas(v)}, " for k, v in value.items()) + "}"
+    if isinstance(value, list):
+        return "[" + "".join(f"{with_trailing_commas(v)}, " for v in value) + "]"
+    return json.dumps(value)
+
+
+def preserving_mutation(rng, record):
+    expected = record["expected"]
+    base = json.dumps(expected, indent=rng.choice([None, 2]))
+    kind = rng.choice(["chatter", "fence", "python", "trailing_comma", "raw"])
+    if kind == "chatter":
+        text = f"{rng.choice(CHATTER)}\n{base}\n{rng.choice(CHATTER)}"
+    elif kind == "fence":
+        text = f"```json\n{base}\n```"
+    elif kind == "python":
+        text = to_python_literals(expected)
+    elif kind == "trailing_comma":
+        text = with_trailing_commas(expected)
+    else:
+        text = record["raw"]
+    return kind, text
+
+
+def destructive_mutation(rng, record):
+    raw = record["raw"]
+    kind = rng.choice(["truncate", "noise", "unbalanced", "deep"])
+    if kind == "truncate":
+        return kind, raw[:rng.randint(0, max(0, len(raw) - 1))]
+    if kind == "noise":
+        chars = list(raw)
+        for _ in range(rng.randint(1, 5)):
+            chars.insert(rng.randint(0, len(chars)), rng.choice('{}[]"\',:\\'))
+        return kind, "".join(chars)
+    if kind == "deep":
+        depth = rng.randint(500, 5000)
+        return kind, "[" * depth + raw + "]" * rng.choice([0, depth])
+    return kind, "{" * rng.randint(1, 20) + raw
+
+
+def fuzz(records, cases, seed):
+    rng = random.Random(seed)
+    failures = []
+    legacy_correct = new_correct = preserving = 0
+    for _ in range(cases):
+        record = rng.choice(records)
+        if record.get("expected") is None:
+            continue
+
+        kind, text = preserving_mutation(rng, record)
+        preserving += 1
+        result = extract_json(text)
+        if result == record["expected"]:
+            new_correct += 1
+        else:
+            failures.append({"mutation": kind, "text": text[:200], "got": result})
+        if legacy_clean_and_parse_json(text) == record["expected"]:
+            legacy_correct += 1
+
+        kind, text = destructive_mutation(rng, record)
+        try:
+            extract_json(text)
+        except Exception as e:
+            failures.append({"mutation": kind, "text": text[:200], "error": repr(e)})
+
+    print(f"[fuzz] preserving mutations: new {new_correct}/{preserving}, legacy {legacy_correct}/{preserving}")
+    print(f"[fuzz] invariant failures: {len(failures)}")
+    for failure in failures[:10]:
+        print("   ", failure)
+    return not failures
+
+
+def time_parser(parser, texts, repeats):
+    """Mean ms per call, plus how many inputs made the parser raise."""
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for text in texts:
+            try:
+                parser(text)
+            except Exception:
+                errors += 1
+    return (time.perf_counter() - start) * 1000 / (repeats * len(texts)), errors // repeats
+
+
+def bench(records, repeats):
+    recorded = [record["raw"] for record in records]
+    payload = json.dumps(records[0]["expected"])
+    prose = "The patient {mentioned} several [things] about their history. " * 400
+    long_chatty = [
+        prose + payload + prose,
+        prose + "[" + prose + payload,
+        "{ " * 2000 + payload,
+        # Truncated output: many openers, nothing closes (greedy regex retries every start)
+        ("{ \"note\": [" * 2000) + " the model stopped here",
+    ]
+
+    print(f"{'dataset':<14} {'new_ms':>9} {'new_raised':>10} {'legacy_ms':>10} {'legacy_raised':>13}")
+    for name, texts in (("recorded", recorded), ("long chatty", long_chatty)):
+        new_ms, new_errors = time_parser(extract_json, texts, repeats)
+        legacy_ms, legacy_errors = time_parser(legacy_clean_and_parse_json, texts, repeats)
+        print(f"{name:<14} {new_ms:>9.3f} {new_errors:>10} {legacy_ms:>10.3f} {legacy_errors:>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=1000, help="Fuzz cases")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=20, help="Benchmark repetitions")
+    parser.add_argument("--from-cache", action="store_true", help="Replay outputs from the llm_response_cache table")
+    args = parser.parse_args()
+
+    records = load_recorded(args.from_cache)
+    print(f"--- JSON extractor: {len(records)} recorded outputs ---")
+    ok = fuzz(records, args.cases, args.seed)
+    bench(records, args.repeats)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
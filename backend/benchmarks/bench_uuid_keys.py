@@ -0,0 +1,105 @@
+"""
+Benchmark: String(36) text keys vs native uuid keys (random UUID4 vs time-ordered UUIDv7).
+
+Builds three TEMP tables shaped like consultation_timeline's keys (PK + indexed FK
+to a parent table) in the configured Postgres database and, for each layout,
+reports bulk-insert throughput, primary-key and FK index sizes, point-lookup
+latency and an FK join. Temporary tables only: nothing persists.
+
+    text_uuid4  — the old layout: varchar(36) keys, random UUID4 values
+    uuid_uuid4  — native uuid keys, random UUID4 values   (UUID_V7_ENABLED=false)
+    uuid_uuid7  — native uuid keys, time-ordered UUIDv7   (default)
+
+Usage (from backend/, needs DATABASE_URL pointing at Postgres):
+    python benchmarks/bench_uuid_keys.py
+    python benchmarks/bench_uuid_keys.py --rows 500000 --lookups 5000
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from db.database import engine  # noqa: E402
+from db.models import uuid7  # noqa: E402
+
+LAYOUTS = {
+    "text_uuid4": ("varchar(36)", lambda: str(uuid.uuid4())),
+    "uuid_uuid4": ("uuid", lambda: str(uuid.uuid4())),
+    "uuid_uuid7": ("uuid", uuid7),
+}
+PARENTS = 1000
+BATCH = 5000
+
+
+def run_layout(connection, name, key_type, make_id, rows, lookups, rng):
+    parent, child = f"bench_{name}_parent", f"bench_{name}_child"
+    connection.execute(text(f"CREATE TEMP TABLE {parent} (id {key_type} PRIMARY KEY)"))
+    connection.execute(text(
+        f"CREATE TEMP TABLE {child} (id {key_type} PRIMARY KEY, "
+        f"parent_id {key_type} REFERENCES {parent}(id), payload text)"
+    ))
+    connection.execute(text(f"CREATE INDEX ON {child} (parent_id)"))
+
+    parent_ids = [make_id() for _ in range(PARENTS)]
+    connection.execute(text(f"INSERT INTO {parent} (id) VALUES (:id)"), [{"id": i} for i in parent_ids])
+
+    child_ids = []
+    start = time.perf_counter()
+    for offset in range(0, rows, BATCH):
+        batch = [{"id": make_id(), "parent_id": rng.choice(parent_ids), "payload": "x" * 64}
+                 for _ in range(min(BATCH, rows - offset))]
+        child_ids.extend(row["id"] for row in batch)
+        connection.execute(text(f"INSERT INTO {child} (id, parent_id, payload) VALUES (:id, :parent_id, :payload)"), batch)
+    insert_s = time.perf_counter() - start
+    connection.execute(text(f"ANALYZE {child}"))
+
+    pk_size, fk_size = connection.execute(text(f"""
+        SELECT pg_relation_size('{child}_pkey'),
+               pg_relation_size((SELECT indexrelid::regclass FROM pg_index
+                                 WHERE indrelid = '{child}'::regclass AND NOT indisprimary LIMIT 1))
+    """)).one()
+
+    lookup = text(f"SELECT payload FROM {child} WHERE id = :id")
+    sample = rng.sample(child_ids, min(lookups, len(child_ids)))
+    start = time.perf_counter()
+    for key in sample:
+        connection.execute(lookup, {"id": key}).first()
+    lookup_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    start = time.perf_counter()
+    connection.execute(text(f"SELECT count(*) FROM {child} c JOIN {parent} p ON p.id = c.parent_id")).scalar()
+    join_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "insert_rows_per_s": rows / insert_s,
+        "pk_index_mb": pk_size / 1e6,
+        "fk_index_mb": fk_size / 1e6,
+        "lookup_ms": lookup_ms,
+        "join_ms": join_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"--- Key layouts: {args.rows} rows, {args.lookups} point lookups ---")
+    print(f"{'layout':<12} {'insert/s':>10} {'pk_MB':>8} {'fk_MB':>8} {'lookup_ms':>10} {'join_ms':>9}")
+    for name, (key_type, make_id) in LAYOUTS.items():
+        with engine.connect() as connection:
+            result = run_layout(connection, name, key_type, make_id, args.rows, args.lookups, random.Random(args.seed))
+            connection.rollback()
+        print(f"{name:<12} {result['insert_rows_per_s']:>10.0f} {result['pk_index_mb']:>8.2f} "
+              f"{result['fk_index_mb']:>8.2f} {result['lookup_ms']:>10.3f} {result['join_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
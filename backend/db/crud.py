@@ -1,12 +1,20 @@
 from typing import Optional, List
-from sqlalchemy.orm import Session
-from sqlalchemy import Date, func, literal, select, text, DateTime, union_all, literal_column, bindparam, cast
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy import Date, Integer, Text, func, literal, select, text, tuple_, update, DateTime, union_all, literal_column, bindparam, cast
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timedelta
 from pgvector.sqlalchemy import Vector
 from pgvector import Vector as PgVector
 import numpy as np
 import os
-from . import models
-from .models import VECTOR_DIMENSION
+import json
+import time
+import base64
+import uuid
+import hashlib
+import threading
+from . import models, vector_cache, vector_storage
+from .models import VECTOR_DIMENSION, VECTOR_SQL_TYPE, SEMANTIC_SEARCH_MODE, UUIDString
 
 SIMILARITY_THRESHOLD = float(os.environ.get("SIMILARITY_THRESHOLD", 0.4))
 # Safety ceiling — prevents token overflow on very large patient histories.
@@ -38,24 +46,20 @@ def create_user(
         height_cm=height_cm,
         weight_kg=weight_kg
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    
+    # User and signup conditions go in as one unit of work (one commit)
     if pre_existing_conditions:
         for cond_name in pre_existing_conditions:
             if cond_name.strip():
-                condition = models.UserCondition(
-                    user_id=user.id,
+                models.UserCondition(
+                    user=user,
                     source_type="signup_form",
                     condition_type="condition",
                     condition_name=cond_name.strip(),
                     is_active=True,
                     notes="Reported by patient during signup"
                 )
-                db.add(condition)
-        db.commit()
-        
+    db.add(user)
+    db.commit()
     return user
 
 def update_user_profile(
@@ -67,23 +71,25 @@ def update_user_profile(
     height_cm: float = None,
     weight_kg: float = None
 ):
-    user = get_user_by_id(db, user_id)
-    if not user:
-        return None
-        
-    if age is not None:
-        user.age = age
-    if gender is not None:
-        user.gender = gender
-    if blood_type is not None:
-        user.blood_type = blood_type
-    if height_cm is not None:
-        user.height_cm = height_cm
-    if weight_kg is not None:
-        user.weight_kg = weight_kg
-        
+    changes = {
+        "age": age,
+        "gender": gender,
+        "blood_type": blood_type,
+        "height_cm": height_cm,
+        "weight_kg": weight_kg,
+    }
+    changes = {field: value for field, value in changes.items() if value is not None}
+    if not changes:
+        return get_user_by_id(db, user_id)
+
+    # Single UPDATE ... RETURNING instead of SELECT + UPDATE + refresh
+    user = db.scalars(
+        update(models.User)
+        .where(models.User.id == user_id, models.User.is_active.isnot(False))
+        .values(**changes)
+        .returning(models.User)
+    ).first()
     db.commit()
-    db.refresh(user)
     return user
 
 def get_user_by_id(db: Session, user_id: str):
@@ -93,37 +99,41 @@ def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email, models.User.is_active.isnot(False)).first()
 
 def delete_user(db: Session, user_id: str):
-    user = db.query(models.User).filter(models.User.id == user_id, models.User.is_active.isnot(False)).first()
-    if user:
-        user.is_active = False
-        db.commit()
-        db.refresh(user)
-        return True
-    return False
+    result = db.execute(
+        update(models.User)
+        .where(models.User.id == user_id, models.User.is_active.isnot(False))
+        .values(is_active=False)
+    )
+    db.commit()
+    return result.rowcount > 0
 
 
 # -------------------- CONSULTATION FUNCTIONS --------------------
 
-def resolve_user_condition(db: Session, user_id: str, condition_name: str):
-    condition = db.query(models.UserCondition).filter(
-        models.UserCondition.user_id == user_id,
-        models.UserCondition.condition_name == condition_name,
-        models.UserCondition.is_active == True
-    ).first()
-    
-    if condition:
-        condition.is_active = False
+def resolve_user_condition(db: Session, user_id: str, condition_name: str, commit: bool = True):
+    """
+    Marks the user's active condition(s) with this name as resolved in a single UPDATE.
+    Pass commit=False to stage it in the caller's transaction.
+    """
+    result = db.execute(
+        update(models.UserCondition)
+        .where(
+            models.UserCondition.user_id == user_id,
+            models.UserCondition.condition_name == condition_name,
+            models.UserCondition.is_active == True
+        )
+        .values(is_active=False)
+    )
+    if commit:
         db.commit()
-        db.refresh(condition)
-        return True
-    return False
+    return result.rowcount > 0
 
 def create_consultation(db: Session, user_id: str, heading: str, reference: int = None):
     # Ensure reference is int as per FK, not str as in old function signature 
     consultation = models.Consultation(user_id=user_id, heading=heading, reference=reference)
     db.add(consultation)
     db.commit()
-    db.refresh(consultation)
+    invalidate_consultations_count(user_id)
     return consultation
 
 def get_recent_consultations(db: Session, user_id: str, limit: int = 5):
@@ -134,25 +144,99 @@ def get_recent_consultations(db: Session, user_id: str, limit: int = 5):
               .all())
 
 def get_consultations(db: Session, user_id: str, limit: int = 10, offset: int = 0):
+    """OFFSET pagination (legacy page/limit API). id breaks updated_at ties so pages are stable."""
     return (db.query(models.Consultation)
               .filter(models.Consultation.user_id == user_id)
-              .order_by(models.Consultation.updated_at.desc())
+              .order_by(models.Consultation.updated_at.desc(), models.Consultation.id.desc())
               .offset(offset)
               .limit(limit)
               .all())
 
-def get_consultations_count(db: Session, user_id: str):
-    return db.query(models.Consultation).filter(models.Consultation.user_id == user_id).count()
+def encode_keyset_cursor(timestamp: datetime, row_id: str) -> str:
+    """Opaque keyset cursor for the position just after a (timestamp, id) row."""
+    position = [timestamp.isoformat() if timestamp else None, row_id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_keyset_cursor(cursor: str):
+    """Returns (timestamp, id). Raises ValueError for a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        # Validated here: a tampered id would otherwise fail in Postgres' uuid cast (a 500, not a 400)
+        return datetime.fromisoformat(timestamp), str(uuid.UUID(str(row_id)))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def encode_consultation_cursor(consultation) -> str:
+    """Cursor for the position just after `consultation` in the consultation list order."""
+    return encode_keyset_cursor(consultation.updated_at, consultation.id)
+
+def get_consultations_after(db: Session, user_id: str, limit: int = 10, cursor: str = None):
+    """
+    Keyset pagination over a user's consultations (newest updated_at first).
+
+    Seeks past the cursor's (updated_at, id) on ix_consultations_user_updated_id
+    instead of scanning and discarding OFFSET rows, and fetches limit+1 rows to
+    know whether another page exists without a COUNT.
+
+    Returns (consultations, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for a malformed cursor.
+    """
+    query = db.query(models.Consultation).filter(models.Consultation.user_id == user_id)
+    if cursor:
+        updated_at, consultation_id = decode_keyset_cursor(cursor)
+        query = query.filter(
+            tuple_(models.Consultation.updated_at, models.Consultation.id) < tuple_(updated_at, consultation_id)
+        )
+    rows = (query
+            .order_by(models.Consultation.updated_at.desc(), models.Consultation.id.desc())
+            .limit(limit + 1)
+            .all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (encode_consultation_cursor(rows[-1]) if has_more and rows else None)
+
+# Per-user consultation counts, so paging through the list doesn't COUNT(*) on every page.
+# Invalidated by create_consultation in this process; other workers see at most TTL-old totals.
+CONSULTATION_COUNT_CACHE_SECONDS = float(os.environ.get("CONSULTATION_COUNT_CACHE_SECONDS", 60))
+_consultation_counts = {}
+_consultation_counts_lock = threading.Lock()
+
+def get_consultations_count(db: Session, user_id: str, max_age: float = None):
+    """
+    Number of consultations of a user. Served from a short-lived in-process cache
+    when it is younger than `max_age` seconds (default CONSULTATION_COUNT_CACHE_SECONDS;
+    0 forces an exact COUNT).
+    """
+    max_age = CONSULTATION_COUNT_CACHE_SECONDS if max_age is None else max_age
+    now = time.monotonic()
+    with _consultation_counts_lock:
+        cached = _consultation_counts.get(user_id)
+    if cached and now - cached[1] < max_age:
+        return cached[0]
+
+    count = db.query(func.count(models.Consultation.id)).filter(models.Consultation.user_id == user_id).scalar()
+    with _consultation_counts_lock:
+        _consultation_counts[user_id] = (count, now)
+    return count
+
+def invalidate_consultations_count(user_id: str) -> None:
+    with _consultation_counts_lock:
+        _consultation_counts.pop(user_id, None)
 
 def get_consultation_by_id(db: Session, consultation_id: str):
     return db.query(models.Consultation).filter(models.Consultation.id == consultation_id).first()
 
-def end_consultation(db: Session, consultation_id: str):
-    consultation = db.query(models.Consultation).filter(models.Consultation.id == consultation_id).first()
-    if consultation:
-        consultation.is_active = False
+def end_consultation(db: Session, consultation_id: str, commit: bool = True):
+    """Deactivates a consultation with one UPDATE ... RETURNING; None if it does not exist."""
+    consultation = db.scalars(
+        update(models.Consultation)
+        .where(models.Consultation.id == consultation_id)
+        .values(is_active=False)
+        .returning(models.Consultation)
+    ).first()
+    if commit:
         db.commit()
-        db.refresh(consultation)
     return consultation
 
 
@@ -163,6 +247,7 @@ def get_unsummarized_timeline_entries(db: Session, consultation_id: str, limit:
     return (db.query(models.ConsultationTimeline)
             .filter(
                 models.ConsultationTimeline.consultation_id == consultation_id,
+                timeline_partition_bound(consultation_id),
                 # Filter for entries that are pending extraction
                 models.ConsultationTimeline.insights.in_([None, "", "Pending End-of-Session Extraction"])
             )
@@ -175,43 +260,65 @@ def update_consultation_summary_and_embedding(
     db: Session,
     consultation_id: str,
     new_summary: str,
-    new_embedding_vector: Optional[List[float]]
+    new_embedding_vector: Optional[List[float]],
+    commit: bool = True
 ) -> None:
     """
     Updates the consultation summary, its vector embedding, and triggers the
     updated_at timestamp to reflect the new summary.
+    Pass commit=False to stage the change in the caller's transaction.
     """
-    consultation = db.query(models.Consultation).filter(models.Consultation.id == consultation_id).first()
-    
-    if consultation:
-        consultation.summary = new_summary
-        # Convert NumPy array to list for pgvector compatibility
-        if new_embedding_vector is not None:
-            if isinstance(new_embedding_vector, np.ndarray):
-                new_embedding_vector = new_embedding_vector.tolist()
-        consultation.embedding_vector = new_embedding_vector
-        # updated_at will automatically update due to onupdate=datetime.utcnow in the model
+    # Convert NumPy array to list for pgvector compatibility
+    if isinstance(new_embedding_vector, np.ndarray):
+        new_embedding_vector = new_embedding_vector.tolist()
+    # updated_at is set by the column's onupdate=func.clock_timestamp()
+    db.execute(
+        update(models.Consultation)
+        .where(models.Consultation.id == consultation_id)
+        .values(summary=new_summary, embedding_vector=new_embedding_vector)
+    )
+    vector_cache.mark_dirty(db, consultation_id=consultation_id)
+    if commit:
         db.commit()
-        db.refresh(consultation)
 
 
 def get_last_condition_check_time(db: Session, consultation_id: str):
-    consultation = db.query(models.Consultation).filter(models.Consultation.id == consultation_id).first()
-    if consultation:
-        return consultation.last_condition_check_at
-    return None
-
-def update_last_condition_check_time(db: Session, consultation_id: str):
-    consultation = db.query(models.Consultation).filter(models.Consultation.id == consultation_id).first()
-    if consultation:
-        consultation.last_condition_check_at = func.now()
+    return db.scalar(
+        select(models.Consultation.last_condition_check_at).where(models.Consultation.id == consultation_id)
+    )
+
+def update_last_condition_check_time(db: Session, consultation_id: str, commit: bool = True):
+    db.execute(
+        update(models.Consultation)
+        .where(models.Consultation.id == consultation_id)
+        .values(last_condition_check_at=func.now())
+    )
+    if commit:
         db.commit()
-        db.refresh(consultation)
 
 
 # -------------------- TIMELINE FUNCTIONS --------------------
+# consultation_timeline is range-partitioned by created_at (db/partitions.py). A filter on
+# consultation_id alone has to probe every monthly partition; adding the consultation's
+# start as a lower bound on created_at lets Postgres prune the months before it.
+
+def timeline_partition_bound(consultation_id: str):
+    """created_at >= the consultation's start (a turn is never older than its consultation)."""
+    started_at = (select(models.Consultation.created_at)
+                  .where(models.Consultation.id == consultation_id)
+                  .scalar_subquery())
+    return models.ConsultationTimeline.created_at >= func.coalesce(started_at, datetime.min)
+
 
-def add_timeline_entry(db: Session, consultation_id: str, user_query: str, model_response: str, insights: str = None, embedding_vector=None):
+def add_timeline_entry(
+    db: Session,
+    consultation_id: str,
+    user_query: str,
+    model_response: str,
+    insights: str = None,
+    embedding_vector=None,
+    commit: bool = True
+):
     # 🛠 MODIFIED: Changed argument name 'embedding' to 'embedding_vector'
     # Convert NumPy array to list for pgvector compatibility
     if embedding_vector is not None:
@@ -226,24 +333,80 @@ def add_timeline_entry(db: Session, consultation_id: str, user_query: str, model
         embedding_vector=embedding_vector # Ensure this matches model column
     )
     db.add(entry)
-    db.commit()
-    db.refresh(entry)
+    if commit:
+        db.commit()
     return entry
 
 def get_recent_timeline_entries(db: Session, consultation_id: str, limit: int = 5):
     entries = (db.query(models.ConsultationTimeline)
-              .filter(models.ConsultationTimeline.consultation_id == consultation_id)
-              .order_by(models.ConsultationTimeline.created_at.desc())  # get latest first
-              .limit(limit)
-              .all())
+               .filter(models.ConsultationTimeline.consultation_id == consultation_id,
+                       timeline_partition_bound(consultation_id))
+               .order_by(models.ConsultationTimeline.created_at.desc())  # get latest first
+               .limit(limit)
+               .all())
     return entries[::-1]  # reverse to restore chronological order (oldest to newest)
 
 def get_all_timeline_entries(db: Session, consultation_id: str):
     return (db.query(models.ConsultationTimeline)
-              .filter(models.ConsultationTimeline.consultation_id == consultation_id)
+              .filter(models.ConsultationTimeline.consultation_id == consultation_id,
+                      timeline_partition_bound(consultation_id))
               .order_by(models.ConsultationTimeline.created_at.asc())   # from oldest to latest
               .all())
 
+# Columns the history endpoints return (no vectors, no ORM identity-map overhead per row)
+TIMELINE_HISTORY_COLUMNS = (
+    models.ConsultationTimeline.id,
+    models.ConsultationTimeline.user_query,
+    models.ConsultationTimeline.model_response,
+    models.ConsultationTimeline.insights,
+    models.ConsultationTimeline.created_at,
+)
+
+def get_timeline_page(db: Session, consultation_id: str, limit: int = 50, cursor: str = None):
+    """
+    Keyset page of a consultation's timeline in chronological (created_at, id) order.
+
+    Returns (rows, next_cursor); rows are (id, user_query, model_response, insights,
+    created_at) tuples and next_cursor is None on the last page. Raises ValueError
+    for a malformed cursor.
+    """
+    query = select(*TIMELINE_HISTORY_COLUMNS).where(
+        models.ConsultationTimeline.consultation_id == consultation_id,
+        timeline_partition_bound(consultation_id),
+    )
+    if cursor:
+        created_at, entry_id = decode_keyset_cursor(cursor)
+        query = query.where(
+            tuple_(models.ConsultationTimeline.created_at, models.ConsultationTimeline.id) > tuple_(created_at, entry_id)
+        )
+    rows = db.execute(
+        query.order_by(models.ConsultationTimeline.created_at.asc(), models.ConsultationTimeline.id.asc())
+             .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_keyset_cursor(rows[-1].created_at, rows[-1].id) if has_more and rows else None
+    return rows, next_cursor
+
+def iter_timeline_entries(db: Session, consultation_id: str, batch_size: int = 200):
+    """
+    Yields a consultation's timeline rows (as get_timeline_page) in chronological order
+    from a server-side cursor, `batch_size` rows per fetch, so the whole history is
+    never held in memory. The session must stay open until the generator is exhausted.
+    """
+    result = db.execute(
+        select(*TIMELINE_HISTORY_COLUMNS)
+        .where(models.ConsultationTimeline.consultation_id == consultation_id,
+               timeline_partition_bound(consultation_id))
+        .order_by(models.ConsultationTimeline.created_at.asc(), models.ConsultationTimeline.id.asc())
+        .execution_options(yield_per=batch_size)
+    )
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
 def get_timeline_entries_since(db: Session, consultation_id: str, since: DateTime):
     """Retrieves timeline entries for a consultation created after a specific timestamp."""
     return (db.query(models.ConsultationTimeline)
@@ -268,12 +431,29 @@ def add_user_condition(
     notes: str = "",
     embedding_vector=None,
     consultation_id: str = None,
+    commit: bool = True,
+    idempotency_key: str = None,
+    focus_embedding_vector=None,
 ):
-    """Creates a new record for a user's permanent/chronic health condition."""
+    """
+    Creates a new record for a user's permanent/chronic health condition.
+    Pass commit=False to stage the insert in the caller's transaction.
+    If an idempotency_key is given and a row with that key already exists, the
+    existing row is returned and nothing is inserted.
+    """
+    if idempotency_key:
+        existing = (db.query(models.UserCondition)
+                    .filter(models.UserCondition.idempotency_key == idempotency_key)
+                    .first())
+        if existing:
+            return existing
+
     # Convert NumPy array to list for pgvector compatibility
     if embedding_vector is not None:
         if isinstance(embedding_vector, np.ndarray):
             embedding_vector = embedding_vector.tolist()
+    if isinstance(focus_embedding_vector, np.ndarray):
+        focus_embedding_vector = focus_embedding_vector.tolist()
     
     condition = models.UserCondition(
         user_id=user_id,
@@ -285,12 +465,86 @@ def add_user_condition(
         notes=notes,
         embedding_vector=embedding_vector,
         consultation_id=consultation_id,
+        idempotency_key=idempotency_key,
+        focus_embedding_vector=focus_embedding_vector,
     )
     db.add(condition)
-    db.commit()
-    db.refresh(condition)
+    if commit:
+        db.commit()
     return condition
 
+def get_active_chronic_conditions(db: Session, user_id: str):
+    """Active conditions of type 'condition' (chronic/acute diagnoses, not transient symptoms)."""
+    return (db.query(models.UserCondition)
+            .filter(
+                models.UserCondition.user_id == user_id,
+                models.UserCondition.is_active == True,
+                models.UserCondition.condition_type == "condition"
+            )
+            .order_by(models.UserCondition.updated_at.desc())
+            .all())
+
+def get_similar_conditions(db: Session, user_id: str, query_embeddings: List[List[float]], k: int = 10):
+    """
+    Top-k user conditions closest to ANY of the query vectors (min cosine distance
+    over the set), so one unrelated entry cannot drown out another's match.
+
+    Returns a list of (UserCondition, distance) tuples, closest first.
+    """
+    if not query_embeddings:
+        return []
+    vec_literals = ['[' + ','.join(str(float(x)) for x in np.asarray(vec, dtype=np.float32).ravel()) + ']'
+                    for vec in query_embeddings]
+    rows = db.execute(
+        text(f"""
+            SELECT c.id, MIN(c.embedding_vector <=> q.vec) AS distance
+            FROM user_conditions c
+            CROSS JOIN unnest(CAST(:query_vecs AS {VECTOR_SQL_TYPE}[])) AS q(vec)
+            WHERE c.user_id = :user_id
+                AND c.embedding_vector IS NOT NULL
+            GROUP BY c.id
+            ORDER BY distance ASC
+            LIMIT :k
+        """).bindparams(bindparam("user_id", type_=UUIDString)),
+        {"query_vecs": vec_literals, "user_id": user_id, "k": k}
+    ).all()
+    if not rows:
+        return []
+    by_id = {c.id: c for c in db.query(models.UserCondition).filter(models.UserCondition.id.in_([r.id for r in rows]))}
+    return [(by_id[r.id], float(r.distance)) for r in rows if r.id in by_id]
+
+def get_timeline_embeddings(db: Session, entry_ids: List[str]) -> List[List[float]]:
+    """Embedding vectors already stored for the given timeline entries (entries without one are skipped)."""
+    rows = (db.query(models.ConsultationTimeline.embedding_vector)
+            .filter(
+                models.ConsultationTimeline.id.in_(entry_ids),
+                models.ConsultationTimeline.embedding_vector.isnot(None)
+            )
+            .all())
+    return [list(row[0]) for row in rows]
+
+def condition_idempotency_key(consultation_id: str, condition_name: str, condition_type: str) -> str:
+    """Stable key for a condition detected in a consultation: same consultation + name + type => same key."""
+    material = f"{consultation_id}:{(condition_type or '').strip().lower()}:{(condition_name or '').strip().lower()}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def get_user_conditions(db: Session, user_id: str, with_focus_vectors: bool = False):
+    """All of a user's conditions. Vector columns are deferred; `with_focus_vectors` loads the synonym vectors in the same query."""
+    query = db.query(models.UserCondition).filter(models.UserCondition.user_id == user_id)
+    if with_focus_vectors:
+        query = query.options(undefer(models.UserCondition.focus_embedding_vector))
+    return query.all()
+
+def set_condition_focus_embeddings(db: Session, vectors_by_id: dict) -> None:
+    """Backfills focus_embedding_vector for existing conditions ({condition_id: vector})."""
+    for condition_id, vector in vectors_by_id.items():
+        if isinstance(vector, np.ndarray):
+            vector = vector.tolist()
+        (db.query(models.UserCondition)
+           .filter(models.UserCondition.id == condition_id)
+           .update({models.UserCondition.focus_embedding_vector: vector}, synchronize_session=False))
+    db.commit()
+
 def get_condition_by_id(db: Session, condition_id: str):
     """Retrieves a user condition by its ID."""
     return db.query(models.UserCondition).filter(models.UserCondition.id == condition_id).first()
@@ -300,16 +554,26 @@ def update_user_condition(
     db: Session,
     condition_id: str,
     new_status: bool,
-    notes: str = None
+    notes: str = None,
+    commit: bool = True
 ):
-    """Updates a user's condition record."""
-    condition = db.query(models.UserCondition).filter(models.UserCondition.id == condition_id).first()
-    if condition:
-        condition.is_active = new_status
-        if notes is not None:
-            condition.notes = notes
+    """
+    Updates a user's condition record with one UPDATE ... RETURNING (None if it does not exist).
+    Pass commit=False to stage it in the caller's transaction.
+    """
+    changes = {"is_active": new_status}
+    if notes is not None:
+        changes["notes"] = notes
+    condition = db.scalars(
+        update(models.UserCondition)
+        .where(models.UserCondition.id == condition_id)
+        .values(**changes)
+        .returning(models.UserCondition)
+    ).first()
+    if condition is not None:
+        vector_cache.mark_dirty(db, user_id=condition.user_id)
+    if commit:
         db.commit()
-        db.refresh(condition)
     return condition
 
 # NOTE:
@@ -332,21 +596,24 @@ def add_vitals_entry(
     metric_value: float,
     timestamp: DateTime = None,
     consultation_id: str = None,
+    commit: bool = True,
 ):
-    """Adds a single measurement point (e.g., heart rate at a specific time) for a user."""
-    if timestamp is None:
-        timestamp = func.now()
-        
+    """
+    Adds a single measurement point (e.g., heart rate at a specific time) for a user.
+    A missing timestamp falls back to the column default (now), returned by the INSERT.
+    Pass commit=False to stage it in the caller's transaction.
+    """
     vitals_entry = models.VitalsTimeSeries(
         user_id=user_id,
         metric_name=metric_name,
         metric_value=metric_value,
-        timestamp=timestamp,
         consultation_id=consultation_id,
     )
+    if timestamp is not None:
+        vitals_entry.timestamp = timestamp
     db.add(vitals_entry)
-    db.commit()
-    db.refresh(vitals_entry)
+    if commit:
+        db.commit()
     return vitals_entry
 
 
@@ -379,9 +646,9 @@ def get_latest_vitals(db: Session, user_id: str):
         models.VitalsTimeSeries.metric_name,
         func.max(models.VitalsTimeSeries.timestamp).label("max_timestamp")
     )
-    .filter(models.VitalsTimeSeries.user_id == user_id)
-    .group_by(models.VitalsTimeSeries.metric_name)
-    .subquery())
+        .filter(models.VitalsTimeSeries.user_id == user_id)
+        .group_by(models.VitalsTimeSeries.metric_name)
+        .subquery())
 
     return (db.query(models.VitalsTimeSeries)
             .join(subquery, 
@@ -393,6 +660,382 @@ def get_latest_vitals(db: Session, user_id: str):
             .all())
 
 
+# -------------------- LLM RESPONSE CACHE FUNCTIONS --------------------
+
+def get_llm_cache_entry(db: Session, cache_key: str) -> Optional[str]:
+    """Returns the cached LLM response for a key, or None if missing or expired."""
+    entry = (db.query(models.LLMCacheEntry)
+             .filter(
+                 models.LLMCacheEntry.cache_key == cache_key,
+                 models.LLMCacheEntry.expires_at > func.now()
+             )
+             .first())
+    return entry.response if entry else None
+
+def upsert_llm_cache_entry(db: Session, cache_key: str, model_name: str, response: str, ttl_seconds: int):
+    """Stores (or refreshes) a cached LLM response with a TTL measured from now."""
+    expires_at = func.now() + timedelta(seconds=ttl_seconds)
+    stmt = pg_insert(models.LLMCacheEntry).values(
+        cache_key=cache_key,
+        model_name=model_name,
+        response=response,
+        created_at=func.now(),
+        expires_at=expires_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.LLMCacheEntry.cache_key],
+        set_={"response": stmt.excluded.response, "created_at": func.now(), "expires_at": expires_at},
+    )
+    db.execute(stmt)
+    db.commit()
+
+def purge_expired_llm_cache_entries(db: Session) -> int:
+    """Deletes expired cache rows. Returns the number of rows removed."""
+    deleted = (db.query(models.LLMCacheEntry)
+               .filter(models.LLMCacheEntry.expires_at <= func.now())
+               .delete(synchronize_session=False))
+    db.commit()
+    return deleted
+
+
+# -------------------- PIPELINE CHECKPOINT FUNCTIONS --------------------
+
+def pipeline_run_key(entry_ids: List[str]) -> str:
+    """Identifies a pipeline run by the (order-independent) set of timeline entries it processes."""
+    return hashlib.sha256(",".join(sorted(entry_ids)).encode("utf-8")).hexdigest()
+
+def save_pipeline_checkpoint(db: Session, consultation_id: str, run_key: str, stage: str, value) -> None:
+    """Persists (or overwrites) the JSON-encoded output of one pipeline stage."""
+    stmt = pg_insert(models.PipelineCheckpoint).values(
+        id=models.new_id(),
+        consultation_id=consultation_id,
+        run_key=run_key,
+        stage=stage,
+        payload=json.dumps(value),
+        created_at=func.now(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_pipeline_checkpoint_stage",
+        set_={"payload": stmt.excluded.payload, "created_at": func.now()},
+    )
+    db.execute(stmt)
+    db.commit()
+
+def get_pipeline_checkpoints(db: Session, consultation_id: str, run_key: str) -> dict:
+    """Returns {stage: decoded value} for every checkpoint of a run."""
+    rows = (db.query(models.PipelineCheckpoint)
+            .filter(
+                models.PipelineCheckpoint.consultation_id == consultation_id,
+                models.PipelineCheckpoint.run_key == run_key
+            )
+            .all())
+    return {row.stage: json.loads(row.payload) for row in rows}
+
+def get_incomplete_pipeline_run(db: Session, consultation_id: str):
+    """
+    Returns (run_key, entry_ids, age_seconds) of the most recent run that recorded its
+    entry manifest but never finished, or None. Runs are cleared on completion, so any
+    manifest still present belongs to an interrupted run. The age is measured on the
+    database clock, which stamped the manifest.
+    """
+    row = (db.query(models.PipelineCheckpoint,
+                    func.extract("epoch", func.now() - models.PipelineCheckpoint.created_at))
+           .filter(
+               models.PipelineCheckpoint.consultation_id == consultation_id,
+               models.PipelineCheckpoint.stage == "__manifest__"
+           )
+           .order_by(models.PipelineCheckpoint.created_at.desc())
+           .first())
+    if not row:
+        return None
+    manifest, age_seconds = row
+    return manifest.run_key, json.loads(manifest.payload), float(age_seconds or 0)
+
+def record_pipeline_resume_attempt(db: Session, consultation_id: str, run_key: str) -> int:
+    """Counts one more attempt to resume a run (an "__attempts__" checkpoint); returns the new count."""
+    checkpoint = models.PipelineCheckpoint.__table__
+    stmt = pg_insert(checkpoint).values(
+        id=models.new_id(),
+        consultation_id=consultation_id,
+        run_key=run_key,
+        stage="__attempts__",
+        payload="1",
+        created_at=func.now(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_pipeline_checkpoint_stage",
+        set_={"payload": cast(cast(checkpoint.c.payload, Integer) + 1, Text)},
+    ).returning(checkpoint.c.payload)
+    attempts = int(db.execute(stmt).scalar())
+    db.commit()
+    return attempts
+
+def clear_pipeline_checkpoints(db: Session, consultation_id: str, run_key: str) -> None:
+    (db.query(models.PipelineCheckpoint)
+     .filter(models.PipelineCheckpoint.consultation_id == consultation_id,
+             models.PipelineCheckpoint.run_key == run_key)
+     .delete(synchronize_session=False))
+    db.commit()
+
+def get_timeline_entries_by_ids(db: Session, entry_ids: List[str]):
+    return (db.query(models.ConsultationTimeline)
+            .filter(models.ConsultationTimeline.id.in_(entry_ids))
+            .order_by(models.ConsultationTimeline.created_at.asc())
+            .all())
+
+
+# -------------------- RESOURCE VERSIONS (HTTP ETAGS) --------------------
+# One aggregate query each: enough to tell whether a read endpoint's payload could
+# have changed, without running the endpoint's real queries.
+
+def get_consultations_version(db: Session, user_id: str):
+    """(count, latest updated_at) of a user's consultations."""
+    return tuple(db.execute(
+        select(func.count(models.Consultation.id), func.max(models.Consultation.updated_at))
+        .where(models.Consultation.user_id == user_id)
+    ).one())
+
+def get_consultation_history_version(db: Session, consultation_id: str):
+    """
+    (consultation updated_at, turn count, latest turn updated_at), or None if the
+    consultation does not exist. The turns' updated_at moves when the pipeline fills in
+    insights on existing turns, which may commit before the summary.
+    """
+    timeline = models.ConsultationTimeline
+    turns = (timeline.consultation_id == consultation_id, timeline_partition_bound(consultation_id))
+    row = db.execute(
+        select(
+            models.Consultation.updated_at,
+            select(func.count(timeline.id)).where(*turns).scalar_subquery(),
+            select(func.max(timeline.updated_at)).where(*turns).scalar_subquery(),
+        ).where(models.Consultation.id == consultation_id)
+    ).first()
+    return tuple(row) if row else None
+
+def get_user_profile_version(db: Session, user_id: str):
+    """(user updated_at, condition count + latest updated_at, vitals count + latest timestamp), or None."""
+    conditions, vitals = models.UserCondition, models.VitalsTimeSeries
+    row = db.execute(
+        select(
+            models.User.updated_at,
+            select(func.count(conditions.id)).where(conditions.user_id == user_id).scalar_subquery(),
+            select(func.max(conditions.updated_at)).where(conditions.user_id == user_id).scalar_subquery(),
+            select(func.count(vitals.id)).where(vitals.user_id == user_id).scalar_subquery(),
+            select(func.max(vitals.timestamp)).where(vitals.user_id == user_id).scalar_subquery(),
+        ).where(models.User.id == user_id, models.User.is_active.isnot(False))
+    ).first()
+    return tuple(row) if row else None
+
+
+# -------------------- DELTA SYNC --------------------
+# Clients poll with the watermark of their previous sync and receive only the rows
+# whose updated_at moved past it. updated_at is stamped with clock_timestamp() when
+# the row is written, but only becomes visible at commit, so a transaction still in
+# flight can commit rows stamped earlier than a watermark issued meanwhile. The
+# watermark is therefore the DB clock or the start of the oldest open transaction,
+# whichever is earlier, minus a small skew margin. Rows past it are sent again on
+# the next poll; clients upsert by id, so repeats are harmless.
+
+SYNC_WATERMARK_SKEW_SECONDS = float(os.environ.get("SYNC_WATERMARK_SKEW_SECONDS", 5))
+SYNC_MAX_ROWS = int(os.environ.get("SYNC_MAX_ROWS", 1000))
+# Longest an open transaction can hold the watermark back (see _SYNC_WATERMARK_SQL)
+SYNC_WATERMARK_MAX_LAG_SECONDS = float(os.environ.get("SYNC_WATERMARK_MAX_LAG_SECONDS", 60))
+
+def encode_sync_watermark(timestamp: datetime) -> str:
+    return base64.urlsafe_b64encode(timestamp.isoformat().encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_sync_watermark(token: str) -> datetime:
+    """Raises ValueError for a malformed token."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return datetime.fromisoformat(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid sync token: {token!r}") from e
+
+# Earliest of the clock and the start of the app's other open transactions (its own role's client
+# sessions: not autovacuum or other roles), but never more than :max_lag seconds back. Without the
+# cap one long transaction (an idle-in-transaction session, a slow report) would pin every user's
+# watermark and each poll would resend everything since. The trade-off: rows committed by a
+# transaction open longer than the cap carry stamps older than the watermark and are only seen
+# by a full sync (or when they are modified again).
+_SYNC_WATERMARK_SQL = text("""
+    SELECT LEAST(
+        clock_timestamp(),
+        GREATEST(
+            COALESCE((SELECT min(xact_start) FROM pg_stat_activity
+                       WHERE datname = current_database() AND usename = current_user AND pid <> pg_backend_pid()
+                         AND backend_type = 'client backend' AND state <> 'idle' AND xact_start IS NOT NULL),
+                     clock_timestamp()),
+            clock_timestamp() - make_interval(secs => :max_lag)
+        )
+    )::timestamp
+""")
+
+def get_changes_since(db: Session, user_id: str, since: Optional[datetime] = None, limit: int = SYNC_MAX_ROWS) -> dict:
+    """
+    Consultations, timeline turns and conditions of a user modified after `since`
+    (everything when None), oldest change first, at most `limit` rows of each kind.
+
+    Returns {"consultations", "timeline", "conditions": [rows], "watermark": datetime,
+    "has_more": bool}. When a kind is truncated, the watermark is held back to its
+    last returned row so the next poll continues from there.
+    """
+    # Read before the queries; naive local time, like the columns
+    watermark = (db.scalar(_SYNC_WATERMARK_SQL, {"max_lag": SYNC_WATERMARK_MAX_LAG_SECONDS})
+                 - timedelta(seconds=SYNC_WATERMARK_SKEW_SECONDS))
+
+    consultation, timeline, condition = models.Consultation, models.ConsultationTimeline, models.UserCondition
+    queries = {
+        "consultations": (
+            select(consultation.id, consultation.heading, consultation.summary, consultation.is_active,
+                   consultation.created_at, consultation.updated_at)
+            .where(consultation.user_id == user_id),
+            consultation.updated_at,
+        ),
+        "timeline": (
+            select(timeline.id, timeline.consultation_id, timeline.user_query, timeline.model_response,
+                   timeline.insights, timeline.created_at, timeline.updated_at)
+            .join(consultation, consultation.id == timeline.consultation_id)
+            .where(consultation.user_id == user_id),
+            timeline.updated_at,
+        ),
+        "conditions": (
+            select(condition.id, condition.condition_name, condition.condition_type, condition.is_active,
+                   condition.consultation_id, condition.notes, condition.updated_at)
+            .where(condition.user_id == user_id),
+            condition.updated_at,
+        ),
+    }
+
+    changes = {"has_more": False}
+    for kind, (query, updated_at) in queries.items():
+        if since is not None:
+            query = query.where(updated_at > since)
+        rows = db.execute(query.order_by(updated_at.asc()).limit(limit + 1)).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1].updated_at
+            if rows[0].updated_at == last:
+                # One transaction stamped more than a page with the same now(): send all of it,
+                # otherwise the watermark could never move past it
+                rows = db.execute(query.where(updated_at == last)).all()
+                resume_at = last
+            else:
+                # Just below the last timestamp, so rows sharing it that did not fit come next time
+                resume_at = last - timedelta(microseconds=1)
+            changes["has_more"] = True
+            watermark = min(watermark, resume_at)
+        changes[kind] = rows
+    # Never move a client's watermark backwards
+    changes["watermark"] = max(watermark, since) if since is not None else watermark
+    return changes
+
+
+# -------------------- CONSULTATION CONTEXT LOADER --------------------
+
+class ConsultationHeader:
+    __slots__ = ("id", "heading", "created_at")
+
+    def __init__(self, id, heading, created_at):
+        self.id = id
+        self.heading = heading
+        self.created_at = created_at
+
+
+class UserProfile:
+    __slots__ = ("age", "gender", "blood_type", "height_cm", "weight_kg")
+
+    def __init__(self, age=None, gender=None, blood_type=None, height_cm=None, weight_kg=None):
+        self.age = age
+        self.gender = gender
+        self.blood_type = blood_type
+        self.height_cm = height_cm
+        self.weight_kg = weight_kg
+
+
+class TimelineTurn:
+    __slots__ = ("id", "user_query", "model_response")
+
+    def __init__(self, id, user_query, model_response):
+        self.id = id
+        self.user_query = user_query
+        self.model_response = model_response
+
+
+class ConsultationContext:
+    """Everything generate_consultation_response needs before its first LLM call."""
+    __slots__ = ("consultation", "user", "active_conditions", "timeline")
+
+    def __init__(self, consultation: Optional[ConsultationHeader], user: Optional[UserProfile],
+                 active_conditions: List[str], timeline: List[TimelineTurn]):
+        self.consultation = consultation
+        self.user = user
+        self.active_conditions = active_conditions
+        self.timeline = timeline
+
+
+_CONSULTATION_CONTEXT_SQL = text("""
+    WITH consultation AS (
+        SELECT id, heading, created_at
+        FROM consultations
+        WHERE id = :consultation_id
+    ),
+    profile AS (
+        -- Numerics as text so they render exactly as the ORM's Decimal did
+        SELECT age, gender, blood_type, height_cm::text AS height_cm, weight_kg::text AS weight_kg
+        FROM users
+        WHERE id = :user_id AND is_active IS NOT FALSE
+    ),
+    recent_turns AS (
+        -- Lower bound on the partition key: only partitions since the consultation began are scanned
+        SELECT id, user_query, model_response, created_at
+        FROM consultation_timeline
+        WHERE consultation_id = :consultation_id
+          AND created_at >= COALESCE((SELECT created_at FROM consultation), '-infinity')
+        ORDER BY created_at DESC
+        LIMIT :timeline_limit
+    )
+    SELECT
+        -- Header as typed columns (not JSON) so created_at arrives as a datetime from the driver
+        (SELECT id FROM consultation) AS consultation_id,
+        (SELECT heading FROM consultation) AS consultation_heading,
+        (SELECT created_at FROM consultation) AS consultation_created_at,
+        (SELECT row_to_json(profile) FROM profile) AS profile,
+        (SELECT COALESCE(json_agg(condition_name), '[]'::json)
+           FROM user_conditions
+          WHERE user_id = :user_id AND is_active = TRUE) AS active_conditions,
+        (SELECT COALESCE(json_agg(json_build_object(
+                    'id', id, 'user_query', user_query, 'model_response', model_response
+                ) ORDER BY created_at ASC), '[]'::json)
+           FROM recent_turns) AS timeline
+""").bindparams(
+    bindparam("consultation_id", type_=UUIDString), bindparam("user_id", type_=UUIDString)
+).columns(consultation_id=UUIDString, consultation_created_at=DateTime)
+
+
+def load_consultation_context(db: Session, user_id: str, consultation_id: str, timeline_limit: int = 20) -> ConsultationContext:
+    """
+    Loads the consultation header, the user's profile, their active condition names
+    and the last `timeline_limit` timeline turns (oldest first) in one round-trip.
+    """
+    row = db.execute(_CONSULTATION_CONTEXT_SQL, {
+        "consultation_id": consultation_id,
+        "user_id": user_id,
+        "timeline_limit": timeline_limit,
+    }).one()
+
+    consultation = None
+    if row.consultation_id is not None:
+        consultation = ConsultationHeader(row.consultation_id, row.consultation_heading, row.consultation_created_at)
+
+    return ConsultationContext(
+        consultation=consultation,
+        user=UserProfile(**row.profile) if row.profile else None,
+        active_conditions=list(row.active_conditions or []),
+        timeline=[TimelineTurn(t["id"], t["user_query"], t["model_response"]) for t in (row.timeline or [])],
+    )
+
+
 # -------------------- VECTOR SEARCH FUNCTION --------------------
 
 # Assuming models are imported correctly (e.g., models.UserCondition, models.Consultation)
@@ -403,6 +1046,47 @@ def get_latest_vitals(db: Session, user_id: str):
 # We set the Distance Threshold (1 - Similarity) to 0.50.
 # We set the maximum number of final results (Top-N) to 4.
 
+# SEMANTIC_SEARCH_MODE (models.py):
+# "exact": cosine distance over the user's own rows. They are fenced off in a subquery (OFFSET 0)
+# so the planner cannot serve the ORDER BY from the table-wide HNSW index and filter afterwards:
+# the index's ef_search nearest rows seldom belong to this user, and recall would collapse.
+# "binary": two stages. Candidates come from a Hamming-distance HNSW scan of binary_quantize(embedding)
+# (vector_storage.BINARY_QUANTIZED_INDEXES), oversampled by SEMANTIC_SEARCH_OVERSAMPLE x the per-source
+# k, and only those are re-ranked by exact cosine distance. The scan runs with hnsw.iterative_scan
+# (pgvector >= 0.8) so it keeps going until enough of the user's rows are found; on older servers
+# binary mode falls back to exact. Trade-offs: benchmarks/bench_binary_search.py
+SEMANTIC_SEARCH_OVERSAMPLE = float(os.environ.get("SEMANTIC_SEARCH_OVERSAMPLE", 4))
+_binary_fallback_warned = False
+
+def _user_rows(source_sql: str) -> str:
+    """The exact mode's row source: the user's rows, materialised before any distance ordering."""
+    # OFFSET 0 stops the planner flattening the subquery into the outer ORDER BY ... LIMIT
+    return f"""(
+            {source_sql}
+            OFFSET 0
+        )"""
+
+def _binary_search_available(db: Session) -> bool:
+    """Binary mode needs a filtered HNSW scan that does not stop at ef_search rows (pgvector >= 0.8)."""
+    global _binary_fallback_warned
+    if vector_storage.pgvector_version(db) >= vector_storage.ITERATIVE_SCAN_MIN_VERSION:
+        return True
+    if not _binary_fallback_warned:
+        _binary_fallback_warned = True
+        print("[SEARCH] SEMANTIC_SEARCH_MODE=binary needs pgvector >= 0.8 (hnsw.iterative_scan) to filter by user; "
+              "using exact search.")
+    return False
+
+def _binary_candidates(source_sql: str, embedding_column: str, k_param: str) -> str:
+    """Stage one of the binary mode: the source rows nearest the query by Hamming distance."""
+    # Same expression as the index, or the planner cannot use it
+    return f"""(
+            {source_sql}
+            ORDER BY binary_quantize({embedding_column})::bit({VECTOR_DIMENSION})
+                     <~> binary_quantize(CAST(:query_vec AS {VECTOR_SQL_TYPE}))
+            LIMIT CEIL(:{k_param} * :oversample)::int
+        )"""
+
 def semantic_search_records(
     db: Session, 
     user_id: str, 
@@ -411,13 +1095,16 @@ def semantic_search_records(
     k_consultations: int = int(os.environ.get("SEMANTIC_SEARCH_K_CONSULTATIONS", 20)),
     k_conditions: int = int(os.environ.get("SEMANTIC_SEARCH_K_CONDITIONS", 20)),
     SIMILARITY_THRESHOLD_VALUE: float = SIMILARITY_THRESHOLD,
-    MAX_FINAL_CONTEXT_CHUNKS: int = MAX_FINAL_CONTEXT_CHUNKS
+    MAX_FINAL_CONTEXT_CHUNKS: int = MAX_FINAL_CONTEXT_CHUNKS,
+    mode: str = None,
+    oversample: float = None
 ):
     """ 
     Performs semantic search across UserCondition notes and Consultation summaries 
     with a hybrid distance/similarity threshold and a final Top-N limit.
     
     Uses raw SQL to bypass SQLAlchemy's type processors which cause ndim errors.
+    `mode` / `oversample` override SEMANTIC_SEARCH_MODE / SEMANTIC_SEARCH_OVERSAMPLE.
     """
     
     # 1. CALCULATE THE DISTANCE THRESHOLD
@@ -433,6 +1120,15 @@ def semantic_search_records(
     if query_embedding.ndim != 1:
         query_embedding = query_embedding.flatten()
     
+    # Small histories are searched in process (db/vector_cache.py); None means use SQL
+    cached_results = vector_cache.search(
+        db, user_id, query_embedding, current_consultation_id,
+        k_conditions, k_consultations, DISTANCE_THRESHOLD, MAX_FINAL_CONTEXT_CHUNKS,
+    )
+    if cached_results is not None:
+        return cached_results
+    sql_started = time.perf_counter()
+
     # Convert to list of floats - PostgreSQL will handle the Vector conversion via CAST
     query_embedding_list = [float(x) for x in query_embedding.tolist()]
     
@@ -440,8 +1136,38 @@ def semantic_search_records(
     # We use PostgreSQL's native parameter binding with :param_name syntax
     current_consultation_filter = ""
     if current_consultation_id is not None:
-        current_consultation_filter = f"AND consultations.id != {current_consultation_id}"
-    
+        current_consultation_filter = "AND consultations.id != :current_consultation_id"
+    timeline_filter = current_consultation_filter.replace('consultations.id', 'timeline.consultation_id')
+
+    # Row sources: the user's rows (exact mode) or their Hamming-distance candidates (binary mode),
+    # aliased to the table names so the exact re-ranking below is the same query either way
+    conditions_rows = "SELECT * FROM user_conditions WHERE user_id = :user_id AND embedding_vector IS NOT NULL"
+    consultations_rows = (f"SELECT * FROM consultations WHERE user_id = :user_id AND embedding_vector IS NOT NULL "
+                          f"{current_consultation_filter}")
+    timeline_rows = f"""SELECT timeline.* FROM consultation_timeline timeline
+            JOIN consultations ON consultations.id = timeline.consultation_id
+            WHERE consultations.user_id = :user_id
+                {timeline_filter}
+                AND timeline.embedding_vector IS NOT NULL
+                AND timeline.insights IS NOT NULL
+                AND timeline.insights NOT IN ('No clinical insight extracted.', 'Pending End-of-Session Extraction')"""
+    oversample = SEMANTIC_SEARCH_OVERSAMPLE if oversample is None else oversample
+    if (mode or SEMANTIC_SEARCH_MODE) == "binary" and _binary_search_available(db):
+        # An HNSW scan returns at most hnsw.ef_search rows, so raise it (for this transaction)
+        # to the candidate count or the oversampling would be silently capped; iterative_scan
+        # keeps scanning past rows of other users. relaxed_order is enough: stage two re-sorts.
+        candidates = int(np.ceil(max(k_conditions, k_consultations) * oversample))
+        db.execute(text("SELECT set_config('hnsw.ef_search', :ef_search, true), "
+                        "set_config('hnsw.iterative_scan', 'relaxed_order', true)"),
+                   {"ef_search": str(min(max(candidates, 40), 1000))})
+        conditions_source = _binary_candidates(conditions_rows, "embedding_vector", "k_conditions") + " user_conditions"
+        consultations_source = _binary_candidates(consultations_rows, "embedding_vector", "k_consultations") + " consultations"
+        timeline_source = _binary_candidates(timeline_rows, "timeline.embedding_vector", "k_consultations") + " timeline"
+    else:
+        conditions_source = _user_rows(conditions_rows) + " user_conditions"
+        consultations_source = _user_rows(consultations_rows) + " consultations"
+        timeline_source = _user_rows(timeline_rows) + " timeline"
+
     sql_query = text(f"""
         WITH condition_results AS (
             SELECT 
@@ -449,12 +1175,12 @@ def semantic_search_records(
                 user_conditions.condition_name AS title,
                 user_conditions.diagnosis_date AS date,
                 'User Condition' AS type,
-                user_conditions.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION})) AS distance,
-                1.0 - (user_conditions.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION}))) AS similarity_score
-            FROM user_conditions
+                user_conditions.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE}) AS distance,
+                1.0 - (user_conditions.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE})) AS similarity_score
+            FROM {conditions_source}
             WHERE user_conditions.user_id = :user_id
-                AND (user_conditions.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION}))) <= :distance_threshold
-            ORDER BY user_conditions.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION}))
+                AND (user_conditions.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE})) <= :distance_threshold
+            ORDER BY user_conditions.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE})
             LIMIT :k_conditions
         ),
         consultation_results AS (
@@ -463,13 +1189,13 @@ def semantic_search_records(
                 consultations.heading AS title,
                 consultations.created_at AS date,
                 'Consultation Summary' AS type,
-                consultations.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION})) AS distance,
-                1.0 - (consultations.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION}))) AS similarity_score
-            FROM consultations
+                consultations.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE}) AS distance,
+                1.0 - (consultations.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE})) AS similarity_score
+            FROM {consultations_source}
             WHERE consultations.user_id = :user_id
                 {current_consultation_filter}
-                AND (consultations.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION}))) <= :distance_threshold
-            ORDER BY consultations.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION}))
+                AND (consultations.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE})) <= :distance_threshold
+            ORDER BY consultations.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE})
             LIMIT :k_consultations
         ),
         timeline_ranked AS (
@@ -478,20 +1204,20 @@ def semantic_search_records(
                 consultations.heading AS title,
                 timeline.created_at AS date,
                 'Clinical Insight' AS type,
-                timeline.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION})) AS distance,
-                1.0 - (timeline.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION}))) AS similarity_score,
+                timeline.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE}) AS distance,
+                1.0 - (timeline.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE})) AS similarity_score,
                 ROW_NUMBER() OVER (
                     PARTITION BY timeline.consultation_id
-                    ORDER BY timeline.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION})) ASC
+                    ORDER BY timeline.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE}) ASC
                 ) AS rn
-            FROM consultation_timeline timeline
+            FROM {timeline_source}
             JOIN consultations ON consultations.id = timeline.consultation_id
             WHERE consultations.user_id = :user_id
-                {current_consultation_filter.replace('consultations.id', 'timeline.consultation_id')}
+                {timeline_filter}
                 AND timeline.embedding_vector IS NOT NULL
                 AND timeline.insights IS NOT NULL
                 AND timeline.insights NOT IN ('No clinical insight extracted.', 'Pending End-of-Session Extraction')
-                AND (timeline.embedding_vector <=> CAST(:query_vec AS vector({VECTOR_DIMENSION}))) <= :distance_threshold
+                AND (timeline.embedding_vector <=> CAST(:query_vec AS {VECTOR_SQL_TYPE})) <= :distance_threshold
         ),
         timeline_results AS (
             SELECT text_snippet, title, date, type, distance, similarity_score
@@ -519,7 +1245,9 @@ def semantic_search_records(
         -- Dates are serialised per-record so the model can still reason chronologically.
         ORDER BY distance ASC
         LIMIT :max_results
-    """)
+    """).bindparams(bindparam("user_id", type_=UUIDString))
+    if current_consultation_id is not None:
+        sql_query = sql_query.bindparams(bindparam("current_consultation_id", type_=UUIDString))
     
     # 4. Execute with proper parameter binding
     # Pass the list - PostgreSQL's CAST will convert it to Vector type
@@ -531,15 +1259,18 @@ def semantic_search_records(
         {
             'query_vec': query_vec_str,
             'user_id': user_id,
+            'current_consultation_id': current_consultation_id,
             'distance_threshold': DISTANCE_THRESHOLD,
             'k_conditions': k_conditions,
             'k_consultations': k_consultations,
-            'max_results': MAX_FINAL_CONTEXT_CHUNKS
+            'max_results': MAX_FINAL_CONTEXT_CHUNKS,
+            'oversample': oversample
         }
     )
     
     # 5. Convert results to list of dictionaries
     final_results = result.all()
+    vector_cache.record_sql_search((time.perf_counter() - sql_started) * 1000)
     
     return [
         {
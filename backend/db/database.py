@@ -2,6 +2,7 @@
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
+import sys
 
 # Define base class for models
 Base = declarative_base()
@@ -18,8 +19,70 @@ docker exec -it postgres_ts_vector psql -U admin -d DocAI
 # Create the engine
 engine = create_engine(DB_URI)
 
-# Create a session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create a session factory.
+# expire_on_commit=False: committed objects keep their loaded state (routes read them after
+# db.close()), so writes don't need a follow-up refresh() SELECT.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+def _running_migrations() -> bool:
+    """
+    True under `flask db ...` (or with DB_SKIP_CREATE_ALL=true). create_app() runs init_db()
+    there too, and on a database behind the migrations create_all() can fail (e.g. a new
+    table's uuid foreign key against String(36) keys before 1c5f8a2e9d47).
+    """
+    if os.getenv("DB_SKIP_CREATE_ALL", "false").lower() == "true":
+        return True
+    return "flask" in sys.argv[0].replace("\\", "/").lower() and "db" in sys.argv[1:]
+
+# Startup maintenance (partitions, storage check, search indexes, cache purge) only warns on
+# failure so the app still starts; CI (which sets CI=true) makes it fatal to catch schema breaks.
+DB_INIT_STRICT = (os.getenv("DB_INIT_STRICT") or os.getenv("CI") or "false").lower() == "true"
+
+def _maintenance_failed(message: str, error: Exception):
+    print(f"[WARNING] Warning: {message}: {error}")
+    if DB_INIT_STRICT:
+        raise error
+
+def _run_startup_maintenance():
+    """Steps 3-6 of init_db, each of which only warns on failure (unless DB_INIT_STRICT)."""
+    # 3. consultation_timeline is range-partitioned: make sure upcoming months have a partition
+    try:
+        from .partitions import maintain_timeline_partitions
+        maintain_timeline_partitions(engine)
+    except Exception as e:
+        _maintenance_failed("Could not maintain consultation_timeline partitions", e)
+
+    # 4. Embedding columns must match VECTOR_STORAGE (queries cast their vectors to it)
+    try:
+        from .vector_storage import check_embedding_storage
+        with engine.connect() as connection:
+            mismatched = check_embedding_storage(connection)
+        if mismatched:
+            print(f"[WARNING] Embedding columns do not match VECTOR_STORAGE ({mismatched}); "
+                  f"run `python -m db.vector_storage` to convert them.")
+    except Exception as e:
+        _maintenance_failed("Could not check embedding column types", e)
+
+    # 5. SEMANTIC_SEARCH_MODE=binary searches binary-quantized indexes (pgvector >= 0.7)
+    try:
+        from .vector_storage import ensure_search_mode_indexes
+        with engine.begin() as connection:
+            ensure_search_mode_indexes(connection)
+    except Exception as e:
+        _maintenance_failed("Could not create the binary-quantized search indexes", e)
+
+    # 6. Drop expired llm_response_cache rows (ai/llm_cache.py also purges periodically)
+    try:
+        from .crud import purge_expired_llm_cache_entries
+        db = SessionLocal()
+        try:
+            deleted = purge_expired_llm_cache_entries(db)
+        finally:
+            db.close()
+        if deleted:
+            print(f"[OK] Purged {deleted} expired LLM cache entries.")
+    except Exception as e:
+        _maintenance_failed("Could not purge expired LLM cache entries", e)
 
 def init_db():
     """Initializes the database, enables pgvector, and creates all tables."""
@@ -36,9 +99,16 @@ def init_db():
             except Exception as e:
                 print(f"[WARNING] Warning: Could not enable pgvector extension: {e}")
 
+        # Alembic owns the schema during `flask db upgrade`; the app start that follows does the rest
+        if _running_migrations():
+            print("[OK] pgvector enabled; table creation left to the migrations.")
+            return
+
         # 2. Create all tables defined in models.py
         Base.metadata.create_all(bind=engine)
         print("[OK] Database initialized and tables created (pgvector enabled).")
+
+        _run_startup_maintenance()
     except Exception as e:
         print(f"[ERROR] Error: Could not connect to PostgreSQL. Please ensure the database is running on localhost:5432.")
         raise
@@ -0,0 +1,168 @@
+# db/events.py
+import os
+import json
+import time
+import queue
+import select
+import threading
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from .database import engine, DB_URI
+
+# Per-user event channel (pipeline progress pushed to the client over SSE).
+#
+# Subscribers are in-process queues keyed by user_id. publish() goes through
+# Postgres NOTIFY, so an event raised by the pipeline thread of one gunicorn
+# worker reaches SSE connections held by any worker: every process with
+# subscribers runs one LISTEN thread that fans notifications out to its local
+# queues. Without Postgres (or with EVENTS_PG_NOTIFY=false) events are delivered
+# in-process only.
+#
+# Events are hints, not a log: a client that was disconnected catches up with
+# /sync/<user_id>. Payloads carry ids only (NOTIFY payloads are capped at 8000 bytes).
+
+EVENTS_ENABLED = os.environ.get("EVENTS_ENABLED", "true").lower() == "true"
+EVENTS_PG_NOTIFY = (os.environ.get("EVENTS_PG_NOTIFY", "true").lower() == "true"
+                    and DB_URI.startswith("postgres"))
+EVENTS_CHANNEL = os.environ.get("EVENTS_CHANNEL", "docai_events")
+# Events buffered per connection; the oldest is dropped when a slow client falls behind
+EVENTS_QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", 100))
+# Open subscriptions per process. Under gthread every SSE connection holds a worker thread
+# for its whole lifetime, so this must stay below --threads (render.yaml) or streams starve
+# every other endpoint; past it, subscribe() refuses and /events answers 503.
+EVENTS_MAX_SUBSCRIPTIONS = int(os.environ.get("EVENTS_MAX_SUBSCRIPTIONS", 8))
+
+INSIGHTS_DONE = "insights_done"
+SUMMARY_UPDATED = "summary_updated"
+CONDITIONS_CHANGED = "conditions_changed"
+PIPELINE_COMPLETE = "pipeline_complete"
+
+_subscribers = {}
+_subscriber_count = 0
+_subscribers_lock = threading.Lock()
+_listener = None
+_listener_lock = threading.Lock()
+
+stats = {"published": 0, "delivered": 0, "dropped": 0, "notify_failures": 0, "rejected": 0}
+
+
+def subscribe(user_id: str) -> Optional["queue.Queue"]:
+    """
+    Registers a queue that receives the user's events (dicts). Pair with unsubscribe().
+    Returns None when the process already holds EVENTS_MAX_SUBSCRIPTIONS.
+    """
+    global _subscriber_count
+    subscription = queue.Queue(maxsize=EVENTS_QUEUE_SIZE)
+    with _subscribers_lock:
+        if _subscriber_count >= EVENTS_MAX_SUBSCRIPTIONS:
+            stats["rejected"] += 1
+            return None
+        _subscribers.setdefault(user_id, set()).add(subscription)
+        _subscriber_count += 1
+    if EVENTS_PG_NOTIFY:
+        _ensure_listener()
+    return subscription
+
+
+def unsubscribe(user_id: str, subscription: "queue.Queue") -> None:
+    global _subscriber_count
+    with _subscribers_lock:
+        queues = _subscribers.get(user_id)
+        if queues is not None and subscription in queues:
+            queues.discard(subscription)
+            _subscriber_count -= 1
+            if not queues:
+                del _subscribers[user_id]
+
+
+def _deliver(event: dict) -> None:
+    with _subscribers_lock:
+        queues = list(_subscribers.get(event.get("user_id"), ()))
+    for subscription in queues:
+        while True:
+            try:
+                subscription.put_nowait(event)
+                stats["delivered"] += 1
+                break
+            except queue.Full:
+                try:
+                    subscription.get_nowait()
+                    stats["dropped"] += 1
+                except queue.Empty:
+                    pass
+
+
+def publish(user_id: str, event_type: str, consultation_id: str = None, **data) -> None:
+    """Publishes an event to every SSE connection of the user, in any worker. Never raises."""
+    if not EVENTS_ENABLED or not user_id:
+        return
+    event = {
+        "type": event_type,
+        "user_id": user_id,
+        "consultation_id": consultation_id,
+        "at": datetime.utcnow().isoformat(),
+        **data,
+    }
+    stats["published"] += 1
+
+    if EVENTS_PG_NOTIFY:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                   {"channel": EVENTS_CHANNEL, "payload": json.dumps(event)})
+                connection.commit()
+            return
+        except Exception as e:
+            stats["notify_failures"] += 1
+            print(f"[EVENTS] NOTIFY failed, delivering in-process only: {e}")
+    _deliver(event)
+
+
+def _ensure_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen_forever, name="events-listener", daemon=True)
+            _listener.start()
+
+
+def _listen_forever():
+    """LISTEN loop on a dedicated connection; reconnects with backoff."""
+    # Its own unpooled engine: the connection is held for the life of the process and
+    # must not take a slot from the request pool
+    listener_engine = create_engine(DB_URI, poolclass=NullPool)
+    backoff = 1.0
+    while True:
+        connection = None
+        try:
+            connection = listener_engine.raw_connection()
+            # Notifications are only delivered outside of a transaction
+            connection.driver_connection.autocommit = True
+            cursor = connection.cursor()
+            cursor.execute(f'LISTEN "{EVENTS_CHANNEL}"')
+            print(f"[EVENTS] Listening on channel '{EVENTS_CHANNEL}'.")
+            backoff = 1.0
+            pg_connection = connection.driver_connection
+            while True:
+                if select.select([pg_connection], [], [], 30.0) == ([], [], []):
+                    continue
+                pg_connection.poll()
+                while pg_connection.notifies:
+                    notification = pg_connection.notifies.pop(0)
+                    try:
+                        _deliver(json.loads(notification.payload))
+                    except ValueError:
+                        print(f"[EVENTS] Ignoring malformed notification: {notification.payload[:100]}")
+        except Exception as e:
+            print(f"[EVENTS] Listener error, reconnecting in {backoff:.0f}s: {e}")
+        finally:
+            if connection is not None:
+                try:
+                    connection.invalidate()
+                except Exception:
+                    pass
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30.0)
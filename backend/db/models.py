@@ -1,17 +1,88 @@
 # db/models.py
 import os
+import time
 import uuid
-from sqlalchemy import Column, Integer, Numeric, String, ForeignKey, Text, DateTime, Date, Boolean, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, Numeric, String, ForeignKey, Text, DateTime, Date, Boolean, UniqueConstraint, Index, func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.types import TypeDecorator
 from db.database import Base
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import Vector, HALFVEC
 
 VECTOR_DIMENSION = int(os.environ.get("VECTOR_DIMENSION", 768))
 
+# Embedding storage: "vector" (float32) or "halfvec" (float16, pgvector >= 0.7). halfvec halves
+# each 768-D embedding (~3 KB -> ~1.5 KB) and its HNSW index. Switching an existing database
+# rewrites the columns: python -m db.vector_storage (see that module).
+VECTOR_STORAGE = os.environ.get("VECTOR_STORAGE", "vector").lower()
+if VECTOR_STORAGE not in ("vector", "halfvec"):
+    print(f"[WARNING] Unknown VECTOR_STORAGE '{VECTOR_STORAGE}', using 'vector'.")
+    VECTOR_STORAGE = "vector"
+EmbeddingVector = HALFVEC if VECTOR_STORAGE == "halfvec" else Vector
+# SQL type and HNSW operator class for raw queries / index DDL
+VECTOR_SQL_TYPE = f"{VECTOR_STORAGE}({VECTOR_DIMENSION})"
+VECTOR_COSINE_OPS = f"{VECTOR_STORAGE}_cosine_ops"
+
+# Semantic search: "exact" (cosine over the full vectors) or "binary" (Hamming-distance candidates
+# over binary_quantize(embedding), re-ranked by cosine; see crud.semantic_search_records). The
+# binary indexes need pgvector >= 0.7 and are only built in binary mode (db/vector_storage.py).
+SEMANTIC_SEARCH_MODE = os.environ.get("SEMANTIC_SEARCH_MODE", "exact").lower()
+
+
+# Embedding columns are deferred: listing/history/profile reads never use them, and each
+# one is ~3 KB on the wire plus a numpy parse per row. Similarity search runs in SQL;
+# ORM code that does need a vector asks for it with undefer() (see crud.get_user_conditions).
+
+# Sessions are created with expire_on_commit=False, so objects stay usable after commit
+# without a refresh SELECT. eager_defaults makes the flush fetch func.now() defaults
+# (created_at/updated_at/...) in the INSERT/UPDATE itself via RETURNING.
+EAGER_DEFAULTS = {"eager_defaults": True}
+
+# updated_at on the delta-synced tables (crud.get_changes_since) is the time of the writing
+# statement (clock_timestamp()), not now(), which is frozen at the start of its transaction
+
+# Time-ordered UUIDv7 keys (new rows land at the right edge of the B-tree) instead of random UUID4
+UUID_V7_ENABLED = os.environ.get("UUID_V7_ENABLED", "true").lower() == "true"
+
+NIL_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+def uuid7() -> str:
+    """RFC 9562 UUIDv7: 48-bit Unix milliseconds, version/variant bits, 74 random bits."""
+    random_bits = int.from_bytes(os.urandom(10), "big")
+    value = (time.time_ns() // 1_000_000 & (1 << 48) - 1) << 80
+    value |= 0x7 << 76 | (random_bits >> 62 & 0xFFF) << 64
+    value |= 0b10 << 62 | random_bits & (1 << 62) - 1
+    return str(uuid.UUID(int=value))
+
+
+def new_id() -> str:
+    return uuid7() if UUID_V7_ENABLED else str(uuid.uuid4())
+
+
+class UUIDString(TypeDecorator):
+    """
+    Native Postgres uuid column (16 bytes) that reads and writes the usual
+    36-character string, so ids look the same to the API and the rest of the code.
+    A malformed id binds as the nil UUID: lookups find nothing, as they did with
+    text keys, instead of raising "invalid input syntax for type uuid".
+    """
+    impl = UUID(as_uuid=False)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return str(uuid.UUID(str(value)))
+        except ValueError:
+            return NIL_UUID
+
 class User(Base):
     __tablename__ = "users"
+    __mapper_args__ = EAGER_DEFAULTS
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
+    id = Column(UUIDString, primary_key=True, default=new_id, index=True)
     name = Column(String(100), nullable=False)
     email = Column(String(120), unique=True, index=True)
     password_hash = Column(String(255), nullable=True) # Temporarily nullable for backwards compatibility
@@ -21,6 +92,8 @@ class User(Base):
     height_cm = Column(Numeric(5, 2), nullable=True)
     weight_kg = Column(Numeric(5, 2), nullable=True)
     created_at = Column(DateTime, default=func.now()) # Use func.now() for database default
+    # Profile version for HTTP ETags (see app/http_cache.py)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     is_active = Column(Boolean, default=True, index=True)
  
     consultations = relationship("Consultation", back_populates="user", cascade="all, delete-orphan")
@@ -30,15 +103,16 @@ class User(Base):
 
 class Consultation(Base):
     __tablename__ = "consultations"
+    __mapper_args__ = EAGER_DEFAULTS
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
-    user_id = Column(String(36), ForeignKey("users.id"))
+    id = Column(UUIDString, primary_key=True, default=new_id, index=True)
+    user_id = Column(UUIDString, ForeignKey("users.id"))
     heading = Column(String(255), default="") 
-    reference = Column(String(36), ForeignKey("consultations.id"), nullable=True)
+    reference = Column(UUIDString, ForeignKey("consultations.id"), nullable=True)
     summary = Column(Text, default="")
-    embedding_vector = Column(Vector(VECTOR_DIMENSION), nullable=True)
+    embedding_vector = deferred(Column(EmbeddingVector(VECTOR_DIMENSION), nullable=True))
     created_at = Column(DateTime, default=func.now())  
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, default=func.clock_timestamp(), onupdate=func.clock_timestamp())
     is_active = Column(Boolean, default=True, index=True)
 
     # Tracking the last time we ran the condition detection LLM
@@ -51,32 +125,67 @@ class Consultation(Base):
     conditions = relationship("UserCondition", back_populates="consultation")
     vitals_entries = relationship("VitalsTimeSeries", back_populates="consultation")
 
+# Keyset pagination of a user's consultation list: ORDER BY updated_at DESC, id DESC
+Index(
+    "ix_consultations_user_updated_id",
+    Consultation.user_id, Consultation.updated_at.desc(), Consultation.id.desc()
+)
+# Cosine-distance search over consultation summaries
+Index(
+    "ix_consultations_embedding_hnsw",
+    Consultation.__table__.c.embedding_vector,
+    postgresql_using="hnsw",
+    postgresql_ops={"embedding_vector": VECTOR_COSINE_OPS},
+)
+
 
 class ConsultationTimeline(Base):
+    # Range-partitioned by month on created_at (see db/partitions.py). Postgres requires the
+    # partition key in every unique constraint, so the primary key is (id, created_at).
     __tablename__ = "consultation_timeline"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+    __mapper_args__ = EAGER_DEFAULTS
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
-    consultation_id = Column(String(36), ForeignKey("consultations.id"))
+    id = Column(UUIDString, primary_key=True, default=new_id)
+    consultation_id = Column(UUIDString, ForeignKey("consultations.id"))
     user_query = Column(Text) 
     model_response = Column(Text)
     insights = Column(Text, nullable=True)
-    embedding_vector = Column(Vector(VECTOR_DIMENSION))
-    created_at = Column(DateTime, default=func.now()) # Use func.now() for consistency
+    embedding_vector = deferred(Column(EmbeddingVector(VECTOR_DIMENSION)))
+    created_at = Column(DateTime, primary_key=True, default=func.now()) # Use func.now() for consistency
+    # Bumped when the pipeline fills in insights; drives delta sync (crud.get_changes_since)
+    updated_at = Column(DateTime, default=func.clock_timestamp(), onupdate=func.clock_timestamp())
 
     consultation = relationship("Consultation", back_populates="timeline_entries")
 
+# Chronological history reads and (created_at, id) keyset pages of one consultation
+Index(
+    "ix_consultation_timeline_consultation_created_id",
+    ConsultationTimeline.consultation_id, ConsultationTimeline.created_at, ConsultationTimeline.id
+)
+# Delta sync: turns of a consultation changed after a watermark
+Index("ix_consultation_timeline_consultation_updated", ConsultationTimeline.consultation_id, ConsultationTimeline.updated_at)
+# Cosine-distance HNSW index, declared on the parent so each partition gets (and builds) its own
+Index(
+    "ix_consultation_timeline_embedding_hnsw",
+    ConsultationTimeline.__table__.c.embedding_vector,
+    postgresql_using="hnsw",
+    postgresql_ops={"embedding_vector": VECTOR_COSINE_OPS},
+)
+
 
 class UserCondition(Base):
     __tablename__ = "user_conditions"
+    __mapper_args__ = EAGER_DEFAULTS
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
+    id = Column(UUIDString, primary_key=True, default=new_id, index=True)
     
     # Core Link to User
-    user_id = Column(String(36), ForeignKey("users.id"), index=True)
+    user_id = Column(UUIDString, ForeignKey("users.id"), index=True)
     
     # Source Separation
     source_type = Column(String(50), nullable=False)
-    consultation_id = Column(String(36), ForeignKey("consultations.id"), nullable=True)
+    consultation_id = Column(UUIDString, ForeignKey("consultations.id"), nullable=True)
     
     # Categorization
     condition_type = Column(String(100), nullable=False, index=True)
@@ -88,23 +197,39 @@ class UserCondition(Base):
     
     # Contextual and Search Data
     notes = Column(Text, default="")
-    embedding_vector = Column(Vector(VECTOR_DIMENSION), nullable=True) 
+    embedding_vector = deferred(Column(EmbeddingVector(VECTOR_DIMENSION), nullable=True))
+    # Short "The patient has {name}." vector used for synonym (S-Score) checks
+    focus_embedding_vector = deferred(Column(EmbeddingVector(VECTOR_DIMENSION), nullable=True))
+
+    # Dedupe key for pipeline-generated rows so re-runs cannot insert the same condition twice
+    idempotency_key = Column(String(64), unique=True, nullable=True)
 
     # Audit Timestamps
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, default=func.clock_timestamp(), onupdate=func.clock_timestamp())
 
     user = relationship("User", back_populates="conditions") 
     consultation = relationship("Consultation", back_populates="conditions")
 
+# Delta sync: a user's conditions changed after a watermark
+Index("ix_user_conditions_user_updated", UserCondition.user_id, UserCondition.updated_at)
+# Cosine-distance search over condition embeddings
+Index(
+    "ix_user_conditions_embedding_hnsw",
+    UserCondition.__table__.c.embedding_vector,
+    postgresql_using="hnsw",
+    postgresql_ops={"embedding_vector": VECTOR_COSINE_OPS},
+)
+
 
 class VitalsTimeSeries(Base):
     __tablename__ = "vitals_time_series"
+    __mapper_args__ = EAGER_DEFAULTS
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
+    id = Column(UUIDString, primary_key=True, default=new_id, index=True)
     
     # Core Link to User
-    user_id = Column(String(36), ForeignKey("users.id"), index=True)
+    user_id = Column(UUIDString, ForeignKey("users.id"), index=True)
     
     # The essential time component for TimescaleDB optimization and time-series queries
     timestamp = Column(DateTime, default=func.now(), index=True)
@@ -116,7 +241,31 @@ class VitalsTimeSeries(Base):
     metric_value = Column(Numeric(10, 2), nullable=False)
     
     # Optional: Link to a specific consultation
-    consultation_id = Column(String(36), ForeignKey("consultations.id"), nullable=True)
+    consultation_id = Column(UUIDString, ForeignKey("consultations.id"), nullable=True)
 
     user = relationship("User", back_populates="vitals_entries") 
-    consultation = relationship("Consultation", back_populates="vitals_entries")
\ No newline at end of file
+    consultation = relationship("Consultation", back_populates="vitals_entries")
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_response_cache"
+
+    # sha256 of (model_name, prompt, generation params) — see ai/llm_cache.py
+    cache_key = Column(String(64), primary_key=True)
+    model_name = Column(String(255), nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class PipelineCheckpoint(Base):
+    __tablename__ = "pipeline_checkpoints"
+    __table_args__ = (UniqueConstraint("consultation_id", "run_key", "stage", name="uq_pipeline_checkpoint_stage"),)
+
+    id = Column(UUIDString, primary_key=True, default=new_id, index=True)
+    consultation_id = Column(UUIDString, ForeignKey("consultations.id"), index=True, nullable=False)
+    # Identifies one pipeline run over a fixed set of timeline entries (hash of their ids)
+    run_key = Column(String(64), nullable=False)
+    stage = Column(String(50), nullable=False)
+    # JSON-encoded stage output
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=func.now())
@@ -0,0 +1,171 @@
+# db/partitions.py
+import os
+from datetime import date
+from sqlalchemy import text
+
+from .database import engine
+
+# Monthly range partitions of consultation_timeline (partition key: created_at).
+#
+# Partitions are named consultation_timeline_pYYYYMM and cover [first of month, first
+# of next month). A DEFAULT partition catches anything outside the pre-created range,
+# so inserts never fail when maintenance falls behind; the next maintenance run moves
+# those rows into their proper monthly partition.
+#
+# Indexes (including the HNSW vector index) are declared on the parent table, so every
+# partition builds its own copy and queries bounded on created_at only touch the
+# partitions they need (see crud.timeline_partition_bound).
+#
+# maintain_timeline_partitions() runs at startup (init_db) and can be scheduled:
+#     python -m db.partitions            # create upcoming partitions, archive cold ones
+#     python -m db.partitions --list
+
+TIMELINE_TABLE = "consultation_timeline"
+TIMELINE_DEFAULT_PARTITION = f"{TIMELINE_TABLE}_default"
+
+# Monthly partitions kept ready ahead of the current month
+TIMELINE_PARTITION_MONTHS_AHEAD = int(os.environ.get("TIMELINE_PARTITION_MONTHS_AHEAD", 3))
+# Detach partitions whose month ended more than this many months ago (0 = keep everything attached).
+# Detached partitions stay in the database as standalone tables, but the app no longer reads them.
+TIMELINE_ARCHIVE_AFTER_MONTHS = int(os.environ.get("TIMELINE_ARCHIVE_AFTER_MONTHS", 0))
+# Optional tablespace (e.g. on cheaper storage) detached partitions are moved to
+TIMELINE_ARCHIVE_TABLESPACE = os.environ.get("TIMELINE_ARCHIVE_TABLESPACE", "")
+
+# Serialises maintenance across gunicorn workers starting at the same time
+_MAINTENANCE_LOCK_KEY = 0x7E11E
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TIMELINE_TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned(connection) -> bool:
+    """False until the table has been converted (fresh create_all or migration 3e8d1f6a2b90)."""
+    return bool(connection.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table
+            WHERE partrelid = to_regclass(:table)
+        )
+    """), {"table": TIMELINE_TABLE}).scalar())
+
+
+def list_partitions(connection):
+    """(name, bounds) of the attached partitions, oldest first."""
+    return connection.execute(text("""
+        SELECT child.relname AS name, pg_get_expr(child.relpartbound, child.oid) AS bounds
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(:table)
+        ORDER BY child.relname
+    """), {"table": TIMELINE_TABLE}).all()
+
+
+def ensure_partition(connection, month: date) -> bool:
+    """Creates the partition for `month` if missing; returns True if one was created."""
+    name = partition_name(month)
+    if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return False
+
+    lower, upper = month.isoformat(), _add_months(month, 1).isoformat()
+    stray = connection.execute(text(f"""
+        SELECT count(*) FROM {TIMELINE_DEFAULT_PARTITION}
+        WHERE created_at >= :lower AND created_at < :upper
+    """), {"lower": lower, "upper": upper}).scalar()
+
+    if not stray:
+        connection.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {TIMELINE_TABLE} "
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        ))
+        return True
+
+    # The default partition already holds rows of this month (maintenance fell behind):
+    # Postgres refuses to create an overlapping partition, so move them into a standalone
+    # table and attach that instead. ATTACH builds the parent's indexes on it.
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {TIMELINE_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    connection.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {TIMELINE_DEFAULT_PARTITION}
+            WHERE created_at >= :lower AND created_at < :upper
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), {"lower": lower, "upper": upper})
+    connection.execute(text(
+        f"ALTER TABLE {TIMELINE_TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    ))
+    print(f"[PARTITIONS] Moved {stray} rows from {TIMELINE_DEFAULT_PARTITION} into {name}.")
+    return True
+
+
+def ensure_future_partitions(connection, months_ahead: int = TIMELINE_PARTITION_MONTHS_AHEAD, today: date = None):
+    """Creates the current month's partition and the next `months_ahead`; returns the names created."""
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {TIMELINE_DEFAULT_PARTITION} PARTITION OF {TIMELINE_TABLE} DEFAULT"
+    ))
+    current = (today or date.today()).replace(day=1)
+    return [partition_name(_add_months(current, offset))
+            for offset in range(months_ahead + 1)
+            if ensure_partition(connection, _add_months(current, offset))]
+
+
+def archive_old_partitions(connection, after_months: int = TIMELINE_ARCHIVE_AFTER_MONTHS,
+                           tablespace: str = TIMELINE_ARCHIVE_TABLESPACE, today: date = None):
+    """
+    Detaches monthly partitions that ended more than `after_months` months ago and
+    optionally moves them to `tablespace`. Returns the names detached. Their turns
+    disappear from history, search and the pipeline, so only enable this for data
+    that is retained elsewhere (or re-attach the table when it is needed again).
+    """
+    if after_months <= 0:
+        return []
+    cutoff = _add_months((today or date.today()).replace(day=1), -after_months)
+    detached = []
+    for row in list_partitions(connection):
+        if not row.name.startswith(f"{TIMELINE_TABLE}_p"):
+            continue
+        try:
+            month = date(int(row.name[-6:-2]), int(row.name[-2:]), 1)
+        except ValueError:
+            continue
+        if _add_months(month, 1) > cutoff:
+            continue
+        connection.execute(text(f"ALTER TABLE {TIMELINE_TABLE} DETACH PARTITION {row.name}"))
+        if tablespace:
+            connection.execute(text(f'ALTER TABLE {row.name} SET TABLESPACE "{tablespace}"'))
+        detached.append(row.name)
+    return detached
+
+
+def maintain_timeline_partitions(db_engine=None) -> dict:
+    """Creates upcoming partitions and archives cold ones. No-op until the table is partitioned."""
+    with (db_engine or engine).begin() as connection:
+        if not is_partitioned(connection):
+            return {"partitioned": False, "created": [], "detached": []}
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _MAINTENANCE_LOCK_KEY})
+        created = ensure_future_partitions(connection)
+        detached = archive_old_partitions(connection)
+    if created or detached:
+        print(f"[PARTITIONS] {TIMELINE_TABLE}: created {created or 'none'}, detached {detached or 'none'}.")
+    return {"partitioned": True, "created": created, "detached": detached}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain consultation_timeline's monthly partitions.")
+    parser.add_argument("--list", action="store_true", help="List the attached partitions and exit.")
+    args = parser.parse_args()
+
+    if args.list:
+        with engine.connect() as connection:
+            for row in list_partitions(connection):
+                print(f"{row.name:<40} {row.bounds}")
+    else:
+        print(maintain_timeline_partitions())
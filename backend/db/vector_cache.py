@@ -0,0 +1,377 @@
+# db/vector_cache.py
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+# In-process vector index per user, for crud.semantic_search_records.
+#
+# Most users have tens of records, so instead of shipping the query vector to Postgres
+# and running three vector CTEs, a user's searchable rows (condition embeddings,
+# consultation summaries, timeline insights) are loaded once into one contiguous,
+# pre-normalised float32 matrix and searched with a single matmul + argpartition.
+# Ranking mirrors the SQL query: per-source top-k under the distance threshold, best
+# insight per consultation, the current consultation excluded, then the global top-N.
+#
+# Freshness:
+#   - writes in this process invalidate the user after their transaction commits
+#     (ORM flushes are detected automatically; crud's bulk UPDATEs call mark_dirty())
+#   - writes by other gunicorn workers are caught by re-checking a cheap version
+#     tuple (row counts + max updated_at) once the entry is older than
+#     VECTOR_CACHE_REVALIDATE_SECONDS
+# Users with more than VECTOR_CACHE_MAX_USER_ROWS rows stay on the SQL path, and the
+# whole cache is an LRU bounded by VECTOR_CACHE_MAX_MB.
+
+VECTOR_CACHE_ENABLED = os.environ.get("VECTOR_CACHE_ENABLED", "false").lower() == "true"
+VECTOR_CACHE_MAX_MB = float(os.environ.get("VECTOR_CACHE_MAX_MB", 64))
+VECTOR_CACHE_MAX_USER_ROWS = int(os.environ.get("VECTOR_CACHE_MAX_USER_ROWS", 2000))
+VECTOR_CACHE_REVALIDATE_SECONDS = float(os.environ.get("VECTOR_CACHE_REVALIDATE_SECONDS", 5))
+
+# Row sources, in the order the SQL query labels them
+CONDITION, CONSULTATION, INSIGHT = 0, 1, 2
+SOURCE_TYPES = ("User Condition", "Consultation Summary", "Clinical Insight")
+EXCLUDED_INSIGHTS = ("No clinical insight extracted.", "Pending End-of-Session Extraction")
+
+stats = {
+    "memory_searches": 0, "memory_ms": 0.0,
+    "sql_searches": 0, "sql_ms": 0.0,
+    "sql_large_user": 0,
+    "loads": 0, "load_ms": 0.0,
+    "revalidations": 0, "invalidations": 0, "evictions": 0,
+}
+_stats_lock = threading.Lock()
+
+
+class UserVectorIndex:
+    """One user's searchable rows: a unit-normalised (n, d) float32 matrix plus row metadata."""
+    __slots__ = ("version", "checked_at", "too_large", "matrix", "sources", "consultations",
+                 "consultation_ids", "records", "nbytes")
+
+    def __init__(self, version, too_large=False, matrix=None, sources=None, consultations=None,
+                 consultation_ids=(), records=()):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.too_large = too_large
+        self.matrix = matrix
+        self.sources = sources
+        # Per row: index into consultation_ids (-1 for conditions)
+        self.consultations = consultations
+        # Every consultation of the user, so a write to any of them finds this entry
+        self.consultation_ids = list(consultation_ids)
+        # Per row: (text_snippet, title, date)
+        self.records = list(records)
+        self.nbytes = (0 if matrix is None else matrix.nbytes + sources.nbytes + consultations.nbytes) + sum(
+            len(snippet or "") + len(title or "") + 64 for snippet, title, _ in self.records
+        )
+
+    def search(self, query_embedding, current_consultation_id, k_conditions, k_consultations,
+               distance_threshold, max_results):
+        if self.matrix is None or not len(self.matrix):
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        distance = 1.0 - self.matrix @ (query / norm)
+
+        eligible = distance <= distance_threshold
+        if current_consultation_id is not None and current_consultation_id in self.consultation_ids:
+            eligible &= self.consultations != self.consultation_ids.index(current_consultation_id)
+
+        picked = []
+        for source, k in ((CONDITION, k_conditions), (CONSULTATION, k_consultations), (INSIGHT, k_consultations)):
+            rows = np.flatnonzero(eligible & (self.sources == source))
+            if not len(rows) or k <= 0:
+                continue
+            if source == INSIGHT:
+                # Best insight per consultation (the SQL's ROW_NUMBER() ... rn = 1)
+                rows = rows[np.argsort(distance[rows], kind="stable")]
+                _, first = np.unique(self.consultations[rows], return_index=True)
+                rows = rows[np.sort(first)]
+            if len(rows) > k:
+                rows = rows[np.argpartition(distance[rows], k - 1)[:k]]
+            picked.append(rows)
+        if not picked:
+            return []
+
+        rows = np.concatenate(picked)
+        rows = rows[np.argsort(distance[rows], kind="stable")][:max_results]
+        results = []
+        for row in rows:
+            snippet, title, date = self.records[row]
+            results.append({
+                "type": SOURCE_TYPES[self.sources[row]],
+                "title": title,
+                "snippet": snippet,
+                "date": date.isoformat() if date else None,
+                "relevance_distance": float(distance[row]),
+                "relevance_similarity": float(1.0 - distance[row]),
+            })
+        return results
+
+
+def _version(db: Session, user_id: str):
+    """(conditions, consultations, timeline turns): row count and latest updated_at of each."""
+    conditions, consultations, timeline = models.UserCondition, models.Consultation, models.ConsultationTimeline
+    user_turns = (select(timeline.id, timeline.updated_at)
+                  .join(consultations, consultations.id == timeline.consultation_id)
+                  .where(consultations.user_id == user_id)
+                  .subquery())
+    return tuple(db.execute(select(
+        select(func.count(conditions.id)).where(conditions.user_id == user_id).scalar_subquery(),
+        select(func.max(conditions.updated_at)).where(conditions.user_id == user_id).scalar_subquery(),
+        select(func.count(consultations.id)).where(consultations.user_id == user_id).scalar_subquery(),
+        select(func.max(consultations.updated_at)).where(consultations.user_id == user_id).scalar_subquery(),
+        select(func.count(user_turns.c.id)).scalar_subquery(),
+        select(func.max(user_turns.c.updated_at)).scalar_subquery(),
+    )).one())
+
+
+def _load(db: Session, user_id: str, version) -> UserVectorIndex:
+    if version[0] + version[2] + version[4] > VECTOR_CACHE_MAX_USER_ROWS:
+        return UserVectorIndex(version, too_large=True)
+
+    conditions, consultations, timeline = models.UserCondition, models.Consultation, models.ConsultationTimeline
+    consultation_rows = db.execute(
+        select(consultations.id, consultations.summary, consultations.heading, consultations.created_at,
+               consultations.embedding_vector)
+        .where(consultations.user_id == user_id)
+    ).all()
+    consultation_ids = [row.id for row in consultation_rows]
+    position = {consultation_id: i for i, consultation_id in enumerate(consultation_ids)}
+
+    vectors, sources, owners, records = [], [], [], []
+    for row in db.execute(
+        select(conditions.notes, conditions.condition_name, conditions.diagnosis_date, conditions.embedding_vector)
+        .where(conditions.user_id == user_id, conditions.embedding_vector.isnot(None))
+    ):
+        vectors.append(row.embedding_vector)
+        sources.append(CONDITION)
+        owners.append(-1)
+        records.append((row.notes, row.condition_name, row.diagnosis_date))
+    for row in consultation_rows:
+        if row.embedding_vector is not None:
+            vectors.append(row.embedding_vector)
+            sources.append(CONSULTATION)
+            owners.append(position[row.id])
+            records.append((row.summary, row.heading, row.created_at))
+    for row in db.execute(
+        select(timeline.consultation_id, timeline.insights, consultations.heading, timeline.created_at,
+               timeline.embedding_vector)
+        .join(consultations, consultations.id == timeline.consultation_id)
+        .where(
+            consultations.user_id == user_id,
+            timeline.embedding_vector.isnot(None),
+            timeline.insights.isnot(None),
+            timeline.insights.notin_(EXCLUDED_INSIGHTS),
+        )
+    ):
+        vectors.append(row.embedding_vector)
+        sources.append(INSIGHT)
+        owners.append(position[row.consultation_id])
+        records.append((row.insights, row.heading, row.created_at))
+
+    if vectors:
+        matrix = np.asarray([np.asarray(v, dtype=np.float32) for v in vectors], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        # Zero vectors (failed embeddings) never match, as their NaN distance never does in SQL
+        matrix = np.ascontiguousarray(np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms != 0))
+    else:
+        matrix = np.zeros((0, models.VECTOR_DIMENSION), dtype=np.float32)
+    return UserVectorIndex(
+        version,
+        matrix=matrix,
+        sources=np.asarray(sources, dtype=np.int8),
+        consultations=np.asarray(owners, dtype=np.int32),
+        consultation_ids=consultation_ids,
+        records=records,
+    )
+
+
+class UserVectorCache:
+    """LRU of UserVectorIndex entries, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: float = VECTOR_CACHE_MAX_MB * 1e6):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, UserVectorIndex]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: str) -> UserVectorIndex:
+        """The user's index, loading it on first use or when the DB version moved on."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+        if entry is not None and time.monotonic() - entry.checked_at < VECTOR_CACHE_REVALIDATE_SECONDS:
+            return entry
+
+        version = _version(db, user_id)
+        if entry is not None and entry.version == version:
+            entry.checked_at = time.monotonic()
+            _count("revalidations")
+            return entry
+
+        start = time.perf_counter()
+        entry = _load(db, user_id, version)
+        load_ms = (time.perf_counter() - start) * 1000
+        _count("loads", load_ms=load_ms)
+        self._put(user_id, entry)
+        # Logged per load, not per search: searches are the hot path (averages in metrics())
+        print(f"[VECTOR_CACHE] Loaded {len(entry.records)} rows in {load_ms:.1f} ms ({summary()})")
+        return entry
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+        if entry is not None:
+            _count("invalidations")
+
+    def invalidate_consultation(self, consultation_id: str) -> None:
+        with self._lock:
+            owners = [user_id for user_id, entry in self._entries.items() if consultation_id in entry.consultation_ids]
+        for user_id in owners:
+            self.invalidate_user(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self):
+        with self._lock:
+            return len(self._entries), self._bytes
+
+    def _put(self, user_id: str, entry: UserVectorIndex) -> None:
+        evicted = 0
+        with self._lock:
+            previous = self._entries.pop(user_id, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            if entry.nbytes > self.max_bytes:
+                return
+            self._entries[user_id] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                _, oldest = self._entries.popitem(last=False)
+                self._bytes -= oldest.nbytes
+                evicted += 1
+        if evicted:
+            _count("evictions", evicted)
+            print(f"[VECTOR_CACHE] Evicted {evicted} user(s) to stay under {self.max_bytes / 1e6:.0f} MB")
+
+
+cache = UserVectorCache()
+
+
+def _count(key: str, amount: int = 1, **durations) -> None:
+    with _stats_lock:
+        stats[key] += amount
+        for name, value in durations.items():
+            stats[name] += value
+
+
+def search(db: Session, user_id: str, query_embedding, current_consultation_id, k_conditions: int,
+           k_consultations: int, distance_threshold: float, max_results: int) -> Optional[list]:
+    """Results in semantic_search_records' format, or None when the caller should run the SQL search."""
+    if not VECTOR_CACHE_ENABLED:
+        return None
+    start = time.perf_counter()
+    try:
+        entry = cache.get(db, user_id)
+    except Exception as e:
+        print(f"[VECTOR_CACHE] Load failed, using SQL search: {e}")
+        return None
+    if entry.too_large:
+        _count("sql_large_user")
+        return None
+    results = entry.search(query_embedding, current_consultation_id, k_conditions, k_consultations,
+                           distance_threshold, max_results)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    _count("memory_searches", memory_ms=elapsed_ms)
+    return results
+
+
+def record_sql_search(elapsed_ms: float) -> None:
+    _count("sql_searches", sql_ms=elapsed_ms)
+
+
+def _averages(snapshot: dict) -> dict:
+    def average(total, count):
+        return snapshot[total] / snapshot[count] if snapshot[count] else 0.0
+    return {
+        "avg_memory_ms": average("memory_ms", "memory_searches"),
+        "avg_sql_ms": average("sql_ms", "sql_searches"),
+        "avg_load_ms": average("load_ms", "loads"),
+    }
+
+
+def summary() -> str:
+    """Average latency of both search paths so far, for the load log line."""
+    with _stats_lock:
+        snapshot = dict(stats)
+    averages = _averages(snapshot)
+    return (f"avg memory {averages['avg_memory_ms']:.2f} ms x{snapshot['memory_searches']}, "
+            f"avg SQL {averages['avg_sql_ms']:.2f} ms x{snapshot['sql_searches']}")
+
+
+def metrics() -> dict:
+    """Counters, average latencies and cache size."""
+    users, nbytes = cache.size()
+    with _stats_lock:
+        snapshot = dict(stats)
+    snapshot.update(_averages(snapshot), cached_users=users, cached_mb=nbytes / 1e6)
+    return snapshot
+
+
+# -------------------- INVALIDATION --------------------
+# Changes are collected per session and applied after COMMIT: invalidating earlier would let
+# a concurrent search reload the pre-commit rows and cache them again.
+
+_PENDING_KEY = "vector_cache_dirty"
+
+
+def mark_dirty(db: Session, user_id: str = None, consultation_id: str = None) -> None:
+    """Invalidates the user (or the owner of the consultation) once `db` commits."""
+    if not VECTOR_CACHE_ENABLED:
+        return
+    pending = db.info.setdefault(_PENDING_KEY, set())
+    if user_id is not None:
+        pending.add(("user", user_id))
+    if consultation_id is not None:
+        pending.add(("consultation", consultation_id))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(db, flush_context):
+    if not VECTOR_CACHE_ENABLED:
+        return
+    for instance in (*db.new, *db.dirty, *db.deleted):
+        if isinstance(instance, (models.UserCondition, models.Consultation)):
+            mark_dirty(db, user_id=instance.user_id)
+        elif isinstance(instance, models.ConsultationTimeline):
+            mark_dirty(db, consultation_id=instance.consultation_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(db):
+    for kind, key in db.info.pop(_PENDING_KEY, ()):
+        if kind == "user":
+            cache.invalidate_user(key)
+        else:
+            cache.invalidate_consultation(key)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(db, previous_transaction):
+    if previous_transaction.parent is None:
+        db.info.pop(_PENDING_KEY, None)
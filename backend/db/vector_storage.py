@@ -0,0 +1,161 @@
+# db/vector_storage.py
+import re
+
+from sqlalchemy import text
+
+from .database import engine
+from .models import VECTOR_DIMENSION, VECTOR_STORAGE, SEMANTIC_SEARCH_MODE
+
+# Converts the embedding columns between pgvector's `vector` (float32) and `halfvec`
+# (float16) to match VECTOR_STORAGE, and (re)builds their HNSW indexes with the
+# matching operator class. Migration 6b2e7d3c9f14 runs this on upgrade; after
+# changing VECTOR_STORAGE on an existing database, run it again by hand:
+#     python -m db.vector_storage            # convert to VECTOR_STORAGE
+#     python -m db.vector_storage --check    # report column types only
+#     python -m db.vector_storage --binary-indexes   # build the SEMANTIC_SEARCH_MODE=binary indexes
+#
+# ALTER COLUMN ... TYPE rewrites each table under an exclusive lock. The app must run
+# with the same VECTOR_STORAGE as the columns: queries cast their parameters to it.
+
+EMBEDDING_COLUMNS = [
+    ("consultations", "embedding_vector"),
+    ("consultation_timeline", "embedding_vector"),
+    ("user_conditions", "embedding_vector"),
+    ("user_conditions", "focus_embedding_vector"),
+]
+
+# name -> (table, column); focus vectors are only compared in Python, so they have no index
+HNSW_INDEXES = {
+    "ix_consultations_embedding_hnsw": ("consultations", "embedding_vector"),
+    "ix_consultation_timeline_embedding_hnsw": ("consultation_timeline", "embedding_vector"),
+    "ix_user_conditions_embedding_hnsw": ("user_conditions", "embedding_vector"),
+}
+# Expression indexes over binary_quantize(column)::bit(N) with Hamming distance: the candidate
+# stage of SEMANTIC_SEARCH_MODE=binary. Not declared on the models: they need pgvector >= 0.7
+# and only pay for themselves in binary mode, so they are created by ensure_binary_quantized_indexes.
+BINARY_QUANTIZED_INDEXES = {
+    "ix_consultations_embedding_bq_hnsw": ("consultations", "embedding_vector"),
+    "ix_consultation_timeline_embedding_bq_hnsw": ("consultation_timeline", "embedding_vector"),
+    "ix_user_conditions_embedding_bq_hnsw": ("user_conditions", "embedding_vector"),
+}
+
+# binary_quantize / bit_hamming_ops, and halfvec
+BINARY_QUANTIZE_MIN_VERSION = (0, 7, 0)
+# hnsw.iterative_scan: keeps scanning an HNSW index until enough rows pass the WHERE clause
+ITERATIVE_SCAN_MIN_VERSION = (0, 8, 0)
+
+_pgvector_version = None
+
+
+def pgvector_version(connection) -> tuple:
+    """Installed pgvector version, e.g. (0, 8, 0); () if the extension is missing. Read once per process."""
+    global _pgvector_version
+    if _pgvector_version is None:
+        version = connection.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+        if version is None:
+            return ()
+        _pgvector_version = tuple(int(part) for part in re.findall(r"\d+", version))
+    return _pgvector_version
+
+
+def column_types(connection) -> dict:
+    """{(table, column): 'vector' | 'halfvec'} for the embedding columns that exist."""
+    rows = connection.execute(text("""
+        SELECT table_name, column_name, udt_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = ANY(:tables)
+    """), {"tables": sorted({table for table, _ in EMBEDDING_COLUMNS})}).all()
+    types = {(row.table_name, row.column_name): row.udt_name for row in rows}
+    return {key: types[key] for key in EMBEDDING_COLUMNS if key in types}
+
+
+def convert_embedding_columns(connection, storage: str = VECTOR_STORAGE) -> list:
+    """Retypes every embedding column not yet stored as `storage`; returns the ones converted."""
+    pending = [key for key, udt_name in column_types(connection).items() if udt_name != storage]
+    pending_set = set(pending)
+
+    # An HNSW index is tied to its operator class / expression type, so it is dropped before the rewrite
+    for name, key in HNSW_INDEXES.items():
+        if key in pending_set:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    rebuild_binary = [name for name, key in BINARY_QUANTIZED_INDEXES.items()
+                      if key in pending_set and connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()]
+    for name in rebuild_binary:
+        connection.execute(text(f"DROP INDEX {name}"))
+    for table, column in pending:
+        sql_type = f"{storage}({VECTOR_DIMENSION})"
+        connection.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {sql_type} USING {column}::{sql_type}"))
+
+    ensure_hnsw_indexes(connection, storage)
+    if rebuild_binary:
+        ensure_binary_quantized_indexes(connection, rebuild_binary)
+    return [f"{table}.{column}" for table, column in pending]
+
+
+def ensure_hnsw_indexes(connection, storage: str = VECTOR_STORAGE) -> None:
+    """Creates the cosine HNSW indexes (one per partition on consultation_timeline)."""
+    for name, (table, column) in HNSW_INDEXES.items():
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING hnsw ({column} {storage}_cosine_ops)"
+        ))
+
+
+def ensure_binary_quantized_indexes(connection, names=None) -> list:
+    """
+    Creates the Hamming HNSW indexes over binary_quantize(embedding) (all of them, or `names`);
+    returns the names it ensured. Skips them, with a warning, on pgvector older than 0.7.
+    """
+    version = pgvector_version(connection)
+    if version < BINARY_QUANTIZE_MIN_VERSION:
+        print(f"[WARNING] pgvector {'.'.join(map(str, version)) or 'missing'} has no binary_quantize(); "
+              f"binary-quantized indexes not created (SEMANTIC_SEARCH_MODE=binary needs pgvector >= 0.7).")
+        return []
+    ensured = []
+    for name, (table, column) in BINARY_QUANTIZED_INDEXES.items():
+        if names is not None and name not in names:
+            continue
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+            f"USING hnsw ((binary_quantize({column})::bit({VECTOR_DIMENSION})) bit_hamming_ops)"
+        ))
+        ensured.append(name)
+    return ensured
+
+
+def ensure_search_mode_indexes(connection) -> list:
+    """The binary-quantized indexes when SEMANTIC_SEARCH_MODE=binary; nothing in exact mode."""
+    if SEMANTIC_SEARCH_MODE != "binary":
+        return []
+    return ensure_binary_quantized_indexes(connection)
+
+
+def check_embedding_storage(connection) -> list:
+    """Embedding columns whose type differs from VECTOR_STORAGE (empty when consistent)."""
+    return [f"{table}.{column} is {udt_name}" for (table, column), udt_name in column_types(connection).items()
+            if udt_name != VECTOR_STORAGE]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert embedding columns to VECTOR_STORAGE (vector | halfvec).")
+    parser.add_argument("--check", action="store_true", help="Only report the current column types.")
+    parser.add_argument("--binary-indexes", action="store_true",
+                        help="Create the binary-quantized indexes SEMANTIC_SEARCH_MODE=binary uses.")
+    args = parser.parse_args()
+
+    if args.binary_indexes:
+        with engine.begin() as connection:
+            created = ensure_binary_quantized_indexes(connection)
+        print(f"[VECTOR_STORAGE] Binary-quantized indexes: {created or 'not created'}")
+    elif args.check:
+        with engine.connect() as connection:
+            for (table, column), udt_name in column_types(connection).items():
+                print(f"{table}.{column:<24} {udt_name}")
+            mismatched = check_embedding_storage(connection)
+        print(f"[VECTOR_STORAGE] {VECTOR_STORAGE}: " + ("consistent" if not mismatched else f"mismatch: {mismatched}"))
+    else:
+        with engine.begin() as connection:
+            converted = convert_embedding_columns(connection)
+        print(f"[VECTOR_STORAGE] Converted to {VECTOR_STORAGE}: {converted or 'nothing to do'}")
@@ -0,0 +1,37 @@
+"""add_delta_sync_columns
+
+Revision ID: 0b9e4c1d7f25
+Revises: f17a3d92b4c8
+Create Date: 2026-10-19 15:12:44.602913
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0b9e4c1d7f25'
+down_revision = 'f17a3d92b4c8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Idempotent: init_db() may already have created these via create_all()
+    op.execute("ALTER TABLE consultation_timeline ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE")
+    op.execute("UPDATE consultation_timeline SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_consultation_timeline_consultation_updated "
+        "ON consultation_timeline (consultation_id, updated_at)"
+    )
+    op.execute("UPDATE user_conditions SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_user_conditions_user_updated "
+        "ON user_conditions (user_id, updated_at)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_user_conditions_user_updated")
+    op.execute("DROP INDEX IF EXISTS ix_consultation_timeline_consultation_updated")
+    with op.batch_alter_table('consultation_timeline', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,76 @@
+"""native_uuid_keys
+
+Revision ID: 1c5f8a2e9d47
+Revises: 9c2e4a6d8f13
+Create Date: 2026-10-19 16:03:19.448120
+
+Converts every String(36) primary/foreign key to the native uuid type (16 bytes
+instead of 37+, cheaper comparisons, smaller PK/FK indexes). Values and their
+text form are unchanged. ALTER COLUMN ... TYPE rewrites each table and its
+indexes under an exclusive lock, so run it in a maintenance window on large
+databases. Compare before/after with benchmarks/bench_uuid_keys.py.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c5f8a2e9d47'
+down_revision = '9c2e4a6d8f13'
+branch_labels = None
+depends_on = None
+
+ID_COLUMNS = {
+    "users": ["id"],
+    "consultations": ["id", "user_id", "reference"],
+    "consultation_timeline": ["id", "consultation_id"],
+    "user_conditions": ["id", "user_id", "consultation_id"],
+    "vitals_time_series": ["id", "user_id", "consultation_id"],
+    "pipeline_checkpoints": ["id", "consultation_id"],
+}
+
+
+def _columns_of_type(bind, data_types):
+    rows = bind.execute(sa.text("""
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = ANY(:tables)
+          AND data_type = ANY(:data_types)
+    """), {"tables": list(ID_COLUMNS), "data_types": data_types}).all()
+    present = {(row.table_name, row.column_name) for row in rows}
+    return [(table, column) for table, columns in ID_COLUMNS.items() for column in columns
+            if (table, column) in present]
+
+
+def _retype(bind, columns, using):
+    """Drops the foreign keys between the key tables, retypes `columns`, and restores the keys."""
+    if not columns:
+        return
+    foreign_keys = bind.execute(sa.text("""
+        SELECT conrelid::regclass::text AS table_name, conname, pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint
+        WHERE contype = 'f'
+          AND (conrelid::regclass::text = ANY(:tables) OR confrelid::regclass::text = ANY(:tables))
+    """), {"tables": list(ID_COLUMNS)}).all()
+
+    for fk in foreign_keys:
+        op.execute(f'ALTER TABLE {fk.table_name} DROP CONSTRAINT "{fk.conname}"')
+    for table, column in columns:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {using(column)}")
+    for fk in foreign_keys:
+        op.execute(f'ALTER TABLE {fk.table_name} ADD CONSTRAINT "{fk.conname}" {fk.definition}')
+
+
+def upgrade():
+    # Idempotent: only columns still stored as text are converted (init_db() creates
+    # fresh tables with uuid columns already)
+    bind = op.get_bind()
+    _retype(bind, _columns_of_type(bind, ["character varying", "text"]),
+            lambda column: f"uuid USING NULLIF({column}, '')::uuid")
+
+
+def downgrade():
+    bind = op.get_bind()
+    _retype(bind, _columns_of_type(bind, ["uuid"]),
+            lambda column: f"varchar(36) USING {column}::text")
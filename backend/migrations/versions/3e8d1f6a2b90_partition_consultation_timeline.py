@@ -0,0 +1,129 @@
+"""partition_consultation_timeline
+
+Revision ID: 3e8d1f6a2b90
+Revises: 1c5f8a2e9d47
+Create Date: 2026-10-19 17:26:51.804377
+
+Rebuilds consultation_timeline as a table range-partitioned by created_at, one
+partition per month (plus a DEFAULT partition), and adds a cosine HNSW index on
+embedding_vector that every partition inherits. The primary key becomes
+(id, created_at) because Postgres requires the partition key in unique constraints.
+
+Existing rows are copied into the new table under an exclusive lock, so run it in
+a maintenance window on large databases. Future partitions are created by
+db/partitions.py (at startup and via `python -m db.partitions`).
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8d1f6a2b90'
+down_revision = '1c5f8a2e9d47'
+branch_labels = None
+depends_on = None
+
+TABLE = "consultation_timeline"
+OLD_TABLE = "consultation_timeline_unpartitioned"
+MONTHS_AHEAD = 3
+
+INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS ix_consultation_timeline_consultation_created_id "
+    f"ON {TABLE} (consultation_id, created_at, id)",
+    f"CREATE INDEX IF NOT EXISTS ix_consultation_timeline_consultation_updated "
+    f"ON {TABLE} (consultation_id, updated_at)",
+]
+HNSW_INDEX = (
+    f"CREATE INDEX IF NOT EXISTS ix_consultation_timeline_embedding_hnsw "
+    f"ON {TABLE} USING hnsw (embedding_vector vector_cosine_ops)"
+)
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _is_partitioned(bind):
+    return bool(bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+    ), {"table": TABLE}).scalar())
+
+
+def _drop_constraints(bind, table):
+    """Frees the constraint names (consultation_timeline_pkey, ..._fkey) for the rebuilt table."""
+    names = bind.execute(sa.text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype IN ('p', 'f')"
+    ), {"table": table}).scalars().all()
+    for name in names:
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+
+
+def upgrade():
+    bind = op.get_bind()
+    # Idempotent: init_db() creates fresh databases with the partitioned table already
+    if _is_partitioned(bind):
+        op.execute(HNSW_INDEX)
+        return
+
+    # The partition key must be NOT NULL to route rows; turns never had a NULL created_at
+    # in practice, but fall back to the consultation's start to keep them in order
+    op.execute(f"""
+        UPDATE {TABLE} timeline
+        SET created_at = COALESCE(consultations.created_at, timeline.updated_at, now())
+        FROM consultations
+        WHERE consultations.id = timeline.consultation_id AND timeline.created_at IS NULL
+    """)
+    op.execute(f"UPDATE {TABLE} SET created_at = COALESCE(updated_at, now()) WHERE created_at IS NULL")
+
+    op.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+    _drop_constraints(bind, OLD_TABLE)
+    op.execute(f"""
+        CREATE TABLE {TABLE} (
+            LIKE {OLD_TABLE} INCLUDING DEFAULTS,
+            PRIMARY KEY (id, created_at),
+            FOREIGN KEY (consultation_id) REFERENCES consultations (id)
+        ) PARTITION BY RANGE (created_at)
+    """)
+
+    oldest = bind.execute(sa.text(f"SELECT min(created_at) FROM {OLD_TABLE}")).scalar()
+    current = date.today().replace(day=1)
+    month = (oldest.date().replace(day=1) if oldest else current)
+    while month <= _add_months(current, MONTHS_AHEAD):
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE}_p{month:%Y%m} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    op.execute(f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+    op.execute(f"INSERT INTO {TABLE} SELECT * FROM {OLD_TABLE}")
+    op.execute(f"DROP TABLE {OLD_TABLE}")
+
+    # Created after the copy (one bulk build per partition instead of per-row maintenance)
+    for statement in INDEXES:
+        op.execute(statement)
+    op.execute(HNSW_INDEX)
+    op.execute(f"ANALYZE {TABLE}")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if not _is_partitioned(bind):
+        return
+    op.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+    _drop_constraints(bind, OLD_TABLE)
+    op.execute(f"""
+        CREATE TABLE {TABLE} (
+            LIKE {OLD_TABLE} INCLUDING DEFAULTS,
+            FOREIGN KEY (consultation_id) REFERENCES consultations (id)
+        )
+    """)
+    op.execute(f"INSERT INTO {TABLE} SELECT * FROM {OLD_TABLE}")
+    op.execute(f"DROP TABLE {OLD_TABLE}")
+    op.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id)")
+    op.execute(f"CREATE INDEX IF NOT EXISTS ix_consultation_timeline_id ON {TABLE} (id)")
+    for statement in INDEXES:
+        op.execute(statement)
@@ -0,0 +1,39 @@
+"""embedding_storage_halfvec
+
+Revision ID: 6b2e7d3c9f14
+Revises: 3e8d1f6a2b90
+Create Date: 2026-10-19 18:02:37.519064
+
+Converts the embedding columns to the type selected by VECTOR_STORAGE ("vector" =
+float32, "halfvec" = float16; pgvector >= 0.7 for halfvec) and builds cosine HNSW
+indexes with the matching operator class on consultations, consultation_timeline
+and user_conditions. With the default VECTOR_STORAGE=vector only the indexes are
+added. Columns are rewritten under an exclusive lock; compare the two modes with
+benchmarks/bench_halfvec.py first. Later switches: python -m db.vector_storage.
+"""
+from alembic import op
+
+from db.vector_storage import convert_embedding_columns, HNSW_INDEXES
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2e7d3c9f14'
+down_revision = '3e8d1f6a2b90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Idempotent: only columns of the other type are rewritten, indexes use IF NOT EXISTS
+    converted = convert_embedding_columns(op.get_bind())
+    if converted:
+        print(f"[MIGRATION] Embedding columns converted: {converted}")
+
+
+def downgrade():
+    bind = op.get_bind()
+    convert_embedding_columns(bind, "vector")
+    # The timeline index predates this revision (3e8d1f6a2b90)
+    for name in HNSW_INDEXES:
+        if name != "ix_consultation_timeline_embedding_hnsw":
+            op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,35 @@
+"""add_binary_quantized_indexes
+
+Revision ID: 7d4f1a8e2c36
+Revises: 6b2e7d3c9f14
+Create Date: 2026-10-19 18:47:12.903581
+
+Hamming-distance HNSW expression indexes over binary_quantize(embedding_vector)::bit(N)
+on consultations, consultation_timeline and user_conditions: the candidate stage of
+SEMANTIC_SEARCH_MODE=binary (pgvector >= 0.7). One bit per dimension, so each index
+is a fraction of the size of its cosine counterpart.
+
+Only built when SEMANTIC_SEARCH_MODE=binary and the server's pgvector supports it;
+otherwise this is a no-op. Switching to binary mode later builds them at startup
+(init_db) or with `python -m db.vector_storage --binary-indexes`.
+"""
+from alembic import op
+
+from db.vector_storage import ensure_search_mode_indexes, BINARY_QUANTIZED_INDEXES
+
+
+# revision identifiers, used by Alembic.
+revision = '7d4f1a8e2c36'
+down_revision = '6b2e7d3c9f14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Idempotent: init_db() may already have created them
+    ensure_search_mode_indexes(op.get_bind())
+
+
+def downgrade():
+    for name in BINARY_QUANTIZED_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,37 @@
+"""add_llm_response_cache
+
+Revision ID: 8a1d3f5c7b92
+Revises: 0b9e4c1d7f25
+Create Date: 2026-10-19 21:05:37.214806
+
+Persistent tier of the DataProcessingLLM response cache (ai/llm_cache.py).
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8a1d3f5c7b92'
+down_revision = '0b9e4c1d7f25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Idempotent: init_db() may already have created the table via create_all()
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS llm_response_cache (
+            cache_key VARCHAR(64) PRIMARY KEY,
+            model_name VARCHAR(255) NOT NULL,
+            response TEXT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_llm_response_cache_expires_at "
+        "ON llm_response_cache (expires_at)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS llm_response_cache")
@@ -0,0 +1,51 @@
+"""add_pipeline_checkpoints
+
+Revision ID: 9c2e4a6d8f13
+Revises: 8a1d3f5c7b92
+Create Date: 2026-10-19 21:40:12.605318
+
+Per-stage checkpoints that let an interrupted post-processing run resume
+(ai/post_processing.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2e4a6d8f13'
+down_revision = '8a1d3f5c7b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    # The keys match consultations.id: VARCHAR(36) here, converted to uuid by 1c5f8a2e9d47
+    # (a database created by create_all() already has uuid keys)
+    id_type = bind.execute(sa.text("""
+        SELECT CASE WHEN data_type = 'uuid' THEN 'UUID' ELSE 'VARCHAR(36)' END
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'consultations' AND column_name = 'id'
+    """)).scalar() or 'VARCHAR(36)'
+
+    # Idempotent: init_db() may already have created the table via create_all()
+    op.execute(f"""
+        CREATE TABLE IF NOT EXISTS pipeline_checkpoints (
+            id {id_type} PRIMARY KEY,
+            consultation_id {id_type} NOT NULL REFERENCES consultations (id),
+            run_key VARCHAR(64) NOT NULL,
+            stage VARCHAR(50) NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT uq_pipeline_checkpoint_stage UNIQUE (consultation_id, run_key, stage)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_pipeline_checkpoints_id ON pipeline_checkpoints (id)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_pipeline_checkpoints_consultation_id "
+        "ON pipeline_checkpoints (consultation_id)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS pipeline_checkpoints")
@@ -0,0 +1,31 @@
+"""add_condition_idempotency_key
+
+Revision ID: a3c9e2f4b710
+Revises: 5db44d40227c
+Create Date: 2026-10-19 10:12:04.118522
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e2f4b710'
+down_revision = '5db44d40227c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # init_db() runs create_all() before migrations on fresh databases, so the
+    # column/index may already exist — keep this migration idempotent.
+    op.execute("ALTER TABLE user_conditions ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64)")
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS user_conditions_idempotency_key_key "
+        "ON user_conditions (idempotency_key)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS user_conditions_idempotency_key_key")
+    with op.batch_alter_table('user_conditions', schema=None) as batch_op:
+        batch_op.drop_column('idempotency_key')
@@ -0,0 +1,30 @@
+"""add_condition_focus_embedding
+
+Revision ID: c81f04d2e5a9
+Revises: a3c9e2f4b710
+Create Date: 2026-10-19 11:03:47.520193
+
+"""
+import os
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f04d2e5a9'
+down_revision = 'a3c9e2f4b710'
+branch_labels = None
+depends_on = None
+
+VECTOR_DIMENSION = int(os.environ.get("VECTOR_DIMENSION", 768))
+
+
+def upgrade():
+    # Idempotent: init_db() may already have created the column via create_all()
+    op.execute(
+        f"ALTER TABLE user_conditions ADD COLUMN IF NOT EXISTS focus_embedding_vector vector({VECTOR_DIMENSION})"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user_conditions', schema=None) as batch_op:
+        batch_op.drop_column('focus_embedding_vector')
@@ -0,0 +1,29 @@
+"""add_consultations_keyset_index
+
+Revision ID: d4a7b19c3e62
+Revises: c81f04d2e5a9
+Create Date: 2026-10-19 12:41:08.315420
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7b19c3e62'
+down_revision = 'c81f04d2e5a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset cursors compare (updated_at, id); a NULL updated_at would fall outside every page
+    op.execute("UPDATE consultations SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL")
+    # Idempotent: init_db() may already have created the index via create_all()
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_consultations_user_updated_id "
+        "ON consultations (user_id, updated_at DESC, id DESC)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_consultations_user_updated_id")
@@ -0,0 +1,27 @@
+"""add_timeline_keyset_index
+
+Revision ID: e2b6c8f05a13
+Revises: d4a7b19c3e62
+Create Date: 2026-10-19 13:22:51.904117
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b6c8f05a13'
+down_revision = 'd4a7b19c3e62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Idempotent: init_db() may already have created the index via create_all()
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_consultation_timeline_consultation_created_id "
+        "ON consultation_timeline (consultation_id, created_at, id)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_consultation_timeline_consultation_created_id")
@@ -0,0 +1,26 @@
+"""add_updated_at_to_users
+
+Revision ID: f17a3d92b4c8
+Revises: e2b6c8f05a13
+Create Date: 2026-10-19 14:05:37.118842
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f17a3d92b4c8'
+down_revision = 'e2b6c8f05a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Idempotent: init_db() may already have created the column via create_all()
+    op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE")
+    op.execute("UPDATE users SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')